@@ -1,7 +1,8 @@
+import asyncio
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks, Depends, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks, Depends, HTTPException, Response
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 from datetime import date, datetime, timedelta
 from collections import Counter
 import math
@@ -13,10 +14,13 @@ from dotenv import load_dotenv
 from supabase import create_client, Client
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from itinerary.summary_generator import generate_summary_with_ai
+from itinerary.summary_generator import stream_summary_with_ai, summary_cache
 from recommender.recommender import Recommender
-from itinerary.itinerary_scheduler import ItineraryScheduler
-from recommender.weather_api import get_weather_forecast
+from itinerary.itinerary_scheduler import ItineraryScheduler, forecast_window_end
+from recommender.weather_api import forecast_service
+from persistence.outbox import ItineraryOutbox, SupabaseSink, LocalSink
+from sockets.connection_manager import ConnectionManager
+import metrics
 
 
 load_dotenv()
@@ -26,30 +30,30 @@ ALGORITHM = "HS256"
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Itinerary persistence goes through a durable write-behind outbox.
+# ITINERARY_SINK=local writes to a JSON-lines file instead of Supabase.
+if os.getenv("ITINERARY_SINK", "supabase") == "local":
+    itinerary_sink = LocalSink(os.getenv("ITINERARY_SINK_PATH", "itineraries.jsonl"))
+else:
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    itinerary_sink = SupabaseSink(supabase, table='itineraries')
+
+itinerary_outbox = ItineraryOutbox(
+    itinerary_sink,
+    path=os.getenv("ITINERARY_OUTBOX_PATH", "itinerary_outbox.sqlite3"),
+    batch_size=int(os.getenv("ITINERARY_OUTBOX_BATCH_SIZE", "50")),
+    flush_interval=float(os.getenv("ITINERARY_OUTBOX_FLUSH_INTERVAL", "1"))
+)
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
-        await websocket.send_text(json.dumps(message))
-
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_text(json.dumps(message))
-
 
-manager = ConnectionManager()
+manager = ConnectionManager(
+    queue_size=int(os.getenv("WS_QUEUE_SIZE", "64")),
+    send_timeout=float(os.getenv("WS_SEND_TIMEOUT", "5")),
+    ping_interval=float(os.getenv("WS_PING_INTERVAL", "20")),
+    idle_timeout=float(os.getenv("WS_IDLE_TIMEOUT", "90"))
+)
 
 
 class ItineraryRequest(BaseModel):
@@ -58,6 +62,7 @@ class ItineraryRequest(BaseModel):
     user_lon: float
     start_date: date
     end_date: date
+    radius_km: Optional[float] = Field(None, gt=0)
 
     class Config:
         schema_extra = {
@@ -107,17 +112,34 @@ db_params = {
 recommender = Recommender(db_params)
 
 
-def format_daily_forecast(forecasts):
-    if not forecasts:
-        return []
+@app.on_event("startup")
+async def start_background_services():
+    itinerary_outbox.start()
+    manager.start()
+    try:
+        await recommender.open_async_pool()
+    except Exception as e:
+        print(f"Warning: async database pool could not be opened ({e}).")
+
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await manager.stop()
+    recommender.catalog.stop_polling()
+    await recommender.close_async_pool()
+    recommender.db_pool.close()
+    await asyncio.to_thread(itinerary_outbox.stop)
+
 
+def format_daily_forecast(forecast, start_date, end_date):
+    """Per-day summary of a parsed Forecast for [start_date, end_date]."""
     daily_data = {}
-    for f in forecasts:
-        day = f['datetime'].date()
-        if day not in daily_data:
-            daily_data[day] = {'temps': [], 'weathers': []}
-        daily_data[day]['temps'].append(f['temp'])
-        daily_data[day]['weathers'].append(f['weather'])
+    for day, blocks in forecast.by_date.items():
+        if start_date <= day <= end_date:
+            daily_data[day] = {
+                'temps': [f['temp'] for f in blocks],
+                'weathers': [f['weather'] for f in blocks]
+            }
 
     daily_summary = []
     for day, data in sorted(daily_data.items()):
@@ -145,6 +167,29 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/stats")
+def service_stats():
+    """Cache, catalog, planner and outbox counters, used for sizing and rollout checks."""
+    return {
+        "embedding_cache": recommender.embedding_cache.get_stats(),
+        "encoder": getattr(recommender.sbert_model, 'get_stats', dict)(),
+        "location_catalog": recommender.catalog.get_stats(),
+        "retrieval": recommender.get_retrieval_stats(),
+        "planner": recommender.planner.get_stats(),
+        "weather_cache": forecast_service.get_stats(),
+        "itinerary_outbox": itinerary_outbox.get_stats(),
+        "summary_cache": summary_cache.get_stats(),
+        "websockets": manager.get_stats()
+    }
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text-format metrics (per-stage latency histograms and counters)."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
 # --- CORS Middleware ---
 
 app.add_middleware(
@@ -158,51 +203,53 @@ app.add_middleware(
 
 # --- API Endpoint Definition ---
 @app.post("/schedule", summary="Generate a Scheduled Itinerary")
-def create_scheduled_itinerary(
+async def create_scheduled_itinerary(
     request: ItineraryRequest,
     user_id: str = Depends(get_current_user_id)
 ):
-    used_place_ids = set()
-    all_itineraries = []
+    # 0. Start the (cached, coalesced) weather fetch right away; it overlaps retrieval and planning
+    weather = asyncio.create_task(asyncio.to_thread(
+        forecast_service.get_forecast, request.user_lat, request.user_lon
+    ))
 
-    # 1. Get recommendations for each query
-    for query in request.queries:
-        itinerary = recommender.get_recommendations(
-            query,
+    try:
+        # 1. Get recommendations for each query (encode/search/planning run in the executor)
+        all_itineraries = await recommender.aget_recommendations_batch(
+            request.queries,
             request.user_lat,
             request.user_lon,
-            exclude_ids=list(used_place_ids)
+            start_date=request.start_date,
+            end_date=request.end_date,
+            radius_km=request.radius_km
         )
-        if itinerary:
-            new_ids = {place['id'] for place in itinerary}
-            used_place_ids.update(new_ids)
-            all_itineraries.append((query, itinerary))
-
-    # 2. Pass to the scheduler
-    scheduler = ItineraryScheduler(
-        request.user_lat,
-        request.user_lon,
-        request.start_date,
-        request.end_date
-    )
-    scheduled_result = scheduler.schedule_itineraries(all_itineraries)
-
-    # 3. Get and format the 6-day forecast
-    forecast_start = date.today()
-    forecast_end = forecast_start + timedelta(days=6)
-    raw_forecast = get_weather_forecast(request.user_lat, request.user_lon, forecast_start, forecast_end)
-    daily_forecast = format_daily_forecast(raw_forecast)
 
+        # 2. Pass to the scheduler
+        forecast = await weather
+        scheduler = ItineraryScheduler(
+            request.user_lat,
+            request.user_lon,
+            request.start_date,
+            request.end_date,
+            forecasts=forecast.between(request.start_date, forecast_window_end(request.end_date))
+        )
+        scheduled_result = scheduler.schedule_itineraries(all_itineraries)
+
+        # 3. Format the 6-day forecast from the same parsed forecast
+        forecast_start = date.today()
+        daily_forecast = format_daily_forecast(forecast, forecast_start, forecast_start + timedelta(days=6))
+    finally:
+        weather.cancel()
+
+    # Persisted in the background by the outbox worker; the local SQLite append runs off the event loop
     try:
-        supabase.table('itineraries').insert({
+        await asyncio.to_thread(itinerary_outbox.enqueue, {
             "user_id": user_id,
             "itinerary_data": scheduled_result,
             "start_date": request.start_date.isoformat(),
             "end_date": request.end_date.isoformat()
-        }).execute()
-        print(f"Successfully saved itinerary for user: {user_id}")
+        })
     except Exception as e:
-        print(f"ERROR: Could not save itinerary to Supabase. Reason: {e}")
+        print(f"ERROR: Could not queue itinerary for saving. Reason: {e}")
 
     # 4. Combine results into the final response
     return {
@@ -212,12 +259,77 @@ def create_scheduled_itinerary(
     }
 
 
+SUMMARY_TIME_BUDGET = float(os.getenv("SUMMARY_TIME_BUDGET", "30"))
+SUMMARY_FALLBACK = "Could not generate an AI summary for the itinerary."
+
+
+async def stream_summary(connection_id, cleaned_itineraries):
+    """
+    Streams the AI summary to the client as it is generated. Each partial
+    message carries the new text in `summary_delta` and the text so far in
+    `summary`, so clients that only read `summary` keep working; a partial
+    message may be dropped for a slow client since the next one supersedes
+    it. Returns the final summary, or SUMMARY_FALLBACK when the model fails
+    or the whole stream exceeds SUMMARY_TIME_BUDGET seconds.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + SUMMARY_TIME_BUDGET
+    chunks = []
+    outcome = "disconnected"
+    stream = stream_summary_with_ai(cleaned_itineraries)
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            try:
+                delta = await asyncio.wait_for(stream.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            if not chunks:
+                metrics.SUMMARY_FIRST_CHUNK_SECONDS.observe(loop.time() - started)
+            chunks.append(delta)
+            await manager.send_personal_message(
+                {"summary": "".join(chunks), "summary_delta": delta, "partial": True},
+                connection_id,
+                droppable=True
+            )
+        summary = "".join(chunks).strip()
+        outcome = "ok" if summary else "error"
+    except asyncio.TimeoutError:
+        print(f"AI summary exceeded {SUMMARY_TIME_BUDGET}s budget; sending fallback.")
+        outcome = "timeout"
+        return SUMMARY_FALLBACK
+    except Exception as e:
+        print(f"Error during AI summary generation: {e}")
+        outcome = "error"
+        return SUMMARY_FALLBACK
+    finally:
+        await stream.aclose()
+        metrics.SUMMARY_SECONDS.labels(outcome).observe(loop.time() - started)
+
+    if not summary:
+        return SUMMARY_FALLBACK
+    summary_cache.put(cleaned_itineraries, summary)
+    return summary
+
+
+async def wait_for_disconnect(websocket: WebSocket, connection_id):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        manager.touch(connection_id)
+
+
 @app.websocket("/ws/itinerary")
 async def websocket_itinerary(websocket: WebSocket):
-    await manager.connect(websocket)
+    connection_id = await manager.connect(websocket)
     try:
         # Receive initial data from client
         data = await websocket.receive_text()
+        manager.touch(connection_id)
         request_data = json.loads(data)
 
         # Extract the full scheduled itinerary
@@ -226,34 +338,49 @@ async def websocket_itinerary(websocket: WebSocket):
         # Send initial itinerary immediately without summary
         await manager.send_personal_message(
             {"scheduled_itineraries": scheduled_itineraries, "summary": None},
-            websocket
+            connection_id
         )
 
-        # Combine all itinerary items across all days
-        combined_itinerary = []
-        for day in scheduled_itineraries:
-            combined_itinerary.extend(day["itinerary"])
-
-        weather_info = scheduled_itineraries[0]["weather"] if scheduled_itineraries else {}
-
         cleaned_itineraries = []
         for day in scheduled_itineraries:
             cleaned_itineraries.append({
                 "itinerary": day["itinerary"],
                 "weather": day.get("weather")
             })
-        
-        summary = generate_summary_with_ai(
-            scheduled_itineraries=cleaned_itineraries
-        )
 
-        # Send back the summary in one message
+        # Identical itineraries (reconnects, page refreshes) are served from the cache.
+        summary = summary_cache.get(cleaned_itineraries)
+        if summary is not None:
+            metrics.SUMMARY_SECONDS.labels("cached").observe(0)
+            await manager.send_personal_message(
+                {"scheduled_itineraries": scheduled_itineraries, "summary": summary, "partial": False},
+                connection_id
+            )
+            return
+
+        # Stream the summary while watching the socket, so a client that goes
+        # away cancels the model call instead of letting it run to completion.
+        summary_task = asyncio.create_task(stream_summary(connection_id, cleaned_itineraries))
+        disconnect_task = asyncio.create_task(wait_for_disconnect(websocket, connection_id))
+        try:
+            await asyncio.wait({summary_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (summary_task, disconnect_task):
+                task.cancel()
+            await asyncio.gather(summary_task, disconnect_task, return_exceptions=True)
+
+        if summary_task.cancelled() or summary_task.exception() is not None:
+            return
+        summary = summary_task.result()
+
+        # Send back the final summary together with the itinerary
         await manager.send_personal_message(
-            {"scheduled_itineraries": scheduled_itineraries, "summary": summary},
-            websocket
+            {"scheduled_itineraries": scheduled_itineraries, "summary": summary, "partial": False},
+            connection_id
         )
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
-
-
+        pass
+    finally:
+        # Flushes whatever is still queued, then releases the connection on every path.
+        await manager.disconnect(connection_id)
@@ -0,0 +1,74 @@
+"""
+Throughput and latency of concurrent encode calls with and without the
+micro-batching BatchingEncoder (recommender/encoders.py).
+
+`--concurrency` threads each encode one short sub-query at a time, as
+concurrent /schedule requests do. Reports encodes/sec, per-call p50/p95/max
+latency and, for the batcher, the mean batch size actually formed.
+
+    python -m benchmarks.bench_encoder_batching --backend onnx-int8 --concurrency 1,8,32
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.compare_encoders import SAMPLE_QUERIES
+from recommender.encoders import BatchingEncoder, load_encoder
+
+
+def run_load(encoder, concurrency, calls_per_thread):
+    latencies = [[] for _ in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(slot):
+        barrier.wait()
+        for i in range(calls_per_thread):
+            text = f"{SAMPLE_QUERIES[(slot + i) % len(SAMPLE_QUERIES)]} {slot} {i}"
+            start = time.perf_counter()
+            encoder.encode([text], batch_size=1)
+            latencies[slot].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, args=(slot,)) for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    flat = np.concatenate([np.asarray(values) for values in latencies])
+    return {
+        'encodes_per_second': len(flat) / elapsed,
+        'p50_ms': 1000 * float(np.percentile(flat, 50)),
+        'p95_ms': 1000 * float(np.percentile(flat, 95)),
+        'max_ms': 1000 * float(flat.max()),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default='torch', help='torch, onnx or onnx-int8')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--onnx-dir', help='exported model directory (default: ENCODER_ONNX_DIR)')
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--calls', type=int, default=50, help='encode calls per thread')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    encoder = load_encoder(args.backend, args.model, args.onnx_dir)
+    encoder.encode(SAMPLE_QUERIES)  # warm-up
+
+    print(f"\n{'mode':<10}{'threads':>8}{'enc/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'batch':>7}")
+    for concurrency in (int(c) for c in args.concurrency.split(',')):
+        direct = run_load(encoder, concurrency, args.calls)
+        batching = BatchingEncoder(encoder, args.max_batch, args.max_wait_ms)
+        batched = run_load(batching, concurrency, args.calls)
+        mean_batch = batching.get_stats()['mean_batch_size']
+        batching.close()
+        for mode, result, batch in (('direct', direct, 1.0), ('batched', batched, mean_batch)):
+            print(f"{mode:<10}{concurrency:>8}{result['encodes_per_second']:>9.0f}{result['p50_ms']:>9.2f}"
+                  f"{result['p95_ms']:>9.2f}{result['max_ms']:>9.2f}{batch:>7.1f}")
@@ -0,0 +1,271 @@
+"""
+Synthetic-scale benchmark for Recommender.get_recommendations.
+
+Generates a catalog of N places (embeddings, categories, regions, coordinates,
+opening hours), writes the FAISS index, ids and descriptions to a temporary
+directory and serves the `locations` table from an in-memory fixture pool, so
+neither Postgres nor the SBERT model is needed. Sub-queries are embedded by a
+deterministic hash encoder that lands near the matching category's places.
+
+Reports per-stage latency (encode, search, fetch, region, scoring, planning)
+and peak memory for every catalog size:
+
+    python -m benchmarks.bench_recommender --sizes 1000,10000,100000 --requests 50
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from recommender.description_store import DescriptionStore
+from recommender.operating_hours import DAYS
+
+CATEGORIES = ['korean restaurant', 'japanese restaurant', 'italian restaurant', 'bbq', 'brunch',
+              'cafe', 'bakery', 'dessert cafe', 'tea house', 'museum', 'park', 'shopping',
+              'entertainment', 'beach', 'jazz club', 'wine bar', 'izakaya', 'whisky bar']
+REGIONS = ['Seomyeon', 'Haeundae', 'Gwangalli', 'Nampo', 'Jeonpo', 'Yeongdo', 'Dongnae',
+           'Songjeong', 'Gijang', 'Busan Station', 'Centum City', 'Oncheonjang']
+HOURS = ['10:00-22:00', '09:00-18:00', '11:00-15:00', '11:00-21:00', '18:00-02:00',
+         '17:00-24:00', '24 hours', 'Closed']
+BUSAN = (35.15, 129.07)
+
+
+class HashEncoder:
+    """
+    Stand-in for SentenceTransformer.encode: a text's vector is the sum of
+    per-token vectors seeded from a hash of the token, so identical words
+    in queries and category names produce high inner products.
+    """
+    def __init__(self, dim=384):
+        self.dim = dim
+        self._tokens = {}
+
+    def token_vector(self, token):
+        vector = self._tokens.get(token)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha1(token.encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype('float32')
+            self._tokens[token] = vector
+        return vector
+
+    def encode(self, texts, batch_size=None):
+        out = np.zeros((len(texts), self.dim), dtype='float32')
+        for i, text in enumerate(texts):
+            for token in text.lower().split():
+                out[i] += self.token_vector(token)
+        return out
+
+
+class FixturePool:
+    """In-memory replacement for PostgresPool serving a synthetic locations table."""
+    def __init__(self, df_locations):
+        self.df = df_locations
+
+    def fetch_locations(self, ids):
+        return self.df.loc[self.df.index.intersection(pd.Index(ids))].copy()
+
+    def fetch_all_locations(self):
+        return self.df.copy()
+
+    def fetch_locations_fingerprint(self):
+        return f"synthetic-{len(self.df)}"
+
+    def close(self):
+        pass
+
+    def get_stats(self):
+        return {"idle": 0, "maxconn": 0}
+
+
+def synthetic_catalog(n, encoder, seed=0, chunk=100_000, regions=REGIONS, concentration=None, centers=None):
+    """
+    Returns (ids, embeddings, locations DataFrame indexed by id). Embeddings are
+    the category vector plus region and per-place noise, L2-normalized.
+    Categories are uniform in every region unless `concentration` is given:
+    then each region draws its own category mix from Dirichlet(concentration),
+    so smaller values make regions more specialized. Region centers are drawn
+    around BUSAN, or around `centers` (one (lat, lon) per region) when given.
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n + 1, dtype='int64')
+    if concentration is None:
+        category_idx = rng.integers(len(CATEGORIES), size=n)
+        region_idx = rng.integers(len(regions), size=n)
+    else:
+        region_idx = rng.integers(len(regions), size=n)
+        mixes = rng.dirichlet(np.full(len(CATEGORIES), concentration), size=len(regions)).cumsum(axis=1)
+        category_idx = np.minimum((mixes[region_idx] < rng.random((n, 1))).sum(axis=1), len(CATEGORIES) - 1)
+
+    category_vectors = encoder.encode(CATEGORIES)
+    region_vectors = encoder.encode(regions)
+    embeddings = np.empty((n, encoder.dim), dtype='float32')
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        block = category_vectors[category_idx[start:stop]] + 0.3 * region_vectors[region_idx[start:stop]]
+        block += 2.0 * rng.standard_normal(block.shape, dtype='float32')
+        faiss.normalize_L2(block)
+        embeddings[start:stop] = block
+
+    # A few dozen shared weekly schedules keep the fixture small at 1M rows.
+    schedules = [{day: HOURS[rng.integers(len(HOURS))] for day in DAYS} for _ in range(64)]
+    schedule_idx = rng.integers(len(schedules), size=n)
+    origins = np.asarray(BUSAN if centers is None else centers, dtype='float64')
+    centers = origins + rng.uniform(-0.08, 0.08, size=(len(regions), 2))
+    coords = centers[region_idx] + rng.normal(0, 0.01, size=(n, 2))
+    categories = np.array(CATEGORIES, dtype=object)[category_idx]
+
+    df = pd.DataFrame({
+        'name': [f"{category} {i}" for i, category in zip(ids, categories)],
+        'region': np.array(regions, dtype=object)[region_idx],
+        'primary_category': categories,
+        'tags': None,
+        'operating_hours': [schedules[i] for i in schedule_idx],
+        'meal_type': None,
+        'latitude': coords[:, 0],
+        'longitude': coords[:, 1],
+        'indoor_outdoor': np.where(rng.random(n) < 0.5, 'indoor', 'outdoor'),
+        'website': None,
+        'naver_url': None,
+    }, index=pd.Index(ids, name='id'))
+    return ids, embeddings, df
+
+
+def build_recommender(n, dim=384, seed=0, workdir=None, regions=REGIONS, concentration=None, centers=None):
+    """
+    Writes synthetic artifacts to `workdir` and returns a Recommender wired to
+    the hash encoder and fixture pool. The embedding cache is disabled so every
+    request pays the encode stage.
+    """
+    from recommender.recommender import Recommender
+
+    encoder = HashEncoder(dim)
+    ids, embeddings, df = synthetic_catalog(n, encoder, seed, regions=regions, concentration=concentration,
+                                         centers=centers)
+    index = faiss.IndexFlatIP(dim)
+    index.add(embeddings)
+
+    index_path = os.path.join(workdir, 'location_index.faiss')
+    ids_path = os.path.join(workdir, 'location_ids.npy')
+    descriptions_path = os.path.join(workdir, 'descriptions.csv')
+    store_path = os.path.join(workdir, 'descriptions.bin')
+    faiss.write_index(index, index_path)
+    np.save(ids_path, ids)
+    pd.DataFrame({'id': ids, 'description': 'A synthetic place.'}).to_csv(descriptions_path, index=False)
+    DescriptionStore.write(['A synthetic place.'] * n, store_path, ids)
+    del index, embeddings
+
+    os.environ.update(EMBEDDING_CACHE_PATH='', EMBEDDING_CACHE_SIZE='0', CATALOG_REFRESH_INTERVAL='0')
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Recommender({}, index_path=index_path, ids_path=ids_path, descriptions_path=descriptions_path,
+                           store_path=store_path, encoder=encoder, db_pool=FixturePool(df))
+
+
+def random_queries(rng, count):
+    queries = []
+    for _ in range(count):
+        picked = rng.choice(len(CATEGORIES), size=rng.integers(2, 4), replace=False)
+        queries.append(" and ".join(CATEGORIES[i] for i in picked))
+    return queries
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_size(n, requests, k, dim, seed, memory_requests):
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        recommender = build_recommender(n, dim, seed, workdir)
+        build_seconds = time.perf_counter() - start
+
+    timings = defaultdict(list)
+    current = {}
+    recommender.stage_observer = lambda stage, seconds: current.__setitem__(stage, current.get(stage, 0.0) + seconds)
+    lat, lon = BUSAN
+    planned = 0
+
+    for query in random_queries(rng, requests):
+        current.clear()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = recommender.get_recommendations(query, lat, lon, k_per_sub_query=k)
+        timings['total'].append(time.perf_counter() - start)
+        for stage, seconds in current.items():
+            timings[stage].append(seconds)
+        planned += bool(plan)
+
+    # Separate pass: tracemalloc slows allocation-heavy code, so it is kept out of the timings.
+    recommender.stage_observer = None
+    tracemalloc.start()
+    for query in random_queries(rng, memory_requests):
+        with contextlib.redirect_stdout(io.StringIO()):
+            recommender.get_recommendations(query, lat, lon, k_per_sub_query=k)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'locations': n,
+        'requests': requests,
+        'planned': planned,
+        'build_seconds': round(build_seconds, 2),
+        'index_mb': round(recommender.faiss_index.ntotal * dim * 4 / 2**20, 1),
+        'request_peak_mb': round(peak / 2**20, 2),
+        'process_peak_rss_mb': round(_peak_rss_mb(), 1),
+        'stages_ms': {
+            stage: {
+                'p50': round(1000 * float(np.percentile(values, 50)), 3),
+                'p95': round(1000 * float(np.percentile(values, 95)), 3),
+                'max': round(1000 * float(np.max(values)), 3),
+            }
+            for stage, values in timings.items()
+        },
+    }
+
+
+STAGES = ['encode', 'spatial', 'search', 'fetch', 'region', 'scoring', 'planning', 'total']
+
+
+def print_report(result):
+    print(f"\n{result['locations']:,} locations  (build {result['build_seconds']}s, "
+          f"index {result['index_mb']} MB, {result['planned']}/{result['requests']} requests planned)")
+    print(f"  {'stage':<10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage in STAGES:
+        stats = result['stages_ms'].get(stage)
+        if stats:
+            print(f"  {stage:<10}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['max']:>10.2f}")
+    print(f"  peak traced memory per request batch: {result['request_peak_mb']} MB, "
+          f"process peak RSS: {result['process_peak_rss_mb']} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated catalog sizes, e.g. 1000,10000,100000,1000000')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--memory-requests', type=int, default=5)
+    parser.add_argument('--k', type=int, default=20, help='FAISS hits per sub-query')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        result = bench_size(size, args.requests, args.k, args.dim, args.seed, args.memory_requests)
+        print_report(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,116 @@
+"""
+Global vs region-routed retrieval (RETRIEVAL_MODE=region) on a synthetic
+multi-city catalog: every city has the districts of bench_recommender, and
+every district its own category mix.
+
+For each mode it reports the in-region candidates handed to scoring and
+planning, the vectors scanned per query, in-region candidates per 1k vectors
+scanned, the share of sub-queries the winning region covers, the mean
+similarity of its top 5 candidates, search and end-to-end latency, and how
+often region routing picks the same winning region as the global search:
+
+    python -m benchmarks.bench_region_routing --cities 1,4,16 --locations-per-city 20000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.bench_recommender import BUSAN, REGIONS, build_recommender, random_queries
+
+
+def city_regions(cities):
+    return [f"city{city} {district}" for city in range(cities) for district in REGIONS]
+
+
+def run_mode(recommender, mode, queries, k):
+    recommender.retrieval_mode = mode
+    router = recommender.region_router() if mode == 'region' else None
+    stats = defaultdict(list)
+    winners = []
+
+    rank_candidates = recommender.rank_candidates
+
+    def recording_rank(*args, **kwargs):
+        df_final, hours = rank_candidates(*args, **kwargs)
+        stats['in_region'].append(0 if df_final is None else len(df_final))
+        if df_final is not None:
+            candidates = args[0]
+            stats['coverage'].append(df_final['source_query'].nunique() / len(candidates.sub_queries))
+            stats['top_similarity'].append(df_final['similarity_score'].nlargest(5).mean())
+        winners.append(None if df_final is None else df_final['region'].iloc[0])
+        return df_final, hours
+
+    route = router.route if router is not None else None
+
+    def recording_route(emb, top_regions=3):
+        regions = route(emb, top_regions)
+        stats['scanned'].append(sum(len(router.members[r]) for r in regions))
+        return regions
+
+    recommender.rank_candidates = recording_rank
+    if router is not None:
+        router.route = recording_route
+    current = {}
+    recommender.stage_observer = lambda stage, seconds: current.__setitem__(stage, seconds)
+    try:
+        for query in queries:
+            current.clear()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                recommender.get_recommendations(query, *BUSAN, k_per_sub_query=k)
+            stats['total'].append(time.perf_counter() - start)
+            stats['search'].append(current.get('search', 0.0))
+            if router is None:
+                stats['scanned'].append(recommender.faiss_index.ntotal)
+    finally:
+        recommender.rank_candidates = rank_candidates
+        recommender.stage_observer = None
+        if router is not None:
+            router.route = route
+    return stats, winners
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', default='1,4,16')
+    parser.add_argument('--locations-per-city', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--concentration', type=float, default=0.3,
+                        help='Dirichlet concentration of per-district category mixes (lower = more specialized)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for cities in (int(c) for c in args.cities.split(',')):
+        os.environ['RETRIEVAL_MODE'] = 'global'
+        with tempfile.TemporaryDirectory() as workdir:
+            recommender = build_recommender(args.locations_per_city * cities, args.dim, args.seed, workdir,
+                                            regions=city_regions(cities), concentration=args.concentration)
+        queries = random_queries(np.random.default_rng(args.seed), args.requests)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            recommender.region_router()
+        router_seconds = time.perf_counter() - start
+
+        results = {}
+        for mode in ('global', 'region'):
+            results[mode] = run_mode(recommender, mode, queries, args.k)
+        same = np.mean([a == b for a, b in zip(results['global'][1], results['region'][1])])
+
+        print(f"\n{cities} cities, {recommender.faiss_index.ntotal:,} locations, "
+              f"{len(city_regions(cities))} regions (router built in {router_seconds:.1f}s)")
+        print(f"  {'mode':<8}{'in-region':>10}{'scanned':>10}{'per 1k':>8}{'coverage':>10}{'top5 sim':>10}"
+              f"{'search ms':>11}{'total ms':>10}")
+        for mode, (stats, _) in results.items():
+            in_region, scanned = np.mean(stats['in_region']), np.mean(stats['scanned'])
+            print(f"  {mode:<8}{in_region:>10.1f}{scanned:>10.0f}{1000 * in_region / scanned:>8.2f}"
+                  f"{np.mean(stats['coverage']):>10.2f}{np.mean(stats['top_similarity']):>10.3f}"
+                  f"{1000 * np.median(stats['search']):>11.2f}{1000 * np.median(stats['total']):>10.2f}")
+        print(f"  same winning region as global: {100 * same:.0f}%")
@@ -0,0 +1,116 @@
+"""
+Micro-benchmark for the retrieval-to-scoring stage: FAISS hits -> deduplicated
+candidates -> winning region -> scored and ranked DataFrame for the planner.
+
+Runs the numpy implementation used by Recommender (recommender/scoring.py)
+next to the previous pandas implementation, kept here as a reference, on
+the same hits from the synthetic catalog of bench_recommender. Checks that
+both return the same ranked candidates and scores, and reports per-query
+latency:
+
+    python -m benchmarks.bench_scoring --locations 10000 --queries 300
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_recommender import BUSAN, build_recommender, random_queries
+from recommender.scoring import Candidates
+from recommender.utils import deconstruct_query, haversine
+
+
+def pandas_rank(recommender, sub_queries, sub_query_hits, user_lat, user_lon, when):
+    """The DataFrame-based implementation this stage replaced (dedup keeps the best hit)."""
+    candidate_pool = []
+    for sub_q in sub_queries:
+        for position, score in sub_query_hits[sub_q]:
+            candidate_pool.append({
+                'id': recommender.location_ids[position], 'position': position,
+                'similarity_score': score, 'source_query': sub_q
+            })
+    df_candidates = pd.DataFrame(candidate_pool)
+    df_candidates = df_candidates.sort_values('similarity_score', ascending=False, kind='stable') \
+        .drop_duplicates('id').sort_index()
+
+    snapshot = recommender.catalog.snapshot
+    df_db = snapshot.take(df_candidates['position'])
+    df_candidates = df_candidates.set_index('id').join(df_db, how='inner')
+
+    region_score = df_candidates.groupby('region').agg(
+        total_score=('similarity_score', 'sum'),
+        query_coverage=('source_query', 'nunique')
+    )
+    region_score['final_region_score'] = (region_score['query_coverage'] ** 2) * region_score['total_score']
+    winning_region = region_score['final_region_score'].idxmax()
+    df_final = df_candidates[df_candidates['region'] == winning_region].copy()
+
+    df_final['distance_km'] = haversine(user_lat, user_lon, df_final['latitude'], df_final['longitude'])
+    df_final['distance_penalty'] = 1 / (1 + df_final['distance_km']**2)
+    hours = snapshot.hours.take(df_final['position'])
+    df_final['time_bonus'] = np.where(hours.is_open_at(when, when.hour * 60 + when.minute), 1.2, 1.0)
+    df_final['final_score'] = df_final['similarity_score'] * df_final['distance_penalty'] * df_final['time_bonus']
+    order = np.argsort(-df_final['final_score'].to_numpy(), kind='stable')
+    return df_final.take(order)
+
+
+def numpy_rank(recommender, sub_queries, sub_query_hits, user_lat, user_lon, when):
+    candidates = Candidates.from_hits(sub_queries, sub_query_hits, recommender.location_ids).dedup()
+    candidates, df_db = recommender._lookup_locations(candidates)
+    df_final, _ = recommender.rank_candidates(candidates, df_db, user_lat, user_lon, when)
+    return df_final
+
+
+def _time(fn, args, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return result, min(latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--k', type=int, default=20, help='FAISS hits per sub-query')
+    parser.add_argument('--repeats', type=int, default=5, help='timed runs per query (best is kept)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        recommender = build_recommender(args.locations, seed=args.seed, workdir=workdir)
+    rng = np.random.default_rng(args.seed)
+    lat, lon = BUSAN
+    when = datetime.now()
+
+    timings = {'pandas': [], 'numpy': []}
+    mismatches = 0
+    sizes = []
+    for query in random_queries(rng, args.queries):
+        sub_queries = deconstruct_query(query)
+        hits = recommender.search_sub_queries([query], args.k)
+        call = (recommender, sub_queries, hits, lat, lon, when)
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected, pandas_seconds = _time(pandas_rank, call, args.repeats)
+            actual, numpy_seconds = _time(numpy_rank, call, args.repeats)
+        timings['pandas'].append(pandas_seconds)
+        timings['numpy'].append(numpy_seconds)
+        sizes.append(sum(len(h) for h in hits.values()))
+        same = (actual is not None and expected.index.tolist() == actual.index.tolist()
+                and np.allclose(expected['final_score'].to_numpy(dtype='float64'),
+                                actual['final_score'].to_numpy(dtype='float64')))
+        mismatches += not same
+
+    print(f"\n{args.queries} queries, {args.locations:,} locations, ~{np.mean(sizes):.0f} hits per query")
+    print(f"  {'impl':<8}{'p50 us':>10}{'p95 us':>10}")
+    for impl, values in timings.items():
+        print(f"  {impl:<8}{1e6 * np.percentile(values, 50):>10.0f}{1e6 * np.percentile(values, 95):>10.0f}")
+    speedup = np.median(np.array(timings['pandas']) / np.array(timings['numpy']))
+    print(f"  median speedup: {speedup:.1f}x, ranking mismatches: {mismatches}")
@@ -0,0 +1,156 @@
+"""
+Global vs radius-bounded retrieval (SEARCH_RADIUS_KM) on a synthetic catalog
+of cities ~100 km apart, with the user in the first one.
+
+Checks SpatialIndex.within/nearest against a brute-force haversine scan,
+checks that the exact subset search and the FAISS id-selector search return
+the same hits, then reports for each mode the vectors scored per query, the
+share of ranked candidates within the radius (in both modes), and spatial,
+search and end-to-end latency. With the filter on, search cost should stay
+flat as cities are added:
+
+    python -m benchmarks.bench_spatial --cities 1,4,16 --locations-per-city 20000 --radius-km 15
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.bench_recommender import BUSAN, REGIONS, build_recommender, random_queries
+from recommender.utils import haversine
+
+
+def city_layout(cities):
+    """Region names and per-region origins: cities on a 1-degree grid starting at BUSAN."""
+    regions, centers = [], []
+    for city in range(cities):
+        origin = (BUSAN[0] + city // 4, BUSAN[1] + city % 4)
+        regions += [f"city{city} {district}" for district in REGIONS]
+        centers += [origin] * len(REGIONS)
+    return regions, centers
+
+
+def check_spatial_index(recommender, rng, points, radius_km, k):
+    """Mismatches of within() and nearest() against a brute-force scan, and their median latency."""
+    snapshot = recommender.catalog.snapshot
+    spatial = snapshot.spatial
+    latitude, longitude = spatial.latitude, spatial.longitude
+    valid = np.flatnonzero(snapshot.present)
+    mismatches = 0
+    timings = defaultdict(list)
+    for position in rng.choice(valid, size=points):
+        lat = latitude[position] + rng.normal(0, 0.05)
+        lon = longitude[position] + rng.normal(0, 0.05)
+        distances = haversine(lat, lon, latitude[valid], longitude[valid])
+
+        start = time.perf_counter()
+        inside, _ = spatial.within(lat, lon, radius_km)
+        timings['within'].append(time.perf_counter() - start)
+        mismatches += set(inside.tolist()) != set(valid[distances <= radius_km].tolist())
+
+        start = time.perf_counter()
+        _, nearest_distances = spatial.nearest(lat, lon, k)
+        timings['nearest'].append(time.perf_counter() - start)
+        mismatches += not np.allclose(nearest_distances, np.sort(distances)[:k])
+    return mismatches, {name: np.median(values) for name, values in timings.items()}
+
+
+def check_subset_search(recommender, queries, k):
+    """Queries whose hits differ between the exact subset search and the id-selector search."""
+    allowed = recommender.spatial_filter(*BUSAN)
+    subset_fraction = recommender.spatial_subset_fraction
+    mismatches = 0
+    try:
+        for query in queries:
+            recommender.spatial_subset_fraction = 1.0
+            exact = recommender.search_sub_queries([query], k, allowed=allowed)
+            recommender.spatial_subset_fraction = 0.0
+            selected = recommender.search_sub_queries([query], k, allowed=allowed)
+            mismatches += any([p for p, _ in exact[q]] != [p for p, _ in selected[q]] for q in exact)
+    finally:
+        recommender.spatial_subset_fraction = subset_fraction
+    return mismatches
+
+
+def run_mode(recommender, radius_km, queries, k, reference_km):
+    recommender.search_radius_km = radius_km
+    stats = defaultdict(list)
+    rank_candidates = recommender.rank_candidates
+
+    def recording_rank(*args, **kwargs):
+        df_final, hours = rank_candidates(*args, **kwargs)
+        if df_final is not None:
+            stats['in_radius'].append(np.mean(df_final['distance_km'] <= reference_km))
+        return df_final, hours
+
+    spatial_filter = recommender.spatial_filter
+
+    def recording_filter(*args, **kwargs):
+        allowed = spatial_filter(*args, **kwargs)
+        ntotal = recommender.faiss_index.ntotal
+        subset = allowed is not None and len(allowed) <= recommender.spatial_subset_fraction * ntotal
+        stats['scored'].append(len(allowed) if subset else ntotal)
+        return allowed
+
+    current = {}
+    recommender.rank_candidates = recording_rank
+    recommender.spatial_filter = recording_filter
+    recommender.stage_observer = lambda stage, seconds: current.__setitem__(stage, seconds)
+    try:
+        for query in queries:
+            current.clear()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                recommender.get_recommendations(query, *BUSAN, k_per_sub_query=k)
+            stats['total'].append(time.perf_counter() - start)
+            stats['spatial'].append(current.get('spatial', 0.0))
+            stats['search'].append(current.get('search', 0.0))
+    finally:
+        del recommender.rank_candidates, recommender.spatial_filter
+        recommender.stage_observer = None
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', default='1,4,16')
+    parser.add_argument('--locations-per-city', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--radius-km', type=float, default=15.0)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--check-points', type=int, default=200, help='random points checked against brute force')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for cities in (int(c) for c in args.cities.split(',')):
+        os.environ.update(RETRIEVAL_MODE='global', SEARCH_RADIUS_KM='0', SEARCH_NEAREST='0')
+        regions, centers = city_layout(cities)
+        with tempfile.TemporaryDirectory() as workdir:
+            recommender = build_recommender(args.locations_per_city * cities, args.dim, args.seed, workdir,
+                                            regions=regions, centers=centers)
+        rng = np.random.default_rng(args.seed)
+        queries = random_queries(rng, args.requests)
+
+        index_mismatches, index_seconds = check_spatial_index(recommender, rng, args.check_points,
+                                                              args.radius_km, args.k)
+        recommender.search_radius_km = args.radius_km
+        with contextlib.redirect_stdout(io.StringIO()):
+            search_mismatches = check_subset_search(recommender, queries[:20], args.k)
+
+        print(f"\n{cities} cities, {recommender.faiss_index.ntotal:,} locations, radius {args.radius_km:g} km")
+        print(f"  spatial index: within {1e6 * index_seconds['within']:.0f} us, "
+              f"nearest({args.k}) {1e6 * index_seconds['nearest']:.0f} us, "
+              f"{index_mismatches} mismatches vs brute force; subset vs selector search mismatches: "
+              f"{search_mismatches}")
+        print(f"  {'mode':<8}{'scored':>10}{'in radius':>11}{'spatial ms':>12}{'search ms':>11}{'total ms':>10}")
+        for mode, radius_km in (('global', 0.0), ('radius', args.radius_km)):
+            stats = run_mode(recommender, radius_km, queries, args.k, args.radius_km)
+            print(f"  {mode:<8}{np.mean(stats['scored']):>10.0f}{np.mean(stats['in_radius']):>11.2f}"
+                  f"{1000 * np.median(stats['spatial']):>12.3f}{1000 * np.median(stats['search']):>11.2f}"
+                  f"{1000 * np.median(stats['total']):>10.2f}")
@@ -0,0 +1,148 @@
+"""
+Compares the encoder backends in recommender/encoders.py against the torch
+SentenceTransformer baseline.
+
+Each backend runs in a fresh subprocess so import cost and memory are measured
+the way a new uvicorn worker pays them: load seconds (imports + model), RSS
+after loading, single-query encode latency (p50/p95, the shape of /schedule
+sub-queries) and batch throughput. The parent then checks the cosine
+similarity of every backend's embeddings against torch and exits non-zero
+when the minimum falls below --threshold.
+
+    python -m benchmarks.compare_encoders --onnx-dir models/all-MiniLM-L6-v2-onnx
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SAMPLE_QUERIES = [
+    'korean bbq', 'quiet cafe with a view', 'jazz club', 'museum', 'beach walk at sunset',
+    'seafood restaurant near haeundae', 'dessert cafe', 'shopping', 'rainy day indoor activities',
+    'traditional market street food', 'wine bar', 'park for a picnic', 'brunch', 'night view',
+    'family friendly entertainment', 'japanese izakaya', 'temple', 'whisky bar', 'bakery', 'art gallery',
+]
+
+
+def _rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def run_worker(backend, model_name, onnx_dir, texts_path, out_path, repeats):
+    """Loads one backend, times it and saves its embeddings (runs in the subprocess)."""
+    start = time.perf_counter()
+    from recommender.encoders import load_encoder
+    encoder = load_encoder(backend, model_name, onnx_dir)
+    load_seconds = time.perf_counter() - start
+    rss_mb = _rss_mb()
+
+    with open(texts_path) as f:
+        texts = json.load(f)
+    embeddings = encoder.encode(texts, batch_size=32)
+
+    latencies = []
+    for _ in range(repeats):
+        for text in texts[:len(SAMPLE_QUERIES)]:
+            start = time.perf_counter()
+            encoder.encode([text], batch_size=1)
+            latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    encoder.encode(texts, batch_size=32)
+    batch_seconds = time.perf_counter() - start
+
+    np.save(out_path, np.asarray(embeddings, dtype='float32'))
+    print(json.dumps({
+        'backend': getattr(encoder, 'name', backend),
+        'load_seconds': load_seconds,
+        'rss_mb': rss_mb,
+        'p50_ms': 1000 * float(np.percentile(latencies, 50)),
+        'p95_ms': 1000 * float(np.percentile(latencies, 95)),
+        'texts_per_second': len(texts) / batch_seconds,
+    }))
+
+
+def _cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def sample_texts(descriptions):
+    """Sample sub-queries plus the first `descriptions` location descriptions (longer inputs)."""
+    texts = list(SAMPLE_QUERIES)
+    if descriptions:
+        from recommender.description_store import DescriptionStore
+        store = DescriptionStore.open('descriptions.bin')
+        if store is not None:
+            texts += [store.get(i) for i in range(min(descriptions, len(store)))]
+    return texts
+
+
+def compare(backends, model_name, onnx_dir, descriptions, repeats, threshold):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        texts_path = os.path.join(workdir, 'texts.json')
+        with open(texts_path, 'w') as f:
+            json.dump(sample_texts(descriptions), f)
+        for backend in backends:
+            out_path = os.path.join(workdir, f"{backend}.npy")
+            command = [sys.executable, '-m', 'benchmarks.compare_encoders', '--worker', backend,
+                       '--model', model_name, '--texts', texts_path, '--out', out_path, '--repeats', str(repeats)]
+            if onnx_dir:
+                command += ['--onnx-dir', onnx_dir]
+            proc = subprocess.run(command, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"{backend}: failed\n{proc.stderr.strip()}")
+                continue
+            stats = json.loads(proc.stdout.strip().splitlines()[-1])
+            stats['embeddings'] = np.load(out_path)
+            results[backend] = stats
+
+    baseline = results.get('torch')
+    print(f"\n{'backend':<28}{'load s':>8}{'RSS MB':>9}{'p50 ms':>9}{'p95 ms':>9}{'texts/s':>9}"
+          f"{'min cos':>9}{'mean cos':>10}")
+    ok = True
+    for backend, stats in results.items():
+        min_cos = mean_cos = float('nan')
+        if baseline is not None:
+            cos = _cosine(stats['embeddings'], baseline['embeddings'])
+            min_cos, mean_cos = float(cos.min()), float(cos.mean())
+            ok = ok and min_cos >= threshold
+        print(f"{stats['backend']:<28}{stats['load_seconds']:>8.2f}{stats['rss_mb']:>9.0f}{stats['p50_ms']:>9.2f}"
+              f"{stats['p95_ms']:>9.2f}{stats['texts_per_second']:>9.0f}{min_cos:>9.4f}{mean_cos:>10.4f}")
+    if baseline is None:
+        print("No torch baseline; cosine similarity was not checked.")
+        return len(results) == len(backends)
+    print(f"Cosine similarity vs torch {'>=' if ok else 'BELOW'} {threshold}")
+    return ok and len(results) == len(backends)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default='torch,onnx,onnx-int8')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--onnx-dir', help='exported model directory (default: ENCODER_ONNX_DIR)')
+    parser.add_argument('--descriptions', type=int, default=100,
+                        help='also encode this many location descriptions from descriptions.bin')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.98, help='minimum cosine similarity vs torch')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--texts', help=argparse.SUPPRESS)
+    parser.add_argument('--out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.model, args.onnx_dir, args.texts, args.out, args.repeats)
+    else:
+        passed = compare(args.backends.split(','), args.model, args.onnx_dir, args.descriptions,
+                         args.repeats, args.threshold)
+        sys.exit(0 if passed else 1)
@@ -0,0 +1,129 @@
+"""
+Checks the exact DP planner against beam search and an exhaustive search on
+random candidate pools, and reports planning latency.
+
+    python -m benchmarks.planner_dp_check --trials 200 --size 60
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from itinerary.itinerary_planner import ItineraryPlanner
+from recommender.operating_hours import DAYS, HoursTable
+
+CATEGORIES = ['korean restaurant', 'cafe', 'museum', 'jazz club', 'park', 'bakery',
+              'italian restaurant', 'shopping', 'wine bar', 'entertainment', 'beach']
+HOURS = ['10:00-22:00', '09:00-18:00', '11:00-15:00', '18:00-02:00', '24 hours', 'Closed']
+
+
+def random_candidates(rng, size, n_queries=3):
+    rows = []
+    for i in range(size):
+        category = rng.choice(CATEGORIES)
+        rows.append({
+            'id': i + 1,
+            'name': f"place {i + 1}",
+            'primary_category': category,
+            'source_query': f"query {rng.randrange(n_queries)}",
+            'final_score': rng.random(),
+            'operating_hours': {d: rng.choice(HOURS) for d in DAYS},
+            'latitude': 35.1, 'longitude': 129.0,
+        })
+    return pd.DataFrame(rows).set_index('id')
+
+
+def objective(planner, df, ids):
+    """Beam-search objective of a chosen id sequence."""
+    total, last_category, covered = 0.0, None, set()
+    for loc_id in ids:
+        row = df.loc[loc_id]
+        category = planner._categorize_location(row)
+        total += row['final_score']
+        if last_category is not None:
+            total += planner.transition_scores.get((last_category, category), 0)
+            if row['source_query'] not in covered:
+                total += planner.coverage_bonus
+        last_category = category
+        covered.add(row['source_query'])
+    return total
+
+
+def exhaustive_best(planner, df, day):
+    """Best objective by enumerating every schedule (small pools only)."""
+    hours = HoursTable.compile(df['operating_hours'])
+    categories = np.array([planner._categorize_location(row) for _, row in df.iterrows()])
+    eligible = planner._slot_eligibility(categories, planner._open_masks(hours, day))
+    if not eligible[0].any():
+        return None
+    ids = df.index.tolist()
+    best = [None]
+
+    def walk(slot, path):
+        if slot == len(planner.schedule_structure):
+            score = objective(planner, df, [ids[j] for j in path])
+            best[0] = score if best[0] is None else max(best[0], score)
+            return
+        options = [j for j in np.flatnonzero(eligible[slot]) if j not in path]
+        if not options:
+            walk(slot + 1, path)
+        for j in options:
+            walk(slot + 1, path + [j])
+
+    walk(0, [])
+    return best[0]
+
+
+def run(trials, size, small_size, seed):
+    rng = random.Random(seed)
+    planner = ItineraryPlanner()
+    day = date(2025, 9, 14)
+    dp_times, beam_times, dp_wins, mismatches = [], [], 0, 0
+
+    for trial in range(trials):
+        df = random_candidates(rng, size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            dp_plan = planner.plan_day(df.copy(), mode="dp", day=day)
+            dp_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            beam_plan = planner.plan_day(df.copy(), mode="beam", beam_width=3, day=day)
+            beam_times.append(time.perf_counter() - start)
+
+        dp_score = objective(planner, df, [p['id'] for p in dp_plan])
+        beam_score = objective(planner, df, [p['id'] for p in beam_plan])
+        if len(beam_plan) == len(dp_plan) and beam_score > dp_score + 1e-9:
+            mismatches += 1
+            print(f"trial {trial}: beam {beam_score:.4f} beat DP {dp_score:.4f}")
+        if dp_score > beam_score + 1e-9:
+            dp_wins += 1
+
+        small = random_candidates(rng, small_size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            small_plan = planner.plan_day(small.copy(), mode="dp", day=day)
+        expected = exhaustive_best(planner, small, day)
+        got = objective(planner, small, [p['id'] for p in small_plan]) if small_plan else None
+        if (expected is None) != (got is None) or (expected is not None and abs(expected - got) > 1e-9):
+            mismatches += 1
+            print(f"trial {trial}: DP {got} != exhaustive {expected}")
+
+    print(f"{trials} trials, {size} candidates per pool")
+    print(f"  DP   mean {1000 * np.mean(dp_times):.2f} ms, p95 {1000 * np.percentile(dp_times, 95):.2f} ms")
+    print(f"  beam mean {1000 * np.mean(beam_times):.2f} ms, p95 {1000 * np.percentile(beam_times, 95):.2f} ms")
+    print(f"  DP strictly better than beam in {dp_wins} trials; mismatches: {mismatches}")
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trials', type=int, default=100)
+    parser.add_argument('--size', type=int, default=60)
+    parser.add_argument('--small-size', type=int, default=9)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    raise SystemExit(1 if run(args.trials, args.size, args.small_size, args.seed) else 0)
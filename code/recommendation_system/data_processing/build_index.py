@@ -1,10 +1,70 @@
+import argparse
+import math
+import os
+import sys
+
 import faiss
 import numpy as np
 
-def build_and_save_index(embedding_file, index_file):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recommender.artifacts import replace_file  # noqa: E402
+
+# Index specs accepted by build_index / build_and_save_index, as faiss.index_factory strings.
+# All indexes use inner product on L2-normalized vectors (cosine similarity).
+INDEX_SPECS = {
+    'flat': lambda p: "Flat",
+    'ivf_flat': lambda p: f"IVF{p['nlist']},Flat",
+    'ivf_pq': lambda p: f"IVF{p['nlist']},PQ{p['pq_m']}x{p['pq_nbits']}",
+    'ivf_sq8': lambda p: f"IVF{p['nlist']},SQ8",
+    'hnsw': lambda p: f"HNSW{p['hnsw_m']},Flat",
+    'sq8': lambda p: "SQ8",
+    'fp16': lambda p: "SQfp16",
+}
+
+
+def default_params(n, dim, nlist=None, pq_m=None, pq_nbits=8, hnsw_m=32, ef_construction=200):
+    """
+    Fills in tunables that depend on the data: nlist ~ 4*sqrt(n) (with at
+    least 39 training points per list), PQ sub-quantizers of 8 dimensions,
+    and at most 2^nbits <= n PQ centroids so small catalogs still train.
+    """
+    if nlist is None:
+        nlist = max(1, min(int(4 * math.sqrt(n)), n // 39))
+    if pq_m is None:
+        pq_m = next(m for m in (dim // 8, dim // 4, dim // 2, dim) if m and dim % m == 0)
+    pq_nbits = max(1, min(pq_nbits, int(math.log2(max(n, 2)))))
+    return {'nlist': nlist, 'pq_m': pq_m, 'pq_nbits': pq_nbits, 'hnsw_m': hnsw_m,
+            'ef_construction': ef_construction}
+
+
+def build_index(embeddings, spec='flat', **params):
     """
-    Loads embeddings, NORMALIZES them, builds a FAISS IndexFlatIP index,
-    and saves the index to disk.
+    Builds (and trains, if needed) a FAISS index of the given spec over
+    L2-normalized float32 embeddings. Row i of `embeddings` gets label i.
+    """
+    if spec not in INDEX_SPECS:
+        raise ValueError(f"unknown index spec '{spec}', expected one of {sorted(INDEX_SPECS)}")
+    n, dim = embeddings.shape
+    params = default_params(n, dim, **params)
+    factory = INDEX_SPECS[spec](params)
+
+    print(f"Building FAISS index '{factory}' (inner product) with dimension {dim}...")
+    index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+    if spec == 'hnsw':
+        faiss.downcast_index(index).hnsw.efConstruction = params['ef_construction']
+    if not index.is_trained:
+        print(f"Training on {n} vectors...")
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+
+def build_and_save_index(embedding_file, index_file, spec='flat', **params):
+    """
+    Loads embeddings, NORMALIZES them, builds a FAISS index of the given spec
+    (flat, ivf_flat, ivf_pq, ivf_sq8, hnsw, sq8, fp16) and saves it to disk.
+    Search-time knobs (nprobe, efSearch) are set by the Recommender when the
+    index is loaded, not stored here.
     """
     try:
         # Load the embeddings from the .npy file
@@ -17,20 +77,14 @@ def build_and_save_index(embedding_file, index_file):
         print("Normalizing embeddings to unit length...")
         faiss.normalize_L2(embeddings)
 
-        embedding_dimension = embeddings.shape[1]
-
-        # --- FIX 2: USE IndexFlatIP FOR COSINE SIMILARITY ---
-        # IndexFlatIP (Inner Product) is the correct index for comparing normalized text vectors.
-        print(f"Building FAISS IndexFlatIP with dimension {embedding_dimension}...")
-        index = faiss.IndexFlatIP(embedding_dimension)
-
-        # Add the normalized embeddings to the index
-        index.add(embeddings)
+        # --- FIX 2: INNER PRODUCT FOR COSINE SIMILARITY ---
+        # Every spec uses METRIC_INNER_PRODUCT, the correct metric for normalized text vectors.
+        index = build_index(embeddings, spec, **params)
         print(f"Successfully added {index.ntotal} vectors to the index.")
 
-        # Save the Index
+        # Save the Index (replaced, not overwritten: running workers memory-map it)
         print(f"Saving index to '{index_file}'...")
-        faiss.write_index(index, index_file)
+        replace_file(index_file, lambda tmp_path: faiss.write_index(index, tmp_path))
         print(f"Index saved successfully!")
 
     except FileNotFoundError:
@@ -39,7 +93,16 @@ def build_and_save_index(embedding_file, index_file):
         print(f"AN UNEXPECTED ERROR OCCURRED: {e}")
 
 if __name__ == '__main__':
-    embedding_filename = 'location_embeddings.npy'
-    index_filename = 'location_index.faiss'
+    parser = argparse.ArgumentParser(description="Build the FAISS location index.")
+    parser.add_argument('--embeddings', default='location_embeddings.npy')
+    parser.add_argument('--index', default='location_index.faiss')
+    parser.add_argument('--spec', default='flat', choices=sorted(INDEX_SPECS))
+    parser.add_argument('--nlist', type=int, help='IVF lists (default ~4*sqrt(n))')
+    parser.add_argument('--pq-m', type=int, help='PQ sub-quantizers (must divide the dimension)')
+    parser.add_argument('--pq-nbits', type=int, default=8)
+    parser.add_argument('--hnsw-m', type=int, default=32)
+    parser.add_argument('--ef-construction', type=int, default=200)
+    args = parser.parse_args()
 
-    build_and_save_index(embedding_filename, index_filename)
\ No newline at end of file
+    build_and_save_index(args.embeddings, args.index, args.spec, nlist=args.nlist, pq_m=args.pq_m,
+                         pq_nbits=args.pq_nbits, hnsw_m=args.hnsw_m, ef_construction=args.ef_construction)
@@ -0,0 +1,113 @@
+"""
+Recall-vs-latency report for the FAISS index specs in build_index.py.
+
+Every spec is built over the same normalized embeddings and compared with the
+exact IndexFlatIP: recall@k (share of the exact top-k returned), single-query
+latency (p50/p95) and serialized index size, for a sweep of nprobe (IVF) and
+efSearch (HNSW) values.
+
+    python evaluate_index.py --embeddings location_embeddings.npy
+    python evaluate_index.py --synthetic 200000 --specs flat,ivf_flat,ivf_pq,hnsw,sq8
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from build_index import INDEX_SPECS, build_index
+
+
+def synthetic_embeddings(n, dim, clusters=200, seed=0):
+    """Clustered unit vectors, closer to real text embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype('float32')
+    embeddings = centers[rng.integers(clusters, size=n)] + 0.6 * rng.standard_normal((n, dim)).astype('float32')
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def sample_queries(embeddings, count, seed=1):
+    """Perturbed catalog vectors, standing in for sub-query embeddings."""
+    rng = np.random.default_rng(seed)
+    queries = embeddings[rng.integers(len(embeddings), size=count)].copy()
+    queries += 0.3 * rng.standard_normal(queries.shape).astype('float32') / np.sqrt(queries.shape[1])
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def search_settings(index, nprobes, ef_searches):
+    """(parameter name, values) to sweep for this index type."""
+    if faiss.try_extract_index_ivf(index) is not None:
+        return 'nprobe', nprobes
+    if isinstance(faiss.downcast_index(index), faiss.IndexHNSW):
+        return 'efSearch', ef_searches
+    return None, [None]
+
+
+def time_queries(index, queries, k):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(q[None, :], k)
+        latencies.append(time.perf_counter() - start)
+    return 1000 * np.percentile(latencies, 50), 1000 * np.percentile(latencies, 95)
+
+
+def evaluate(embeddings, specs, k, n_queries, nprobes, ef_searches):
+    queries = sample_queries(embeddings, n_queries)
+    exact = faiss.IndexFlatIP(embeddings.shape[1])
+    exact.add(embeddings)
+    _, truth = exact.search(queries, k)
+
+    print(f"\n{len(embeddings)} vectors, dim {embeddings.shape[1]}, {n_queries} queries, recall@{k}")
+    print(f"{'spec':<10}{'setting':<14}{'recall':>8}{'p50 ms':>9}{'p95 ms':>9}{'size MB':>9}{'build s':>9}")
+    rows = []
+    for spec in specs:
+        start = time.perf_counter()
+        index = build_index(embeddings, spec)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 2**20
+
+        name, values = search_settings(index, nprobes, ef_searches)
+        for value in values:
+            if name is not None:
+                faiss.ParameterSpace().set_index_parameter(index, name, value)
+            _, found = index.search(queries, k)
+            p50, p95 = time_queries(index, queries, k)
+            recall = recall_at_k(found, truth)
+            setting = f"{name}={value}" if value is not None else "-"
+            print(f"{spec:<10}{setting:<14}{recall:>8.3f}{p50:>9.3f}{p95:>9.3f}{size_mb:>9.1f}{build_seconds:>9.1f}")
+            rows.append({'spec': spec, 'setting': setting, 'recall': recall, 'p50_ms': p50, 'p95_ms': p95,
+                         'size_mb': size_mb, 'build_seconds': build_seconds})
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--embeddings', default='location_embeddings.npy')
+    parser.add_argument('--synthetic', type=int, help='use N clustered synthetic vectors instead of --embeddings')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--specs', default=','.join(INDEX_SPECS))
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--nprobe', default='1,4,16,64')
+    parser.add_argument('--ef-search', default='16,64,256')
+    parser.add_argument('--threads', type=int, help='FAISS OpenMP threads (1 = per-request latency)')
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    if args.synthetic:
+        embeddings = synthetic_embeddings(args.synthetic, args.dim)
+    else:
+        embeddings = np.load(args.embeddings).astype('float32')
+        faiss.normalize_L2(embeddings)
+
+    evaluate(embeddings, args.specs.split(','), args.k, args.queries,
+             [int(v) for v in args.nprobe.split(',')], [int(v) for v in args.ef_search.split(',')])
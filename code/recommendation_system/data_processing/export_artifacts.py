@@ -0,0 +1,46 @@
+"""
+Converts the retrieval artifacts to memory-mappable formats:
+
+- location_ids.npy as a plain int64 array (older files are pickled object arrays),
+- descriptions_progress.csv as descriptions.bin + descriptions.offsets.npy,
+  aligned with location_ids.npy, plus descriptions.ids.npy recording those ids
+  (see recommender/description_store.py).
+
+    python export_artifacts.py --ids ../location_ids.npy --descriptions ../descriptions_progress.csv
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recommender.artifacts import save_npy  # noqa: E402
+from recommender.description_store import DescriptionStore  # noqa: E402
+
+
+def export_ids(ids_file):
+    ids = np.load(ids_file, allow_pickle=True).astype('int64')
+    save_npy(ids_file, ids)
+    print(f"Saved {len(ids)} ids to '{ids_file}' as int64.")
+    return ids
+
+
+def export_descriptions(ids, descriptions_file, store_file):
+    descriptions = pd.read_csv(descriptions_file, index_col='id')['description']
+    descriptions = descriptions[~descriptions.index.duplicated(keep='last')]
+    texts = descriptions.reindex(ids).fillna('').tolist()
+    DescriptionStore.write(texts, store_file, ids)
+    print(f"Saved {len(texts)} descriptions to '{store_file}'.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ids', default='location_ids.npy')
+    parser.add_argument('--descriptions', default='descriptions_progress.csv')
+    parser.add_argument('--store', help='output path (default: descriptions.bin next to --ids)')
+    args = parser.parse_args()
+
+    store = args.store or os.path.join(os.path.dirname(os.path.abspath(args.ids)), 'descriptions.bin')
+    export_descriptions(export_ids(args.ids), args.descriptions, store)
@@ -0,0 +1,81 @@
+"""
+Exports the SBERT model to ONNX for the onnx / onnx-int8 encoder backends
+(recommender/encoders.py):
+
+  model.onnx           fp32 transformer (token embeddings out)
+  model.int8.onnx      the same graph with dynamically quantized int8 weights
+  tokenizer.json       fast WordPiece tokenizer
+  encoder_config.json  model name, max sequence length, pooling settings
+
+Needs torch, sentence-transformers, onnx and onnxruntime at export time only.
+Check the result with benchmarks/compare_encoders.py before switching
+ENCODER_BACKEND.
+
+    python export_onnx.py --out ../models/all-MiniLM-L6-v2-onnx
+"""
+import argparse
+import json
+import os
+
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from sentence_transformers import SentenceTransformer
+
+
+class TokenEmbeddings(torch.nn.Module):
+    """Calls the transformer with named inputs and returns only the token embeddings."""
+    def __init__(self, transformer, input_names):
+        super().__init__()
+        self.transformer = transformer
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        return self.transformer(**dict(zip(self.input_names, inputs)))[0]
+
+
+def export_onnx(model_name, out_dir, opset=14):
+    print(f"Loading SentenceTransformer '{model_name}'...")
+    model = SentenceTransformer(model_name, device='cpu')
+    pooling = model[1]
+    # sentence-transformers < 6 exposes per-mode flags, later versions a single pooling_mode
+    if not (getattr(pooling, 'pooling_mode_mean_tokens', False) or getattr(pooling, 'pooling_mode', None) == 'mean'):
+        raise ValueError("only mean-pooled models are supported by the ONNX encoder")
+    normalize = any(type(module).__name__ == 'Normalize' for module in model)
+
+    os.makedirs(out_dir, exist_ok=True)
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    sample = tokenizer(["korean bbq near the beach", "cafe"], padding=True, return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['token_embeddings']}
+
+    fp32_path = os.path.join(out_dir, 'model.onnx')
+    print(f"Exporting '{fp32_path}'...")
+    with torch.no_grad():
+        torch.onnx.export(TokenEmbeddings(transformer, input_names), tuple(sample[name] for name in input_names), fp32_path,
+                          input_names=input_names, output_names=['token_embeddings'],
+                          dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+
+    int8_path = os.path.join(out_dir, 'model.int8.onnx')
+    print(f"Quantizing weights to int8: '{int8_path}'...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, 'encoder_config.json'), 'w') as f:
+        json.dump({
+            'model_name': os.path.basename(os.path.normpath(model_name)),
+            'max_seq_length': model.max_seq_length,
+            'normalize': normalize,
+            'pad_token': tokenizer.pad_token,
+        }, f, indent=2)
+    print("ONNX export finished.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--out', default=os.path.join('models', 'all-MiniLM-L6-v2-onnx'))
+    parser.add_argument('--opset', type=int, default=14)
+    args = parser.parse_args()
+
+    export_onnx(args.model, args.out, args.opset)
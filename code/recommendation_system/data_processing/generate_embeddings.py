@@ -10,6 +10,10 @@ import random
 import google.generativeai as genai
 from google.api_core import exceptions
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recommender.artifacts import save_npy
+from recommender.description_store import DescriptionStore
+
 # --- (The 'generate_gemini_description_json' function remains the same as the last version with exponential backoff) ---
 def generate_gemini_description_json(row, model):
     # This function with the retry logic is still needed and is unchanged.
@@ -126,10 +130,13 @@ def generate_and_save_embeddings(db_params, api_key):
     print(f"Encoding {len(sentences)} final descriptions into vectors...")
     
     location_embeddings = sbert_model.encode(sentences, show_progress_bar=True)
-    location_ids = df_final['id'].to_numpy()
+    # Plain int64 (not an object array) so the service can memory-map it
+    location_ids = df_final['id'].to_numpy(dtype='int64')
     
     np.save('location_embeddings.npy', location_embeddings)
-    np.save('location_ids.npy', location_ids)
+    # Replaced, not overwritten: running workers memory-map the ids
+    save_npy('location_ids.npy', location_ids)
+    DescriptionStore.write(sentences, 'descriptions.bin', location_ids)
     
     print("\nEmbeddings from Gemini descriptions generated successfully!")
     print(f"Embeddings matrix shape: {location_embeddings.shape}")
@@ -1,16 +1,34 @@
+import threading
+import time
+from collections import Counter
+
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from ortools.sat.python import cp_model
 
+from metrics import PLANNER_FALLBACKS_TOTAL, PLANNER_MODE_TOTAL, PLANNER_SECONDS
+from recommender.operating_hours import HoursTable
+
 class ItineraryPlanner:
-    def __init__(self):
+    def __init__(self, solver_workers=8, solver_time_limit=10.0):
+        """
+        `solver_workers` is the number of CP-SAT search workers and
+        `solver_time_limit` caps a single OR-Tools solve in seconds; a per-request
+        deadline passed to plan_day can shorten it further.
+        """
+        self.solver_workers = solver_workers
+        self.solver_time_limit = solver_time_limit
+        self.fallback_counts = Counter()
+        self._stats_lock = threading.Lock()
+        # 'duration' is the planned visit length in minutes; a place must stay open for all of it
         self.schedule_structure = [
-            {'slot': 'Lunch 🍱', 'time': '13:00', 'types': ['FOOD']},
-            {'slot': 'Activity 🌳', 'time': '14:00', 'types': ['AFTERNOON', 'ACTIVITY']},
-            {'slot': 'Activity 🌳', 'time': '15:00', 'types': ['AFTERNOON', 'ACTIVITY']},
-            {'slot': 'Cafe ☕', 'time': '16:30', 'types': ['CAFE']},
-            {'slot': 'Dinner 🍽️', 'time': '19:00', 'types': ['FOOD']},
-            {'slot': 'Evening ✨', 'time': '21:00', 'types': ['EVENING_EVENT']}
+            {'slot': 'Lunch 🍱', 'time': '13:00', 'duration': 60, 'types': ['FOOD']},
+            {'slot': 'Activity 🌳', 'time': '14:00', 'duration': 60, 'types': ['AFTERNOON', 'ACTIVITY']},
+            {'slot': 'Activity 🌳', 'time': '15:00', 'duration': 60, 'types': ['AFTERNOON', 'ACTIVITY']},
+            {'slot': 'Cafe ☕', 'time': '16:30', 'duration': 60, 'types': ['CAFE']},
+            {'slot': 'Dinner 🍽️', 'time': '19:00', 'duration': 90, 'types': ['FOOD']},
+            {'slot': 'Evening ✨', 'time': '21:00', 'duration': 90, 'types': ['EVENING_EVENT']}
         ]
 
         self.transition_scores = {
@@ -21,6 +39,7 @@ class ItineraryPlanner:
             ('AFTERNOON', 'FOOD'): 1.0,
             ('FOOD', 'FOOD'): -0.5,
         }
+        self.coverage_bonus = 2.0
 
     # Helper functions
     def _categorize_location(self, row):
@@ -40,39 +59,37 @@ class ItineraryPlanner:
         if any(k in tags for k in afternoon_keywords): return 'AFTERNOON'
         return 'ACTIVITY'
 
-    def _is_open_at(self, hours_json, day_str, time_str):
-        if not isinstance(hours_json, dict) or day_str not in hours_json:
-            return False
-        time_range = hours_json[day_str]
-        if time_range in ['Closed', '24 hours']:
-            return time_range == '24 hours'
-        try:
-            start, end = [t.strip() for t in time_range.split('-')]
-            if end < start:
-                return time_str >= start or time_str < end
-            else:
-                return start <= time_str < end
-        except (ValueError, AttributeError):
-            return False
+    def _schedule_categories(self, df_candidates):
+        """Schedule category per row, classifying each distinct primary_category once."""
+        if 'primary_category' not in df_candidates:
+            return np.full(len(df_candidates), self._categorize_location({}), dtype=object)
+        labels = {}
+        for value in df_candidates['primary_category'].unique():
+            labels[value] = self._categorize_location({'primary_category': value})
+        return df_candidates['primary_category'].map(labels).to_numpy(dtype=object)
+
+    def _open_masks(self, hours, day):
+        """One vectorized mask per schedule slot: open for the slot's whole visit duration."""
+        return [hours.is_open_for(day, step['time'], step['duration']) for step in self.schedule_structure]
 
     # Beam Search
-    def _plan_day_beam(self, df_candidates, beam_width=5):
+    def _plan_day_beam(self, df_candidates, day, hours, beam_width=5):
         print("\n[Beam Search] Building itinerary with Query-Coverage-Aware Beam Search...")
-        df_candidates['schedule_category'] = df_candidates.apply(self._categorize_location, axis=1)
+        df_candidates['schedule_category'] = self._schedule_categories(df_candidates)
 
-        current_day = datetime.now().strftime('%A').lower()
+        open_masks = self._open_masks(hours, day)
         beam = []
-        coverage_bonus = 2.0
+        coverage_bonus = self.coverage_bonus
 
         step_info = self.schedule_structure[0]
         pool = df_candidates[
-            (df_candidates['schedule_category'].isin(step_info['types'])) &
-            (df_candidates['operating_hours'].apply(lambda h: self._is_open_at(h, current_day, step_info['time'])))
+            (df_candidates['schedule_category'].isin(step_info['types'])) & open_masks[0]
         ]
 
         for index, location in pool.iterrows():
             beam.append({
                 'ids': [index],
+                'slots': [0],
                 'categories': [location['schedule_category']],
                 'score': location['final_score'],
                 'covered_queries': {location['source_query']}
@@ -80,14 +97,13 @@ class ItineraryPlanner:
         beam = sorted(beam, key=lambda x: x['score'], reverse=True)[:beam_width]
 
         # Expand through schedule
-        for step_info in self.schedule_structure[1:]:
+        for slot, (step_info, open_mask) in enumerate(zip(self.schedule_structure[1:], open_masks[1:]), start=1):
             potential_new_paths = []
+            slot_mask = df_candidates['schedule_category'].isin(step_info['types']).to_numpy() & open_mask
             for path in beam:
                 last_category = path['categories'][-1]
                 next_pool = df_candidates[
-                    (~df_candidates.index.isin(path['ids'])) &
-                    (df_candidates['schedule_category'].isin(step_info['types'])) &
-                    (df_candidates['operating_hours'].apply(lambda h: self._is_open_at(h, current_day, step_info['time'])))
+                    (~df_candidates.index.isin(path['ids'])) & slot_mask
                 ]
                 for index, next_location in next_pool.iterrows():
                     trans_score = self.transition_scores.get((last_category, next_location['schedule_category']), 0)
@@ -101,6 +117,7 @@ class ItineraryPlanner:
 
                     potential_new_paths.append({
                         'ids': path['ids'] + [index],
+                        'slots': path['slots'] + [slot],
                         'categories': path['categories'] + [next_location['schedule_category']],
                         'score': new_score,
                         'covered_queries': new_covered_queries
@@ -114,76 +131,266 @@ class ItineraryPlanner:
             print("Could not generate a full itinerary (Beam Search).")
             return []
 
-        return self._format_schedule(df_candidates, beam[0]['ids'])
+        return self._format_schedule(df_candidates, beam[0]['ids'], beam[0]['slots'])
+
+    def _slot_eligibility(self, categories, open_masks):
+        """(n_slots, n_candidates) bool matrix: category fits the slot and the place is open."""
+        return np.array([
+            np.isin(categories, step['types']) & open_mask
+            for step, open_mask in zip(self.schedule_structure, open_masks)
+        ]).reshape(len(self.schedule_structure), len(categories))
+
+    # Exact dynamic programming
+    def _dp_search(self, df_candidates, day, hours):
+        """
+        Finds the schedule maximizing the beam-search objective exactly:
+        sum of final_score, plus the transition score from the previous category
+        and the coverage bonus for each newly covered source query (both from the
+        second item on). A slot is skipped only when no unused place fits it.
+
+        The score of an item depends only on (category, source query), so in an
+        optimal plan a slot only ever holds one of the best (1 + other slots that
+        accept that category) items of such a class; the DP state is
+        (last category, covered queries, used items still eligible later).
+
+        Returns (score, [(slot index, row position), ...]) or None.
+        """
+        df_candidates['schedule_category'] = self._schedule_categories(df_candidates)
+
+        categories = df_candidates['schedule_category'].to_numpy()
+        scores = df_candidates['final_score'].to_numpy(dtype='float64')
+        query_codes, _ = pd.factorize(df_candidates['source_query'])
+        eligible = self._slot_eligibility(categories, self._open_masks(hours, day))
+        n_slots = len(self.schedule_structure)
+
+        if not eligible[0].any():
+            return None
+
+        # Best items per (category, query) class for each slot: (item, category, query, score).
+        options = []
+        for i in range(n_slots):
+            slot_items = np.flatnonzero(eligible[i])
+            slot_items = slot_items[np.argsort(-scores[slot_items], kind='stable')]
+            kept, per_class = [], {}
+            for j in slot_items.tolist():
+                category, query = categories[j], int(query_codes[j])
+                limit = sum(1 for step in self.schedule_structure if category in step['types'])
+                if per_class.get((category, query), 0) < limit:
+                    per_class[(category, query)] = per_class.get((category, query), 0) + 1
+                    kept.append((j, category, query, float(scores[j])))
+            options.append(kept)
+
+        # Items that can still be picked after slot i.
+        later_items = [frozenset()] * (n_slots + 1)
+        for i in range(n_slots - 1, -1, -1):
+            later_items[i] = later_items[i + 1] | {j for j, _, _, _ in options[i]}
+
+        # state -> (score, chosen items); state = (last category, covered queries, relevant used items)
+        states = {(None, frozenset(), frozenset()): (0.0, ())}
+        for i in range(n_slots):
+            next_states = {}
+            still_needed = later_items[i + 1]
+            for (last_category, covered, used), (score, path) in states.items():
+                extended = False
+                for j, category, query, item_score in options[i]:
+                    if j in used:
+                        continue
+                    extended = True
+                    gain = item_score
+                    if last_category is not None:
+                        gain += self.transition_scores.get((last_category, category), 0)
+                        if query not in covered:
+                            gain += self.coverage_bonus
+                    state = (category, covered | {query}, (used | {j}) & still_needed)
+                    best = next_states.get(state)
+                    if best is None or score + gain > best[0]:
+                        next_states[state] = (score + gain, path + ((i, j),))
+                if not extended:
+                    state = (last_category, covered, used & still_needed)
+                    best = next_states.get(state)
+                    if best is None or score > best[0]:
+                        next_states[state] = (score, path)
+            states = next_states
+
+        best_score, best_path = max(states.values(), key=lambda v: v[0])
+        return best_score, list(best_path)
+
+    def _plan_day_dp(self, df_candidates, day, hours):
+        print("\n[DP] Building optimal itinerary with dynamic programming...")
+        result = self._dp_search(df_candidates, day, hours)
+        if result is None:
+            print("Could not generate a full itinerary (DP).")
+            return []
+
+        best_score, best_path = result
+        print(f"[DP] Best itinerary score: {best_score:.4f}")
+        index_ids = df_candidates.index.tolist()
+        return self._format_schedule(df_candidates, [index_ids[j] for _, j in best_path], [i for i, _ in best_path])
+
+    def _coverage_sets(self, df_candidates, must_haves):
+        """
+        Row positions whose "primary_category name" text contains each must-have tag.
+        Tags never contain whitespace, so matching tokens of a token -> rows index is
+        equivalent to a substring search over the full texts.
+        """
+        categories = df_candidates['primary_category'] if 'primary_category' in df_candidates else ''
+        names = df_candidates['name'] if 'name' in df_candidates else ''
+        texts = (pd.Series(categories, index=df_candidates.index).astype(str) + " " +
+                 pd.Series(names, index=df_candidates.index).astype(str)).str.lower()
+
+        token_index = {}
+        for pos, text in enumerate(texts):
+            for token in text.split():
+                token_index.setdefault(token, set()).add(pos)
+
+        cover = {}
+        for tag in must_haves:
+            tag = tag.lower()
+            rows = set()
+            for token, token_rows in token_index.items():
+                if tag in token:
+                    rows |= token_rows
+            cover[tag] = rows
+        return cover
 
     # OR-Tools 
-    def _plan_day_or_tools(self, df_candidates, must_haves=None):
+    def _record_fallback(self, reason):
+        PLANNER_FALLBACKS_TOTAL.labels(reason).inc()
+        with self._stats_lock:
+            self.fallback_counts[reason] += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                "solver_workers": self.solver_workers,
+                "solver_time_limit": self.solver_time_limit,
+                "or_tools_fallbacks": dict(self.fallback_counts),
+            }
+
+    def _heuristic_fallback(self, df_candidates, heuristic, reason):
+        """Returns the DP plan (which ignores must-haves) when CP-SAT has nothing to offer."""
+        self._record_fallback(reason)
+        if heuristic is None:
+            print(f"No feasible itinerary found (OR-Tools, {reason}).")
+            return []
+        print(f"[OR-Tools] Falling back to the DP plan ({reason}).")
+        index_ids = df_candidates.index.tolist()
+        return self._format_schedule(df_candidates, [index_ids[j] for _, j in heuristic[1]], [i for i, _ in heuristic[1]])
+
+    def _plan_day_or_tools(self, df_candidates, day, hours, must_haves=None, must_have_cover=None, deadline=None):
+        """
+        `must_have_cover` optionally maps each must-have tag to the ids that satisfy
+        it (e.g. from the catalog's token index); otherwise it is derived here.
+        A must-have with matching places of which none fits an open slot makes the
+        request infeasible (DP fallback); one with no matching place is ignored.
+        `deadline` is a time.monotonic() value bounding the whole request; the solve
+        gets whatever is left of it, capped at `solver_time_limit`. The DP plan
+        seeds the solver as a hint and is returned if no solution is found in time.
+        """
         print("\n[OR-Tools] Solving itinerary with hard constraints...")
-        df_candidates['schedule_category'] = df_candidates.apply(self._categorize_location, axis=1)
-        current_day = datetime.now().strftime('%A').lower()
+        heuristic = self._dp_search(df_candidates, day, hours)
+
+        time_limit = self.solver_time_limit
+        if deadline is not None:
+            time_limit = min(time_limit, deadline - time.monotonic())
+        if time_limit <= 0:
+            return self._heuristic_fallback(df_candidates, heuristic, "budget_exhausted")
+
+        build_start = time.perf_counter()
+        df_candidates['schedule_category'] = self._schedule_categories(df_candidates)
+        eligible = self._slot_eligibility(
+            df_candidates['schedule_category'].to_numpy(), self._open_masks(hours, day)
+        )
+        scores = df_candidates['final_score'].to_numpy(dtype='float64')
+        n_slots = len(self.schedule_structure)
 
+        # Decision variables only for eligible (slot, candidate) pairs
         model = cp_model.CpModel()
-        x = {}  # decision variables
-        for i, step in enumerate(self.schedule_structure):
-            for j, row in df_candidates.iterrows():
-                open_ok = self._is_open_at(row['operating_hours'], current_day, step['time'])
-                valid_type = row['schedule_category'] in step['types']
-                x[i, j] = model.NewBoolVar(f"x[{i},{j}]")
-                if not (open_ok and valid_type):
-                    model.Add(x[i, j] == 0)
+        slot_idx, cand_idx = np.nonzero(eligible)
+        x = {(i, j): model.NewBoolVar(f"x[{i},{j}]") for i, j in zip(slot_idx.tolist(), cand_idx.tolist())}
+        vars_by_slot = [[] for _ in range(n_slots)]
+        vars_by_candidate = {}
+        for (i, j), var in x.items():
+            vars_by_slot[i].append(var)
+            vars_by_candidate.setdefault(j, []).append(var)
 
         # Each slot: at most one location
-        for i in range(len(self.schedule_structure)):
-            model.Add(sum(x[i, j] for j in df_candidates.index) <= 1)
+        for slot_vars in vars_by_slot:
+            if len(slot_vars) > 1:
+                model.AddAtMostOne(slot_vars)
 
         # Each location: used at most once
-        for j in df_candidates.index:
-            model.Add(sum(x[i, j] for i in range(len(self.schedule_structure))) <= 1)
+        for candidate_vars in vars_by_candidate.values():
+            if len(candidate_vars) > 1:
+                model.AddAtMostOne(candidate_vars)
 
         # Must-have constraints
         if must_haves:
-            for tag in must_haves:
-                tag_cover = []
-                for i, step in enumerate(self.schedule_structure):
-                    for j, row in df_candidates.iterrows():
-                        text = (str(row.get("primary_category", "")) + " " + str(row.get("name", ""))).lower()
-                        if tag.lower() in text:
-                            tag_cover.append(x[i, j])
+            if must_have_cover is not None:
+                position_of = {loc_id: pos for pos, loc_id in enumerate(df_candidates.index.tolist())}
+                cover = {
+                    tag.lower(): {position_of[loc_id] for loc_id in must_have_cover.get(tag, ()) if loc_id in position_of}
+                    for tag in must_haves
+                }
+            else:
+                cover = self._coverage_sets(df_candidates, must_haves)
+            for tag, rows in cover.items():
+                tag_cover = [var for j in rows for var in vars_by_candidate.get(j, [])]
                 if tag_cover:
                     model.Add(sum(tag_cover) >= 1)
+                elif rows:
+                    # Places match the tag but none fits an open slot: infeasible, as with the dense model
+                    print(f"[OR-Tools] Must-have '{tag}' has no eligible place.")
+                    return self._heuristic_fallback(df_candidates, heuristic, "infeasible")
 
         # Objective: maximize score
-        objective_terms = []
-        for i, step in enumerate(self.schedule_structure):
-            for j, row in df_candidates.iterrows():
-                score = row['final_score']
-                objective_terms.append(score * x[i, j])
-        model.Maximize(sum(objective_terms))
+        keys = list(x)
+        model.Maximize(cp_model.LinearExpr.WeightedSum(
+            [x[key] for key in keys], scores[[j for _, j in keys]].tolist()
+        ))
+        # Warm start from the DP plan
+        hinted = set(heuristic[1]) if heuristic is not None else set()
+        for key, var in x.items():
+            model.AddHint(var, 1 if key in hinted else 0)
+        build_time = time.perf_counter() - build_start
 
         solver = cp_model.CpSolver()
-        solver.parameters.max_time_in_seconds = 10
+        solver.parameters.max_time_in_seconds = time_limit
+        solver.parameters.num_workers = self.solver_workers
+        solve_start = time.perf_counter()
         status = solver.Solve(model)
+        solve_time = time.perf_counter() - solve_start
+        print(f"[OR-Tools] {len(x)} variables for {len(scores)} candidates; "
+              f"model built in {build_time * 1000:.1f} ms, solved in {solve_time * 1000:.1f} ms "
+              f"({solver.StatusName(status)}).")
 
+        if status == cp_model.INFEASIBLE:
+            return self._heuristic_fallback(df_candidates, heuristic, "infeasible")
         if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-            print("No feasible itinerary found (OR-Tools).")
-            return []
+            return self._heuristic_fallback(df_candidates, heuristic, "timeout")
+        if status == cp_model.FEASIBLE:
+            self._record_fallback("timeout_feasible")
 
-        chosen_ids = []
-        for i in range(len(self.schedule_structure)):
-            for j in df_candidates.index:
-                if solver.Value(x[i, j]) == 1:
-                    chosen_ids.append(j)
+        # Sort by slot and keep it, so a skipped slot does not shift the labels after it
+        index_ids = df_candidates.index.tolist()
+        chosen = sorted((i, j) for (i, j), var in x.items() if solver.Value(var) == 1)
 
-        return self._format_schedule(df_candidates, chosen_ids)
+        return self._format_schedule(df_candidates, [index_ids[j] for _, j in chosen], [i for i, _ in chosen])
 
-    def _format_schedule(self, df_candidates, chosen_ids):
+    def _format_schedule(self, df_candidates, chosen_ids, slots=None):
+        """
+        `slots` gives the schedule_structure index each chosen id fills; when a
+        slot was skipped the labels follow it instead of the item's position.
+        Defaults to consecutive slots from the first.
+        """
         final_schedule = []
         # --- MODIFIED to handle cases where fewer items are chosen than schedule slots ---
         num_items = min(len(chosen_ids), len(self.schedule_structure))
+        slots = list(range(num_items)) if slots is None else slots
 
         for i in range(num_items):
             loc_id = chosen_ids[i]
-            slot_name = self.schedule_structure[i]['slot']
+            slot_name = self.schedule_structure[slots[i]]['slot']
             location_details = df_candidates.loc[loc_id]
             
             # --- MODIFIED to add more details to the response ---
@@ -203,8 +410,23 @@ class ItineraryPlanner:
             })
         return final_schedule
 
-    def plan_day(self, df_candidates, mode="beam", beam_width=5, must_haves=None):
-        if mode == "or_tools":
-            return self._plan_day_or_tools(df_candidates, must_haves=must_haves)
-        else:
-            return self._plan_day_beam(df_candidates, beam_width=beam_width)
+    def plan_day(self, df_candidates, mode="beam", beam_width=5, must_haves=None, day=None, hours=None,
+                 must_have_cover=None, deadline=None):
+        """
+        `day` is the trip date (defaults to today) used for opening-hours checks;
+        `hours` is an optional HoursTable aligned with the rows of df_candidates;
+        `deadline` (time.monotonic()) bounds the OR-Tools solve.
+        """
+        day = day or datetime.now()
+        if hours is None:
+            hours = HoursTable.compile(df_candidates['operating_hours'])
+        mode = mode if mode in ("or_tools", "dp") else "beam"
+        PLANNER_MODE_TOTAL.labels(mode).inc()
+        with PLANNER_SECONDS.labels(mode).time():
+            if mode == "or_tools":
+                return self._plan_day_or_tools(df_candidates, day, hours, must_haves=must_haves,
+                                               must_have_cover=must_have_cover, deadline=deadline)
+            elif mode == "dp":
+                return self._plan_day_dp(df_candidates, day, hours)
+            else:
+                return self._plan_day_beam(df_candidates, day, hours, beam_width=beam_width)
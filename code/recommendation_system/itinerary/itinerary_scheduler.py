@@ -2,14 +2,22 @@ from datetime import datetime, timedelta
 from collections import Counter
 from recommender.weather_api import get_weather_forecast, is_good_weather
 
+def forecast_window_end(end_date):
+    return min(end_date, datetime.now().date() + timedelta(days=7))
+
 class ItineraryScheduler:
-    def __init__(self, user_lat, user_lon, start_date, end_date):
+    def __init__(self, user_lat, user_lon, start_date, end_date, forecasts=None):
+        """
+        `forecasts` can be passed in when the caller already fetched them
+        (e.g. concurrently with retrieval); otherwise they are fetched here.
+        """
         self.user_lat = user_lat
         self.user_lon = user_lon
         self.start_date = start_date
         self.end_date = end_date
-        forecast_end = min(end_date, datetime.now().date() + timedelta(days=7))
-        self.forecasts = get_weather_forecast(user_lat, user_lon, start_date, forecast_end)
+        if forecasts is None:
+            forecasts = get_weather_forecast(user_lat, user_lon, start_date, forecast_window_end(end_date))
+        self.forecasts = forecasts
 
     def schedule_itineraries(self, itineraries):
         scheduled = []
@@ -1,20 +1,73 @@
 import os
 import openai
 import json
+import hashlib
+import threading
 from datetime import date, datetime
 
+from recommender.cache import LRUCache
+
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
+SUMMARY_MODEL = "gpt-4"
+_async_client = None
 
-def generate_summary_with_ai(scheduled_itineraries):
-    
-    print("=== Scheduled Itineraries Received by Summary Generator ===")
-    try:
-        print(json.dumps(scheduled_itineraries, indent=2, ensure_ascii=False))
-    except Exception as e:
-        print(f"(Could not pretty-print itineraries: {e})")
-        print(scheduled_itineraries)
-        
+def _get_async_client():
+    # OPENAI_BASE_URL (read by the client) can point this at a local fake endpoint
+    global _async_client
+    if _async_client is None:
+        _async_client = openai.AsyncOpenAI(api_key=openai.api_key)
+    return _async_client
+
+class SummaryCache:
+    """
+    Content-addressed cache of finished summaries. The key is a SHA-256 of the
+    canonical JSON of the cleaned itinerary (plus the model name), so the same
+    places, weather and day structure map to the same entry across reconnects.
+    Entries expire after `ttl` seconds; the least recently used are evicted
+    beyond `maxsize`.
+    """
+    def __init__(self, maxsize=1024, ttl=6 * 3600):
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def key(scheduled_itineraries):
+        canonical = json.dumps(
+            {"model": SUMMARY_MODEL, "itineraries": scheduled_itineraries},
+            sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, scheduled_itineraries):
+        summary = self.cache.get(self.key(scheduled_itineraries))
+        with self._lock:
+            self.stats['hits' if summary is not None else 'misses'] += 1
+        return summary
+
+    def put(self, scheduled_itineraries, summary):
+        self.cache.put(self.key(scheduled_itineraries), summary)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats['hits'] + stats['misses']
+        stats['size'] = len(self.cache)
+        stats['hit_rate'] = round(stats['hits'] / total, 3) if total else 0.0
+        return stats
+
+
+summary_cache = SummaryCache(
+    maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", str(6 * 3600)))
+)
+
+def build_summary_prompt(scheduled_itineraries, as_json=True):
+    """
+    Builds the travel-guide prompt. `as_json=False` asks for plain text, which
+    is what the streaming path needs to forward chunks as they arrive.
+    """
     day_blocks = []
     for day in scheduled_itineraries:
         day_num = day.get("day", "?")
@@ -45,20 +98,33 @@ def generate_summary_with_ai(scheduled_itineraries):
 
     prompt_text = "\n\n".join(day_blocks)
 
-    prompt = f"""
+    output_format = (
+        'OUTPUT: return a JSON object with only one field: "summary"\n'
+        'Example: {"summary": "Your generated text here."}'
+        if as_json else
+        "OUTPUT: return only the summary text."
+    )
+
+    return f"""
 You are a helpful travel guide. Write a short descriptive paragraph suggesting a multi-day travel plan in 1100 characters, no markdown, just plain text.
 Start each day with "Day X:" and include weather and activities for that day. dont mention dates or like "Day 27" at all. just explain the itinerary step by step and how it foes with the weather
 
 INPUT:
 {prompt_text}
 
-OUTPUT: return a JSON object with only one field: "summary"
-Example: {{"summary": "Your generated text here."}}
+{output_format}
 """
 
+def generate_summary_with_ai(scheduled_itineraries):
+    cached = summary_cache.get(scheduled_itineraries)
+    if cached is not None:
+        return cached
+
+    prompt = build_summary_prompt(scheduled_itineraries)
+
     try:
         response = openai.chat.completions.create(
-            model="gpt-4",
+            model=SUMMARY_MODEL,
             messages=[
                 {"role": "system", "content": "You are a helpful travel guide."},
                 {"role": "user", "content": prompt}
@@ -70,10 +136,39 @@ Example: {{"summary": "Your generated text here."}}
         content_raw = response.choices[0].message.content
         content = content_raw.strip() if content_raw else ""
         data = json.loads(content)
-        return data.get("summary", "")
+        summary = data.get("summary", "")
+        if summary:
+            summary_cache.put(scheduled_itineraries, summary)
+        return summary
 
     except json.JSONDecodeError:
         return "Could not generate a valid JSON summary for the itinerary."
     except Exception as e:
         print(f"Error during AI summary generation: {e}")
-        return "Could not generate an AI summary for the itinerary."
\ No newline at end of file
+        return "Could not generate an AI summary for the itinerary."
+
+async def stream_summary_with_ai(scheduled_itineraries):
+    """
+    Async generator yielding the summary text in chunks as the model produces
+    them. Closing the generator (e.g. on client disconnect) closes the stream.
+    """
+    prompt = build_summary_prompt(scheduled_itineraries, as_json=False)
+    stream = await _get_async_client().chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a helpful travel guide."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=500,
+        temperature=0.7,
+        stream=True,
+    )
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    finally:
+        await stream.close()
@@ -0,0 +1,72 @@
+"""
+Prometheus metrics for the recommendation service, served by GET /metrics.
+
+Latencies are histograms in seconds, so p50/p99 per stage can be computed
+with histogram_quantile() on the *_bucket series.
+"""
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# 0.5 ms .. 60 s: covers FAISS/pandas stages as well as OR-Tools and LLM calls.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+RECOMMENDER_STAGE_SECONDS = Histogram(
+    'recommender_stage_seconds',
+    'Time spent in each recommendation stage (encode, search, fetch, region, scoring, planning).',
+    ['stage'], buckets=LATENCY_BUCKETS
+)
+RECOMMENDER_CANDIDATES = Histogram(
+    'recommender_candidates',
+    'Candidates per query: retrieved from FAISS after exclusions, and left in the winning region.',
+    ['phase'], buckets=(0, 5, 10, 20, 40, 60, 80, 100, 150, 200, 300, 500, 1000)
+)
+PLANNER_SECONDS = Histogram(
+    'planner_seconds',
+    'Itinerary planning time by requested planner mode (or_tools, dp, beam).',
+    ['mode'], buckets=LATENCY_BUCKETS
+)
+PLANNER_MODE_TOTAL = Counter(
+    'planner_mode_total',
+    'Itineraries planned, by planner mode chosen.',
+    ['mode']
+)
+PLANNER_FALLBACKS_TOTAL = Counter(
+    'planner_fallbacks_total',
+    'OR-Tools plans replaced by the DP heuristic, by reason.',
+    ['reason']
+)
+WEATHER_FETCH_SECONDS = Histogram(
+    'weather_fetch_seconds',
+    'OpenWeather forecast HTTP fetch time (cache misses only), by outcome.',
+    ['outcome'], buckets=LATENCY_BUCKETS
+)
+ITINERARY_WRITE_SECONDS = Histogram(
+    'itinerary_write_seconds',
+    'Itinerary outbox batch write time to the sink (Supabase or local), by outcome.',
+    ['outcome'], buckets=LATENCY_BUCKETS
+)
+ENCODER_BATCH_SIZE = Histogram(
+    'encoder_batch_size',
+    'Texts per encoder forward pass after micro-batching concurrent requests.',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+ENCODER_QUEUE_SECONDS = Histogram(
+    'encoder_queue_seconds',
+    'Time an encode request waited in the micro-batching queue before its batch ran.',
+    buckets=LATENCY_BUCKETS
+)
+SUMMARY_SECONDS = Histogram(
+    'summary_seconds',
+    'AI summary generation time over /ws/itinerary, by outcome (ok, cached, timeout, error, disconnected).',
+    ['outcome'], buckets=LATENCY_BUCKETS
+)
+SUMMARY_FIRST_CHUNK_SECONDS = Histogram(
+    'summary_first_chunk_seconds',
+    'Time until the first streamed summary chunk arrives from the LLM.',
+    buckets=LATENCY_BUCKETS
+)
+
+
+def render():
+    """Returns (body, content type) in the Prometheus text exposition format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
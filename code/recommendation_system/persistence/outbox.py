@@ -0,0 +1,219 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from metrics import ITINERARY_WRITE_SECONDS
+
+
+def _json_default(value):
+    # numpy scalars (ids, coordinates, scores) end up in itinerary payloads
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class SupabaseSink:
+    """Writes a batch of records to a Supabase table with one insert call."""
+    def __init__(self, client, table='itineraries'):
+        self.client = client
+        self.table = table
+
+    def write_batch(self, records):
+        self.client.table(self.table).insert(records).execute()
+
+
+class LocalSink:
+    """
+    Local stand-in for Supabase: appends records to a JSON-lines file, or keeps
+    them in `self.records` when no path is given (handy in tests).
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+        self._lock = threading.Lock()
+
+    def write_batch(self, records):
+        with self._lock:
+            if self.path is None:
+                self.records.extend(records)
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class ItineraryOutbox:
+    """
+    Durable write-behind queue for itinerary records.
+
+    `enqueue` appends to a local SQLite (WAL) table and returns immediately; a
+    background thread flushes due records to the sink in batches. A failed batch
+    is bisected so only the records that fail on their own are charged an
+    attempt; those are retried with capped exponential backoff and jitter, and
+    records that fail `max_attempts` times are kept in the table as dead letters
+    instead of being dropped. Batches are claimed with a lease, so several uvicorn workers can
+    share one outbox file without sending a record twice.
+    """
+    def __init__(self, sink, path='itinerary_outbox.sqlite3', batch_size=50, flush_interval=1.0,
+                 base_backoff=1.0, max_backoff=300.0, max_attempts=10, lease_seconds=60.0):
+        self.sink = sink
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL,"
+            " dead INTEGER NOT NULL DEFAULT 0, claim TEXT, last_error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (dead, next_attempt_at)")
+        self._conn.commit()
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'enqueued': 0, 'flushed': 0, 'failed_batches': 0, 'failed_records': 0, 'dead_lettered': 0,
+                      'last_flush_seconds': None, 'last_delivery_lag_seconds': None, 'last_error': None}
+
+    def enqueue(self, record):
+        now = time.time()
+        payload = json.dumps(record, ensure_ascii=False, default=_json_default)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (payload, created_at, next_attempt_at) VALUES (?, ?, ?)",
+                (payload, now, now)
+            )
+            self._conn.commit()
+            self.stats['enqueued'] += 1
+        self._wake.set()
+
+    def flush_once(self):
+        """Sends one batch of due records. Returns how many were delivered."""
+        now = time.time()
+        claim = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET claim = ?, next_attempt_at = ? WHERE id IN ("
+                " SELECT id FROM outbox WHERE dead = 0 AND next_attempt_at <= ? ORDER BY id LIMIT ?)",
+                (claim, now + self.lease_seconds, now, self.batch_size)
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT id, payload, attempts, created_at FROM outbox WHERE claim = ? ORDER BY id", (claim,)
+            ).fetchall()
+        if not rows:
+            return 0
+
+        start = time.perf_counter()
+        delivered, failures = self._deliver(rows)
+        elapsed = time.perf_counter() - start
+        ITINERARY_WRITE_SECONDS.labels("error" if failures else "ok").observe(elapsed)
+        if failures:
+            self._record_failures(failures)
+        if not delivered:
+            return 0
+
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(row[0],) for row in delivered])
+            self._conn.commit()
+            self.stats['flushed'] += len(delivered)
+            self.stats['last_flush_seconds'] = round(elapsed, 4)
+            # enqueue -> delivered, for the oldest record of the batch
+            self.stats['last_delivery_lag_seconds'] = round(time.time() - min(row[3] for row in delivered), 3)
+        return len(delivered)
+
+    def _deliver(self, rows):
+        """
+        Writes rows to the sink, bisecting a batch the sink rejects until the
+        failing records are isolated. Returns (delivered rows, [(row, error)]).
+        When the sink is down altogether this costs up to 2 * len(rows) - 1
+        calls, after which every row backs off.
+        """
+        try:
+            self.sink.write_batch([json.loads(row[1]) for row in rows])
+        except Exception as e:
+            if len(rows) == 1:
+                return [], [(rows[0], e)]
+            delivered, failures = [], []
+            mid = len(rows) // 2
+            for half in (rows[:mid], rows[mid:]):
+                half_delivered, half_failures = self._deliver(half)
+                delivered += half_delivered
+                failures += half_failures
+            return delivered, failures
+        return rows, []
+
+    def _record_failures(self, failures):
+        print(f"ERROR: Could not flush {len(failures)} itineraries. Reason: {failures[0][1]}")
+        now = time.time()
+        updates, dead = [], 0
+        for (row_id, _, attempts, _), error in failures:
+            attempts += 1
+            delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+            is_dead = int(attempts >= self.max_attempts)
+            dead += is_dead
+            updates.append((attempts, now + delay * random.uniform(0.8, 1.2), is_dead, str(error), row_id))
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, dead = ?, last_error = ? WHERE id = ?",
+                updates
+            )
+            self._conn.commit()
+            self.stats['failed_batches'] += 1
+            self.stats['failed_records'] += len(failures)
+            self.stats['dead_lettered'] += dead
+            self.stats['last_error'] = str(failures[-1][1])
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                while self.flush_once() == self.batch_size and not self._stop.is_set():
+                    pass
+            except sqlite3.Error as e:
+                print(f"ERROR: itinerary outbox flush failed. Reason: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="itinerary-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stops the worker after a last flush attempt; undelivered records stay on disk."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return
+            self._thread = None
+        try:
+            self.flush_once()
+        except sqlite3.Error:
+            pass
+
+    def get_stats(self):
+        with self._lock:
+            pending, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM outbox WHERE dead = 0"
+            ).fetchone()
+            dead = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE dead = 1").fetchone()[0]
+            stats = dict(self.stats)
+        stats['depth'] = pending
+        stats['dead'] = dead
+        stats['oldest_pending_seconds'] = round(time.time() - oldest, 1) if oldest else 0.0
+        return stats
@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+
+
+def replace_file(path, write):
+    """
+    Calls `write(tmp_path)` for a temporary file next to `path`, then renames
+    it over `path`. Workers that memory-mapped the old file keep its inode,
+    so artifacts can be rewritten under live traffic without truncating
+    anyone's mapping.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_npy(path, array):
+    """np.save through replace_file (the file handle keeps np.save from appending '.npy')."""
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+    replace_file(path, write)
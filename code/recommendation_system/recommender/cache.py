@@ -0,0 +1,191 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache with an optional per-entry TTL (seconds).
+    """
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for sub-query embeddings:
+      1. a bounded in-process LRU,
+      2. a SQLite file (WAL mode) shared by every uvicorn worker and kept across restarts.
+    Keys are normalized sub-query texts, namespaced by the encoder model name.
+    The file keeps at most about `disk_maxsize` rows (0 = unbounded): past that,
+    the least recently read or written rows are pruned down to 90% of it.
+    """
+    def __init__(self, model_name, path='embedding_cache.sqlite3', maxsize=4096, disk_maxsize=100_000):
+        self.model_name = model_name
+        self.path = path
+        self.memory = LRUCache(maxsize=maxsize)
+        self.disk_maxsize = disk_maxsize
+        self._disk_rows = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+        if path:
+            try:
+                self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    " model TEXT NOT NULL, text TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+                    " last_used REAL NOT NULL DEFAULT 0, PRIMARY KEY (model, text))"
+                )
+                columns = [row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")]
+                if 'last_used' not in columns:
+                    self._conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+                self._conn.commit()
+                self._disk_rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"Warning: embedding disk cache disabled ({e}).")
+                self._conn = None
+
+    def get_many(self, texts):
+        """
+        Returns ({text: vector} for the cached texts, [texts that missed both tiers]).
+        """
+        found, pending = {}, []
+        for text in texts:
+            vector = self.memory.get(normalize_text(text))
+            if vector is not None:
+                found[text] = vector
+            else:
+                pending.append(text)
+        memory_hits = len(found)
+
+        missing = pending
+        if pending and self._conn is not None:
+            keys = {normalize_text(text): text for text in pending}
+            placeholders = ",".join("?" * len(keys))
+            try:
+                with self._lock:
+                    rows = self._conn.execute(
+                        f"SELECT text, dim, vector FROM embeddings WHERE model = ? AND text IN ({placeholders})",
+                        (self.model_name, *keys)
+                    ).fetchall()
+                    if rows:
+                        hit_placeholders = ",".join("?" * len(rows))
+                        self._conn.execute(
+                            f"UPDATE embeddings SET last_used = ? WHERE model = ? AND text IN ({hit_placeholders})",
+                            (time.time(), self.model_name, *(row[0] for row in rows))
+                        )
+                        self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: embedding disk cache read failed ({e}).")
+                rows = []
+            for key, dim, blob in rows:
+                vector = np.frombuffer(blob, dtype='float32', count=dim)
+                self.memory.put(key, vector)
+                found[keys[key]] = vector
+            missing = [text for text in pending if text not in found]
+
+        with self._lock:
+            self.stats['memory_hits'] += memory_hits
+            self.stats['disk_hits'] += len(found) - memory_hits
+            self.stats['misses'] += len(missing)
+        return found, missing
+
+    def put_many(self, texts, vectors):
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.ascontiguousarray(vector, dtype='float32')
+            key = normalize_text(text)
+            self.memory.put(key, vector)
+            rows.append((self.model_name, key, vector.shape[0], vector.tobytes(), time.time()))
+
+        if rows and self._conn is not None:
+            try:
+                with self._lock:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (model, text, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    self._conn.commit()
+                    # Counted optimistically (replacements and other workers' rows included); exact after a prune
+                    self._disk_rows += len(rows)
+                    if self.disk_maxsize and self._disk_rows > self.disk_maxsize:
+                        self._prune()
+            except sqlite3.Error as e:
+                print(f"Warning: embedding disk cache write failed ({e}).")
+
+    def _prune(self):
+        """Deletes the least recently used rows down to 90% of disk_maxsize. Caller holds the lock."""
+        total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = total - int(self.disk_maxsize * 0.9)
+        if total > self.disk_maxsize and excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used, rowid LIMIT ?)",
+                (excess,)
+            )
+            self._conn.commit()
+            total -= excess
+        self._disk_rows = total
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['memory_size'] = len(self.memory)
+        stats['memory_maxsize'] = self.memory.maxsize
+        stats['disk_rows'] = self._disk_rows
+        stats['disk_maxsize'] = self.disk_maxsize
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def embedding_cache_from_env(model_name):
+    return EmbeddingCache(
+        model_name,
+        path=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"),
+        maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+        disk_maxsize=int(os.getenv("EMBEDDING_DISK_CACHE_SIZE", "100000"))
+    )
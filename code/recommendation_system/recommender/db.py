@@ -0,0 +1,204 @@
+import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+
+LOCATION_COLUMNS = """
+    id, name, region, primary_category, tags, operating_hours, meal_type,
+    ST_Y(geom::geometry) as latitude, ST_X(geom::geometry) as longitude,
+    indoor_outdoor, website, naver_url
+"""
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no database connection becomes available within the acquire timeout."""
+
+
+class PostgresPool:
+    """
+    Thread-safe psycopg2 connection pool.
+
+    - keeps up to `maxconn` connections open, `minconn` of them opened eagerly,
+    - blocks at most `acquire_timeout` seconds for a free connection,
+    - re-validates connections idle for longer than `health_check_interval`
+      seconds with `SELECT 1` and transparently replaces broken ones.
+    """
+    def __init__(self, db_params, minconn=1, maxconn=10, acquire_timeout=5.0, health_check_interval=30.0):
+        if minconn > maxconn:
+            raise ValueError("minconn cannot be larger than maxconn")
+        self.db_params = db_params
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._closed = False
+
+        for _ in range(minconn):
+            try:
+                self._idle.put((self._connect(), time.monotonic()))
+            except psycopg2.Error as e:
+                print(f"Warning: could not pre-open database connection ({e}).")
+                break
+
+    def _connect(self):
+        return psycopg2.connect(**self.db_params)
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if self._is_healthy(conn, last_used):
+                return conn
+            self._discard(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolTimeoutError(f"no database connection available within {self.acquire_timeout}s")
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception:
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                if conn.closed or self._closed:
+                    self._discard(conn)
+                else:
+                    try:
+                        conn.rollback()
+                        self._idle.put((conn, time.monotonic()))
+                    except psycopg2.Error:
+                        self._discard(conn)
+            self._slots.release()
+
+    def fetch_locations(self, ids):
+        sql = f"SELECT {LOCATION_COLUMNS} FROM locations WHERE id IN %s;"
+        with self.connection() as conn:
+            return pd.read_sql_query(sql, conn, index_col='id', params=(tuple(int(i) for i in ids),))
+
+    def fetch_all_locations(self):
+        sql = f"SELECT {LOCATION_COLUMNS} FROM locations;"
+        with self.connection() as conn:
+            return pd.read_sql_query(sql, conn, index_col='id')
+
+    def fetch_locations_fingerprint(self):
+        """Cheap change signal for the locations table (hash over every row)."""
+        sql = "SELECT md5(string_agg(md5(l::text), '' ORDER BY l.id)) FROM locations l;"
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                return cur.fetchone()[0]
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def get_stats(self):
+        return {"idle": self._idle.qsize(), "maxconn": self.maxconn}
+
+
+class AsyncPostgresPool:
+    """
+    asyncpg-backed pool with the same sizing/timeout knobs as PostgresPool,
+    so FastAPI endpoints can await the candidate fetch on the event loop.
+    Must be opened from inside the running event loop (e.g. a startup hook).
+    """
+    def __init__(self, db_params, minconn=1, maxconn=10, acquire_timeout=5.0, health_check_interval=30.0):
+        self.db_params = db_params
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._pool = None
+
+    @staticmethod
+    async def _init_connection(conn):
+        for json_type in ('json', 'jsonb'):
+            await conn.set_type_codec(json_type, encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+    async def open(self):
+        import asyncpg
+
+        port = self.db_params.get("port")
+        self._pool = await asyncpg.create_pool(
+            host=self.db_params.get("host"),
+            port=int(port) if port else None,
+            database=self.db_params.get("database"),
+            user=self.db_params.get("user"),
+            password=self.db_params.get("password"),
+            min_size=self.minconn,
+            max_size=self.maxconn,
+            max_inactive_connection_lifetime=self.health_check_interval,
+            init=self._init_connection,
+        )
+
+    @property
+    def is_open(self):
+        return self._pool is not None
+
+    async def fetch_locations(self, ids):
+        import asyncio
+        import asyncpg
+
+        if self._pool is None:
+            raise RuntimeError("async connection pool is not open")
+        sql = f"SELECT {LOCATION_COLUMNS} FROM locations WHERE id = ANY($1::int[]);"
+        params = [int(i) for i in ids]
+        for attempt in range(2):
+            try:
+                async with self._pool.acquire(timeout=self.acquire_timeout) as conn:
+                    rows = await conn.fetch(sql, params)
+                break
+            except asyncio.TimeoutError:
+                raise PoolTimeoutError(f"no database connection available within {self.acquire_timeout}s")
+            except (asyncpg.exceptions.ConnectionDoesNotExistError, asyncpg.exceptions.InterfaceError):
+                # Connection dropped while idle; the pool replaces it, so retry once.
+                if attempt == 1:
+                    raise
+        columns = ['id', 'name', 'region', 'primary_category', 'tags', 'operating_hours', 'meal_type',
+                   'latitude', 'longitude', 'indoor_outdoor', 'website', 'naver_url']
+        return pd.DataFrame([dict(r) for r in rows], columns=columns).set_index('id')
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
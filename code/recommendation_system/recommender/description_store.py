@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+
+from recommender.artifacts import replace_file, save_npy
+
+
+class DescriptionStore:
+    """
+    Location descriptions in a memory-mappable layout, aligned with
+    location_ids.npy: `descriptions.bin` holds every UTF-8 description back
+    to back, `descriptions.offsets.npy` holds n + 1 int64 byte offsets and
+    `descriptions.ids.npy` the location ids the store was written for.
+    Strings are decoded only for the positions asked for.
+    Written by data_processing/export_artifacts.py.
+    """
+    def __init__(self, data_path, offsets_path, ids_path=None):
+        self.data_path = data_path
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        self.ids = np.load(ids_path, mmap_mode='r') if ids_path and os.path.exists(ids_path) else None
+        if os.path.getsize(data_path):
+            self.data = np.memmap(data_path, dtype='uint8', mode='r')
+        else:
+            self.data = np.zeros(0, dtype='uint8')
+
+    @staticmethod
+    def offsets_path_for(data_path):
+        return os.path.splitext(data_path)[0] + '.offsets.npy'
+
+    @staticmethod
+    def ids_path_for(data_path):
+        return os.path.splitext(data_path)[0] + '.ids.npy'
+
+    @classmethod
+    def open(cls, data_path):
+        """Returns the store, or None when its files are missing."""
+        offsets_path = cls.offsets_path_for(data_path)
+        if not (os.path.exists(data_path) and os.path.exists(offsets_path)):
+            return None
+        return cls(data_path, offsets_path, cls.ids_path_for(data_path))
+
+    def matches(self, location_ids):
+        """
+        True when the store was written for `location_ids`, in the same order.
+        Stores written before the ids file existed can only be checked by length.
+        """
+        if self.ids is None:
+            return len(self) == len(location_ids)
+        return len(self) == len(self.ids) and np.array_equal(self.ids, location_ids)
+
+    @classmethod
+    def write(cls, texts, data_path, ids):
+        """Writes `texts` (in FAISS row order, for location `ids`) to `data_path`, its offsets and ids files."""
+        encoded = [str(text).encode('utf-8') for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype='int64')
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+
+        def write_data(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                for b in encoded:
+                    f.write(b)
+
+        # Every file is replaced, never rewritten in place, so live mappings keep the old inodes.
+        # Data last: readers check the data file's mtime
+        save_npy(cls.ids_path_for(data_path), np.asarray(ids, dtype='int64'))
+        save_npy(cls.offsets_path_for(data_path), offsets)
+        replace_file(data_path, write_data)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, position):
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return self.data[start:end].tobytes().decode('utf-8')
+
+    def __getitem__(self, positions):
+        """Object array of descriptions for an array of positions (like numpy fancy indexing)."""
+        positions = np.asarray(positions, dtype='int64')
+        out = np.empty(len(positions), dtype=object)
+        for i, position in enumerate(positions.tolist()):
+            out[i] = self.get(position)
+        return out
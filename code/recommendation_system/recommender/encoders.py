@@ -0,0 +1,229 @@
+"""
+Sentence encoders for sub-query embeddings. Every backend exposes
+`encode(texts, batch_size)` -> float32 array and a `name` that namespaces the
+embedding cache, so backends never read each other's vectors.
+
+ENCODER_BACKEND selects one:
+  torch      SentenceTransformer (PyTorch), the default
+  onnx       ONNX Runtime, fp32 export of the same model
+  onnx-int8  ONNX Runtime, dynamically quantized int8 export
+The ONNX models are produced by data_processing/export_onnx.py and checked
+against torch with benchmarks/compare_encoders.py. Neither ONNX backend
+imports torch.
+
+BatchingEncoder wraps any backend so that concurrent requests share forward
+passes (ENCODER_BATCHING, ENCODER_MAX_BATCH, ENCODER_MAX_WAIT_MS).
+"""
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import ENCODER_BATCH_SIZE, ENCODER_QUEUE_SECONDS
+
+SBERT_MODEL_NAME = 'all-MiniLM-L6-v2'
+ONNX_MODEL_FILES = {'onnx': 'model.onnx', 'onnx-int8': 'model.int8.onnx'}
+
+
+class SentenceTransformerEncoder:
+    def __init__(self, model_name=SBERT_MODEL_NAME):
+        from sentence_transformers import SentenceTransformer  # imports torch
+
+        self.name = model_name
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts, batch_size=32):
+        return np.asarray(self.model.encode(list(texts), batch_size=batch_size), dtype='float32')
+
+
+class OnnxEncoder:
+    """
+    Runs an ONNX export of the SBERT transformer with ONNX Runtime and repeats
+    the SentenceTransformer pipeline around it: WordPiece tokenization
+    (tokenizers), mean pooling over the attention mask, L2 normalization.
+    """
+    def __init__(self, model_dir, backend='onnx', threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        config_path = os.path.join(model_dir, 'encoder_config.json')
+        config = {}
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+        self.normalize = config.get('normalize', True)
+        self.name = f"{config.get('model_name', os.path.basename(os.path.normpath(model_dir)))}:{backend}"
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, ONNX_MODEL_FILES[backend]), options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(config.get('max_seq_length', 256))
+        pad_token = config.get('pad_token', '[PAD]')
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype='float32')
+        # Batch texts of similar length together to keep padding short, as SentenceTransformer does
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        ordered = [texts[i] for i in order]
+        embeddings = np.concatenate([self._encode_batch(ordered[i:i + batch_size])
+                                     for i in range(0, len(ordered), batch_size)])
+        out = np.empty_like(embeddings)
+        out[order] = embeddings
+        return out
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype='int64')
+        feeds = {
+            'input_ids': np.array([e.ids for e in encodings], dtype='int64'),
+            'attention_mask': mask,
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype='int64'),
+        }
+        hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+        weights = mask[:, :, None].astype('float32')
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype('float32')
+
+
+def load_encoder(backend=None, model_name=SBERT_MODEL_NAME, onnx_dir=None):
+    """
+    Builds the encoder chosen by `backend` (default: ENCODER_BACKEND). ONNX
+    models are read from `onnx_dir` (default: ENCODER_ONNX_DIR, then
+    models/<model_name>-onnx); when the file is missing it falls back to torch.
+    """
+    backend = backend or os.getenv("ENCODER_BACKEND", "torch")
+    if backend == 'torch':
+        return SentenceTransformerEncoder(model_name)
+    if backend not in ONNX_MODEL_FILES:
+        raise ValueError(f"unknown encoder backend '{backend}', expected torch, onnx or onnx-int8")
+
+    onnx_dir = onnx_dir or os.getenv("ENCODER_ONNX_DIR", os.path.join('models', f"{model_name}-onnx"))
+    model_file = ONNX_MODEL_FILES[backend]
+    if not os.path.exists(os.path.join(onnx_dir, model_file)):
+        print(f"Warning: '{os.path.join(onnx_dir, model_file)}' not found "
+              f"(run data_processing/export_onnx.py); using the torch encoder.")
+        return SentenceTransformerEncoder(model_name)
+    threads = int(os.getenv("ENCODER_THREADS", "0")) or None
+    encoder = OnnxEncoder(onnx_dir, backend, threads=threads)
+    print(f"Loaded ONNX encoder '{encoder.name}'.")
+    return encoder
+
+
+class BatchingEncoder:
+    """
+    Micro-batches encode() calls from concurrent request threads. A worker
+    thread takes the oldest pending call, keeps collecting calls for up to
+    `max_wait_ms` (or until `max_batch` texts are queued), encodes their
+    unique texts in one forward pass and hands every caller its own rows.
+    """
+    def __init__(self, encoder, max_batch=64, max_wait_ms=2.0):
+        self.encoder = encoder
+        self.name = getattr(encoder, 'name', SBERT_MODEL_NAME)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.stats = {'requests': 0, 'texts': 0, 'batches': 0, 'encoded': 0, 'errors': 0}
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='encoder-batcher', daemon=True)
+        self._thread.start()
+
+    def encode(self, texts, batch_size=None):
+        texts = list(texts)
+        if self._closed or not texts:
+            return np.asarray(self.encoder.encode(texts, batch_size=max(len(texts), 1)), dtype='float32')
+        future = Future()
+        self._queue.put((texts, future, time.perf_counter()))
+        return future.result()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch, size = [item], len(item[0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Finish this batch, then stop
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        started = time.perf_counter()
+        unique = list(dict.fromkeys(text for texts, _, _ in batch for text in texts))
+        self.stats['requests'] += len(batch)
+        self.stats['texts'] += sum(len(texts) for texts, _, _ in batch)
+        self.stats['batches'] += 1
+        self.stats['encoded'] += len(unique)
+        ENCODER_BATCH_SIZE.observe(len(unique))
+        try:
+            vectors = np.asarray(self.encoder.encode(unique, batch_size=len(unique)), dtype='float32')
+        except Exception as e:
+            self.stats['errors'] += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        rows = {text: i for i, text in enumerate(unique)}
+        for texts, future, queued_at in batch:
+            ENCODER_QUEUE_SECONDS.observe(started - queued_at)
+            future.set_result(vectors[[rows[text] for text in texts]])
+
+    def close(self):
+        """Stops the worker after the queued calls; later calls encode directly."""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        # Calls that raced with close() are served directly
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftovers.append(item)
+        if leftovers:
+            self._encode_batch(leftovers)
+
+    def get_stats(self):
+        batches = self.stats['batches']
+        return {
+            **self.stats,
+            'mean_batch_size': round(self.stats['encoded'] / batches, 2) if batches else 0.0,
+            'queued': self._queue.qsize(),
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000,
+        }
+
+
+def batching_encoder_from_env(encoder):
+    """Wraps `encoder` in a BatchingEncoder unless ENCODER_BATCHING=0."""
+    if os.getenv("ENCODER_BATCHING", "1") != "1":
+        return encoder
+    return BatchingEncoder(
+        encoder,
+        max_batch=int(os.getenv("ENCODER_MAX_BATCH", "64")),
+        max_wait_ms=float(os.getenv("ENCODER_MAX_WAIT_MS", "2")),
+    )
@@ -0,0 +1,203 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from recommender.description_store import DescriptionStore
+from recommender.operating_hours import HoursTable
+from recommender.spatial_index import SpatialIndex
+from recommender.token_index import TokenIndex
+
+CATALOG_COLUMNS = ['name', 'region', 'primary_category', 'tags', 'operating_hours', 'meal_type',
+                   'latitude', 'longitude', 'indoor_outdoor', 'website', 'naver_url']
+
+
+class CatalogSnapshot:
+    """
+    Immutable, columnar copy of the `locations` table. Every array is aligned
+    with location_ids.npy, so a FAISS row index is also a catalog position.
+    Operating hours are precompiled into `hours`, name/category tokens
+    indexed into `tokens` and coordinates into the grid `spatial` at load time.
+    """
+    def __init__(self, version, ids, columns, present, fingerprint):
+        self.version = version
+        self.ids = ids
+        self.columns = columns
+        self.present = present
+        self.fingerprint = fingerprint
+        self.hours = HoursTable.compile(columns['operating_hours'])
+        self.tokens = TokenIndex.build(columns['primary_category'], columns['name'])
+        self.spatial = SpatialIndex.build(columns['latitude'], columns['longitude'], present)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def take(self, positions):
+        """
+        Returns a DataFrame (indexed by id) for the given positions, skipping
+        locations that are no longer in the database.
+        """
+        positions = np.asarray(positions, dtype='int64')
+        positions = positions[self.present[positions]]
+        return pd.DataFrame(self.columns_at(positions), index=pd.Index(self.ids[positions], name='id'))
+
+    def columns_at(self, positions, names=None):
+        """{column: array} for the given positions (no presence check)."""
+        return {name: self.columns[name][positions] for name in (names or self.columns)}
+
+
+class LocationCatalog:
+    """
+    Loads the whole `locations` table plus the descriptions once and serves
+    candidate lookups from memory. Descriptions come from the memory-mapped
+    DescriptionStore at `store_path` when it exists (shared by every worker),
+    else from descriptions_progress.csv. `refresh()` reloads only when the
+    table or the descriptions file changed, and bumps `version`; it can be
+    driven by `start_polling()` so ingest updates appear without a restart.
+    """
+    def __init__(self, location_ids, db_pool, descriptions_path='descriptions_progress.csv',
+                 store_path='descriptions.bin'):
+        self.location_ids = np.asarray(location_ids, dtype='int64')
+        self.db_pool = db_pool
+        self.descriptions_path = descriptions_path
+        self.store_path = store_path
+        self.store = None
+        self.snapshot = None
+        self._lock = threading.Lock()
+        self._stop_polling = threading.Event()
+        self._poll_thread = None
+        self._listeners = []
+        self._descriptions_mtime = None
+        self.descriptions = self._load_descriptions()
+
+    def _descriptions_source(self):
+        if self.store_path and os.path.exists(self.store_path):
+            return self.store_path
+        return self.descriptions_path
+
+    def _descriptions_file_mtime(self):
+        try:
+            return os.path.getmtime(self._descriptions_source())
+        except OSError:
+            return None
+
+    def _load_descriptions(self):
+        """
+        Opens the store when it was written for this process's location_ids.
+        A rewritten store that does not match (e.g. exported for a newer index
+        than the one loaded) leaves the previous store in place.
+        """
+        self._descriptions_mtime = self._descriptions_file_mtime()
+        store = DescriptionStore.open(self.store_path) if self.store_path else None
+        if store is not None:
+            if store.matches(self.location_ids):
+                self.store = store
+                print("Location descriptions memory-mapped successfully.")
+                return None
+            if self.store is not None:
+                print(f"Warning: '{self.store_path}' no longer matches location_ids.npy; "
+                      "keeping the previous descriptions.")
+                return None
+            print(f"Warning: '{self.store_path}' does not match location_ids.npy; using the CSV.")
+        self.store = None
+        try:
+            descriptions = pd.read_csv(self.descriptions_path, index_col='id')['description']
+            print("Location descriptions loaded successfully.")
+        except FileNotFoundError:
+            print("Warning: descriptions_progress.csv not found. Summaries will be less detailed.")
+            descriptions = pd.Series(dtype=object, name='description')
+        return descriptions[~descriptions.index.duplicated(keep='last')]
+
+    def _fingerprint(self):
+        return self.db_pool.fetch_locations_fingerprint(), self._descriptions_file_mtime()
+
+    def _build_snapshot(self, version, fingerprint):
+        if fingerprint[1] != self._descriptions_mtime:
+            self.descriptions = self._load_descriptions()
+
+        df_db = self.db_pool.fetch_all_locations()
+        df_db['region'] = df_db['region'].str.strip()
+        df_db = df_db.reindex(self.location_ids)
+        present = df_db['name'].notna().to_numpy()
+
+        columns = {}
+        for name in CATALOG_COLUMNS:
+            if name in ('latitude', 'longitude'):
+                columns[name] = df_db[name].to_numpy(dtype='float64')
+            else:
+                columns[name] = df_db[name].to_numpy(dtype=object)
+        if self.store is not None:
+            columns['description'] = self.store
+        else:
+            columns['description'] = (
+                self.descriptions.reindex(self.location_ids).fillna('').to_numpy(dtype=object)
+            )
+        return CatalogSnapshot(version, self.location_ids, columns, present, fingerprint)
+
+    def descriptions_at(self, ids, positions):
+        """Descriptions (Series indexed by id) for candidates given by id and FAISS position."""
+        ids, first = np.unique(np.asarray(ids, dtype='int64'), return_index=True)
+        ids = pd.Index(ids, name='id')
+        if self.store is not None:
+            return pd.Series(self.store[np.asarray(positions)[first]], index=ids, name='description')
+        return self.descriptions.reindex(ids).fillna('')
+
+    def add_listener(self, callback):
+        """
+        Registers `callback(snapshot)`, run on the refreshing thread with every
+        new snapshot just before it is published, so structures derived from
+        the catalog are rebuilt off the request path and swap in with it. A
+        failing callback is reported and does not hold back the snapshot.
+        """
+        self._listeners.append(callback)
+
+    def refresh(self, force=False):
+        """
+        Reloads the catalog if its source data changed. Returns True when a new
+        version was published. Readers keep using the old snapshot until the swap.
+        """
+        with self._lock:
+            try:
+                fingerprint = self._fingerprint()
+                if not force and self.snapshot is not None and fingerprint == self.snapshot.fingerprint:
+                    return False
+                version = self.snapshot.version + 1 if self.snapshot is not None else 1
+                snapshot = self._build_snapshot(version, fingerprint)
+            except Exception as e:
+                print(f"Warning: location catalog refresh failed ({e}).")
+                return False
+            for callback in self._listeners:
+                try:
+                    callback(snapshot)
+                except Exception as e:
+                    print(f"Warning: location catalog listener {getattr(callback, '__name__', callback)} "
+                          f"failed ({e}).")
+            self.snapshot = snapshot
+        print(f"Location catalog v{snapshot.version} loaded ({int(snapshot.present.sum())} locations).")
+        return True
+
+    def start_polling(self, interval):
+        if self._poll_thread is not None or not interval:
+            return
+        self._stop_polling.clear()
+
+        def poll():
+            while not self._stop_polling.wait(interval):
+                self.refresh()
+
+        self._poll_thread = threading.Thread(target=poll, name="location-catalog-refresh", daemon=True)
+        self._poll_thread.start()
+
+    def stop_polling(self):
+        self._stop_polling.set()
+        if self._poll_thread is not None:
+            self._poll_thread.join(timeout=5)
+            self._poll_thread = None
+
+    def get_stats(self):
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version if snapshot else 0,
+            "locations": int(snapshot.present.sum()) if snapshot else 0,
+        }
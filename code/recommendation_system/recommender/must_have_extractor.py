@@ -1,3 +1,19 @@
+def must_have_words(sub_queries):
+    for sq in sub_queries:
+        for word in sq.lower().split():
+            if len(word) >= 3:  # skip short words
+                yield word
+
+
+def extract_must_haves_indexed(sub_queries, token_index, positions, ids):
+    """
+    Same constraints as extract_must_haves, answered from the catalog's
+    TokenIndex. Returns {must-have: [matching candidate ids]}, which the
+    OR-Tools planner takes as `must_have_cover`.
+    """
+    return token_index.cover(must_have_words(sub_queries), positions, ids)
+
+
 def extract_must_haves(sub_queries, df_candidates):
     """
     Dynamically extract must-have constraints from user sub-queries
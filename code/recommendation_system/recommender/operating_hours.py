@@ -0,0 +1,96 @@
+from datetime import date, datetime
+
+import numpy as np
+
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_minutes(time_str):
+    hours, minutes = time_str.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def day_index(day):
+    """Accepts a date/datetime or a weekday name and returns 0 (Monday) .. 6 (Sunday)."""
+    if isinstance(day, (date, datetime)):
+        return day.weekday()
+    return DAYS.index(str(day).lower())
+
+
+def _compile_range(time_range):
+    """
+    Returns (start, end) in minutes for one day's 'HH:MM-HH:MM' entry.
+    Closed or unparseable days become (-1, -1), which never matches;
+    '24 hours' becomes (0, 1440). end < start means the range runs past midnight.
+    """
+    if time_range == '24 hours':
+        return 0, MINUTES_PER_DAY
+    try:
+        start, end = [t.strip() for t in time_range.split('-')]
+        return parse_minutes(start), parse_minutes(end)
+    except (ValueError, AttributeError):
+        return -1, -1
+
+
+class HoursTable:
+    """
+    Operating hours of n locations compiled once into (n, 7) int16 arrays of
+    opening/closing minutes, so open/closed checks are numpy comparisons over
+    every candidate at once instead of per-row JSON/string parsing.
+    """
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def compile(cls, hours_list):
+        hours_list = list(hours_list)
+        start = np.full((len(hours_list), 7), -1, dtype='int16')
+        end = np.full((len(hours_list), 7), -1, dtype='int16')
+        for row, hours_json in enumerate(hours_list):
+            if not isinstance(hours_json, dict):
+                continue
+            for d, day_name in enumerate(DAYS):
+                if day_name in hours_json:
+                    start[row, d], end[row, d] = _compile_range(hours_json[day_name])
+        return cls(start, end)
+
+    def __len__(self):
+        return len(self.start)
+
+    def take(self, positions):
+        positions = np.asarray(positions, dtype='int64')
+        return HoursTable(self.start[positions], self.end[positions])
+
+    def is_open_at(self, day, time):
+        """
+        Boolean mask: open on `day` (date or weekday name) at `time`
+        ('HH:MM' or minutes after midnight), using that day's range.
+        """
+        d = day_index(day)
+        minute = parse_minutes(time) if isinstance(time, str) else time
+        start, end = self.start[:, d], self.end[:, d]
+        overnight = end < start
+        return np.where(overnight, (minute >= start) | (minute < end), (start <= minute) & (minute < end))
+
+    def is_open_for(self, day, time, duration):
+        """
+        Boolean mask: open for the whole slot [time, time + duration minutes).
+        Slots running past midnight continue into an overnight range, or into
+        the next day's range when today's closes exactly at midnight.
+        """
+        d = day_index(day)
+        minute = parse_minutes(time) if isinstance(time, str) else time
+        slot_end = minute + duration
+        start, end = self.start[:, d], self.end[:, d]
+        next_start, next_end = self.start[:, (d + 1) % 7], self.end[:, (d + 1) % 7]
+
+        overnight = end < start
+        fits_overnight = ((minute >= start) & (slot_end <= MINUTES_PER_DAY + end)) | (slot_end <= end)
+        fits_same_day = (start <= minute) & (slot_end <= end)
+        continues_next_day = (
+            (start <= minute) & (end == MINUTES_PER_DAY) & (next_start == 0)
+            & (slot_end - MINUTES_PER_DAY <= np.where(next_end < next_start, MINUTES_PER_DAY, next_end))
+        )
+        return np.where(overnight, fits_overnight, fits_same_day | continues_next_day)
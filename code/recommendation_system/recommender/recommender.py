@@ -1,126 +1,535 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import faiss
 import numpy as np
-import psycopg2
 import pandas as pd
-from sentence_transformers import SentenceTransformer
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from recommender.utils import haversine, deconstruct_query
-from recommender.must_have_extractor import extract_must_haves
+from recommender.utils import deconstruct_query
+from recommender.must_have_extractor import extract_must_haves, extract_must_haves_indexed
+from recommender.cache import embedding_cache_from_env
+from recommender.encoders import SBERT_MODEL_NAME, batching_encoder_from_env, load_encoder
+from recommender.db import PostgresPool, AsyncPostgresPool
+from recommender.location_catalog import LocationCatalog
+from recommender.region_router import RegionRouter
+from recommender.scoring import Candidates, factorize_regions, fused_scores, region_scores
+from recommender.operating_hours import HoursTable
+from recommender.vector_index import describe_index, load_location_ids, read_index_mmap, search_parameters
 from itinerary.itinerary_planner import ItineraryPlanner
+from metrics import RECOMMENDER_CANDIDATES, RECOMMENDER_STAGE_SECONDS
+
 
 class Recommender:
-    def __init__(self, db_params):
+    """
+    Artifact paths, the sentence encoder and the sync DB pool can be injected
+    (benchmarks use a synthetic catalog, a hash encoder and an in-memory pool).
+    Stage timings (encode, search, fetch, region, scoring, planning) go to the
+    Prometheus histograms in metrics.py; set `stage_observer` to a
+    callable(stage, seconds) to receive them as well.
+    """
+    def __init__(self, db_params, index_path='location_index.faiss', ids_path='location_ids.npy',
+                 descriptions_path='descriptions_progress.csv', store_path='descriptions.bin',
+                 encoder=None, db_pool=None):
         print("Initializing Recommender...")
         self.db_params = db_params
-        self.sbert_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.faiss_index = faiss.read_index('location_index.faiss')
-        self.location_ids = np.load('location_ids.npy', allow_pickle=True)
-        self.planner = ItineraryPlanner()
+        pool_options = {
+            "minconn": int(os.getenv("DB_POOL_MIN", "1")),
+            "maxconn": int(os.getenv("DB_POOL_MAX", "10")),
+            "acquire_timeout": float(os.getenv("DB_POOL_TIMEOUT", "5")),
+            "health_check_interval": float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30")),
+        }
+        self.db_pool = db_pool if db_pool is not None else PostgresPool(db_params, **pool_options)
+        self.async_db_pool = AsyncPostgresPool(db_params, **pool_options)
+        # Backend is set by ENCODER_BACKEND (torch, onnx, onnx-int8), see recommender/encoders.py;
+        # concurrent requests share forward passes through the micro-batcher
+        self.sbert_model = encoder if encoder is not None else batching_encoder_from_env(load_encoder())
+        self.embedding_cache = embedding_cache_from_env(getattr(self.sbert_model, 'name', SBERT_MODEL_NAME))
+        # Index, ids and descriptions are memory-mapped, so workers share one page-cache copy
+        if os.getenv("FAISS_MMAP", "1") == "1":
+            self.faiss_index = read_index_mmap(index_path)
+        else:
+            self.faiss_index = faiss.read_index(index_path)
+        # Search-time knobs for approximate indexes (see data_processing/build_index.py)
+        self.nprobe = int(os.getenv("FAISS_NPROBE", "16"))
+        self.ef_search = int(os.getenv("FAISS_EF_SEARCH", "64"))
+        print(f"Loaded FAISS index {describe_index(self.faiss_index)}.")
+        self.location_ids = load_location_ids(ids_path)
+        # id -> FAISS row lookups by binary search, for exclusion selectors
+        self._id_order = np.argsort(self.location_ids, kind='stable')
+        self._sorted_ids = self.location_ids[self._id_order]
+        self.stage_observer = None
+        self.planner = ItineraryPlanner(
+            solver_workers=int(os.getenv("SOLVER_WORKERS", "8")),
+            solver_time_limit=float(os.getenv("SOLVER_TIME_LIMIT", "10"))
+        )
+        # Total OR-Tools time allowed for all queries of one /schedule request
+        self.planning_budget = float(os.getenv("PLANNING_TIME_BUDGET", "5"))
 
-        try:
-            self.descriptions_df = pd.read_csv('descriptions_progress.csv', index_col='id')
-            print("Location descriptions loaded successfully.")
-        except FileNotFoundError:
-            print("Warning: descriptions_progress.csv not found. Summaries will be less detailed.")
-            self.descriptions_df = pd.DataFrame(columns=['description'])
+        self.catalog = LocationCatalog(self.location_ids, self.db_pool, descriptions_path, store_path)
+        self.catalog.refresh()
+
+        # RETRIEVAL_MODE=region: rank regions first, then search only the top regions'
+        # sub-indexes at REGION_SEARCH_DEPTH x k (see recommender/region_router.py)
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "global")
+        self.route_regions = int(os.getenv("ROUTE_REGIONS", "3"))
+        self.region_search_depth = float(os.getenv("REGION_SEARCH_DEPTH", "1.5"))
+        self.region_summary_vectors = int(os.getenv("REGION_SUMMARY_VECTORS", "8"))
+        self._router = None
+        self._router_lock = threading.Lock()
+        if self.retrieval_mode == "region":
+            self.region_router()
+        self.catalog.add_listener(self._rebuild_region_router)
+        self.catalog.start_polling(float(os.getenv("CATALOG_REFRESH_INTERVAL", "300")))
+
+        # Optional spatial retrieval filter around the user (see recommender/spatial_index.py):
+        # only places within SEARCH_RADIUS_KM and/or the SEARCH_NEAREST nearest ones are searched
+        self.search_radius_km = float(os.getenv("SEARCH_RADIUS_KM", "0"))
+        self.search_nearest = int(os.getenv("SEARCH_NEAREST", "0"))
+        # Allowed places up to this share of the index are scored exactly from their vectors,
+        # larger sets by the regular search with an id selector
+        self.spatial_subset_fraction = float(os.getenv("SPATIAL_SUBSET_FRACTION", "0.25"))
 
         print("Models and indexes loaded successfully.")
 
-    def get_recommendations(self, query, user_lat, user_lon, k_per_sub_query=20, exclude_ids=None):
+    @contextmanager
+    def _timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            RECOMMENDER_STAGE_SECONDS.labels(stage).observe(elapsed)
+            observer = self.stage_observer
+            if observer is not None:
+                observer(stage, elapsed)
+
+    def encode_sub_queries(self, sub_queries):
+        """
+        Returns L2-normalized float32 embeddings for the sub-queries, encoding
+        only the ones missing from the embedding cache (in one batched call).
+        """
+        cached, missing = self.embedding_cache.get_many(sub_queries)
+        if missing:
+            with self._timed("encode"):
+                new_emb = self.sbert_model.encode(missing, batch_size=len(missing)).astype('float32')
+            faiss.normalize_L2(new_emb)
+            self.embedding_cache.put_many(missing, new_emb)
+            cached.update(zip(missing, new_emb))
+        return np.stack([cached[sub_q] for sub_q in sub_queries]).astype('float32')
+
+    def embed_queries(self, queries):
+        """
+        Deconstructs every query and encodes all unique sub-queries in a single
+        batched SBERT call. Returns {sub_query: embedding}.
+        """
+        unique_sub_queries = list(dict.fromkeys(
+            sub_q for query in queries for sub_q in deconstruct_query(query)
+        ))
+        if not unique_sub_queries:
+            return {}
+        return dict(zip(unique_sub_queries, self.encode_sub_queries(unique_sub_queries)))
+
+    def _positions_of(self, ids):
+        """FAISS rows of the given location ids (unknown ids are ignored)."""
+        ids = np.unique(np.asarray(ids, dtype='int64'))
+        found = np.minimum(np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+        return self._id_order[found[self._sorted_ids[found] == ids]]
+
+    def search_sub_queries(self, queries, k_per_sub_query=20, exclude_ids=None, embeddings=None, allowed=None):
+        """
+        Runs one multi-row FAISS search over the unique sub-queries of `queries`.
+        `embeddings` ({sub_query: vector}, see embed_queries) skips encoding.
+        Locations in `exclude_ids` are filtered inside the search by an id
+        selector, so every sub-query still gets up to k_per_sub_query usable hits.
+        In region retrieval mode only the routed regions are searched, deeper.
+        `allowed` (FAISS rows, see spatial_filter) restricts the search to those
+        places: small sets are scored exactly from their vectors.
+        Returns {sub_query: [(position, similarity_score), ...]} where position is the
+        FAISS row, aligned with location_ids and the location catalog.
+        """
+        unique_sub_queries = list(dict.fromkeys(
+            sub_q for query in queries for sub_q in deconstruct_query(query)
+        ))
+        if not unique_sub_queries:
+            return {}
+
+        if embeddings is not None and all(sub_q in embeddings for sub_q in unique_sub_queries):
+            emb = np.stack([embeddings[sub_q] for sub_q in unique_sub_queries]).astype('float32')
+        else:
+            emb = self.encode_sub_queries(unique_sub_queries)
+
+        selector = excluded = None
+        if exclude_ids:
+            print(f"Excluding {len(exclude_ids)} previously used IDs.")
+            excluded = self._positions_of(exclude_ids)
+            if allowed is not None:
+                allowed = allowed[~np.isin(allowed, excluded)]
+            else:
+                selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(excluded))
+        if allowed is not None:
+            selector = faiss.IDSelectorBatch(allowed)
+        router = self.region_router() if self.retrieval_mode == "region" else None
+        with self._timed("search"):
+            scores = indices = None
+            if allowed is not None and len(allowed) <= self.spatial_subset_fraction * self.faiss_index.ntotal:
+                scores, indices = self._search_subset(emb, allowed, k_per_sub_query)
+            if scores is None and router is not None:
+                regions = router.route(emb, self.route_regions)
+                depth = max(k_per_sub_query, int(np.ceil(k_per_sub_query * self.region_search_depth)))
+                scores, indices = router.search(self.faiss_index, emb, regions, depth, allowed, excluded)
+            elif scores is None:
+                params = search_parameters(self.faiss_index, k_per_sub_query, self.nprobe, self.ef_search, selector)
+                scores, indices = self.faiss_index.search(emb, k_per_sub_query, params=params)
+
+        hits = {}
+        for sub_q, row_scores, row_indices in zip(unique_sub_queries, scores, indices):
+            valid = row_indices != -1
+            hits[sub_q] = list(zip(row_indices[valid], row_scores[valid]))
+        return hits
+
+    def _search_subset(self, emb, positions, k):
+        """
+        Exact inner-product top-k over the given FAISS rows only, from their
+        reconstructed vectors. (None, None) when the index cannot reconstruct
+        them (IVF without a direct map); the caller then uses an id selector.
+        """
+        k = min(k, len(positions))
+        if k == 0:
+            return np.zeros((len(emb), 0), dtype='float32'), np.zeros((len(emb), 0), dtype='int64')
+        try:
+            vectors = self.faiss_index.reconstruct_batch(positions)
+        except RuntimeError:
+            return None, None
+        scores, rows = faiss.knn(emb, vectors, k, metric=faiss.METRIC_INNER_PRODUCT)
+        return scores, positions[rows]
+
+    def spatial_filter(self, user_lat, user_lon, radius_km=None, nearest=None, snapshot=None):
+        """
+        FAISS rows of the places the spatial retrieval filter allows: those within
+        `radius_km` of the user, the `nearest` closest ones, or the nearest ones
+        within the radius when both are set (defaults SEARCH_RADIUS_KM and
+        SEARCH_NEAREST, 0 disables either). None when no filter applies or no
+        catalog snapshot is loaded. `snapshot` defaults to the current one.
+        """
+        radius_km = self.search_radius_km if radius_km is None else radius_km
+        nearest = self.search_nearest if nearest is None else nearest
+        snapshot = self.catalog.snapshot if snapshot is None else snapshot
+        if snapshot is None or user_lat is None or user_lon is None or not (radius_km or nearest):
+            return None
+        with self._timed("spatial"):
+            if nearest:
+                positions, _ = snapshot.spatial.nearest(user_lat, user_lon, nearest, radius_km or None)
+            else:
+                positions, _ = snapshot.spatial.within(user_lat, user_lon, radius_km)
+        print(f"Spatial filter kept {len(positions)} places.")
+        return positions
+
+    def region_router(self):
+        """
+        The current RegionRouter. Catalog refreshes rebuild it on the refreshing
+        thread (_rebuild_region_router), so requests keep the previous router
+        until the new one is swapped in; it is only built here the first time
+        region mode is used. None (global search) while no snapshot is loaded
+        or when the index cannot reconstruct its vectors.
+        """
+        router = self._router
+        if router is not None:
+            return router
+        snapshot = self.catalog.snapshot
+        if snapshot is None:
+            return None
+        with self._router_lock:
+            if self._router is None:
+                try:
+                    self._router = RegionRouter.build(self.faiss_index, snapshot, self.region_summary_vectors)
+                except RuntimeError as e:
+                    print(f"Warning: region routing unavailable ({e}); using global search.")
+                    self.retrieval_mode = "global"
+            return self._router
+
+    def _rebuild_region_router(self, snapshot):
+        """
+        Catalog listener: builds the router for a new snapshot before it is
+        published, unless the snapshot leaves region membership unchanged.
+        """
+        router = self._router
+        if router is not None and router.key == RegionRouter.membership(snapshot)[2]:
+            return
+        if self.retrieval_mode != "region":
+            # Stale once membership changes; rebuilt on first use if region mode is turned on
+            self._router = None
+            return
+        try:
+            router = RegionRouter.build(self.faiss_index, snapshot, self.region_summary_vectors)
+        except RuntimeError as e:
+            print(f"Warning: could not rebuild the region router ({e}); keeping the previous one.")
+            return
+        with self._router_lock:
+            self._router = router
+
+    def get_retrieval_stats(self):
+        router = self._router if self.retrieval_mode == "region" else None
+        return {"mode": self.retrieval_mode, **(router.get_stats() if router is not None else {})}
+
+    @staticmethod
+    def _trip_datetime(start_date, end_date, itinerary_index):
+        """
+        Date the scheduler will assign to the n-th itinerary (round-robin over the
+        trip days), combined with the current time of day. None without a trip.
+        """
+        if start_date is None:
+            return None
+        days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        day = days[itinerary_index % len(days)] if days else start_date
+        return datetime.combine(day, datetime.now().time())
+
+    def get_recommendations_batch(self, queries, user_lat, user_lon, k_per_sub_query=20, start_date=None, end_date=None,
+                                  radius_km=None):
+        """
+        Plans one itinerary per query, sharing a single encode/search pass across
+        all of them. Places used by earlier queries are excluded from later ones.
+        With a trip date range, opening hours are checked on the day each
+        itinerary will be scheduled instead of today.
+        All sub-queries are encoded in one batch; each query then runs its own
+        FAISS search with the places used so far excluded inside the search.
+        `radius_km` overrides SEARCH_RADIUS_KM for the spatial filter.
+        Returns a list of (query, itinerary) for the queries that produced a plan.
+        """
+        embeddings = self.embed_queries(queries)
+        allowed = self.spatial_filter(user_lat, user_lon, radius_km)
+        deadline = time.monotonic() + self.planning_budget
+
+        used_place_ids = set()
+        all_itineraries = []
+        for query in queries:
+            sub_query_hits = self.search_sub_queries(
+                [query], k_per_sub_query, exclude_ids=list(used_place_ids), embeddings=embeddings, allowed=allowed
+            )
+            itinerary = self.get_recommendations(
+                query,
+                user_lat,
+                user_lon,
+                k_per_sub_query=k_per_sub_query,
+                sub_query_hits=sub_query_hits,
+                when=self._trip_datetime(start_date, end_date, len(all_itineraries)),
+                deadline=deadline
+            )
+            if itinerary:
+                used_place_ids.update(place['id'] for place in itinerary)
+                all_itineraries.append((query, itinerary))
+        return all_itineraries
+
+    def get_recommendations(self, query, user_lat, user_lon, k_per_sub_query=20, exclude_ids=None, sub_query_hits=None,
+                            when=None, deadline=None, radius_km=None):
+        # One catalog snapshot for the whole request, so a concurrent refresh cannot mix versions
+        snapshot = self.catalog.snapshot
+        allowed = self.spatial_filter(user_lat, user_lon, radius_km, snapshot=snapshot) if sub_query_hits is None else None
+        sub_queries, candidates = self._collect_candidates(query, k_per_sub_query, exclude_ids, sub_query_hits, allowed)
+        if candidates is None:
+            return []
+
+        with self._timed("fetch"):
+            df_db = self.db_pool.fetch_locations(candidates.ids) if snapshot is None else None
+            candidates, df_db = self._lookup_locations(candidates, df_db, snapshot)
+        return self._rank_and_plan(sub_queries, candidates, df_db, user_lat, user_lon, when, deadline, snapshot)
+
+    async def aget_recommendations(self, query, user_lat, user_lon, k_per_sub_query=20, exclude_ids=None, sub_query_hits=None,
+                                   when=None, deadline=None, radius_km=None):
+        """
+        Async variant of get_recommendations: the candidate fetch is awaited on the
+        async pool and the CPU-bound stages run in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+        snapshot = self.catalog.snapshot
+        allowed = self.spatial_filter(user_lat, user_lon, radius_km, snapshot=snapshot) if sub_query_hits is None else None
+        sub_queries, candidates = await loop.run_in_executor(
+            None, self._collect_candidates, query, k_per_sub_query, exclude_ids, sub_query_hits, allowed
+        )
+        if candidates is None:
+            return []
+
+        with self._timed("fetch"):
+            df_db = None
+            if snapshot is None and self.async_db_pool.is_open:
+                df_db = await self.async_db_pool.fetch_locations(candidates.ids)
+            elif snapshot is None:
+                # The async pool failed to open at startup; the sync pool still serves the fetch
+                df_db = await loop.run_in_executor(None, self.db_pool.fetch_locations, candidates.ids)
+            candidates, df_db = self._lookup_locations(candidates, df_db, snapshot)
+        return await loop.run_in_executor(
+            None, self._rank_and_plan, sub_queries, candidates, df_db, user_lat, user_lon, when, deadline, snapshot
+        )
+
+    async def aget_recommendations_batch(self, queries, user_lat, user_lon, k_per_sub_query=20, start_date=None, end_date=None,
+                                         radius_km=None):
+        loop = asyncio.get_running_loop()
+        embeddings = await loop.run_in_executor(None, self.embed_queries, queries)
+        allowed = self.spatial_filter(user_lat, user_lon, radius_km)
+        deadline = time.monotonic() + self.planning_budget
+
+        used_place_ids = set()
+        all_itineraries = []
+        for query in queries:
+            sub_query_hits = await loop.run_in_executor(
+                None, self.search_sub_queries, [query], k_per_sub_query, list(used_place_ids), embeddings, allowed
+            )
+            itinerary = await self.aget_recommendations(
+                query,
+                user_lat,
+                user_lon,
+                k_per_sub_query=k_per_sub_query,
+                sub_query_hits=sub_query_hits,
+                when=self._trip_datetime(start_date, end_date, len(all_itineraries)),
+                deadline=deadline
+            )
+            if itinerary:
+                used_place_ids.update(place['id'] for place in itinerary)
+                all_itineraries.append((query, itinerary))
+        return all_itineraries
+
+    async def open_async_pool(self):
+        await self.async_db_pool.open()
+
+    async def close_async_pool(self):
+        await self.async_db_pool.close()
+
+    def _collect_candidates(self, query, k_per_sub_query, exclude_ids, sub_query_hits, allowed=None):
         print(f"\nOriginal query: '{query}'")
         sub_queries = deconstruct_query(query)
         print(f"Deconstructed into: {sub_queries}")
 
-        # FAISS retrieval
-        candidate_pool = []
-        for sub_q in sub_queries:
-            emb = self.sbert_model.encode([sub_q]).astype('float32')
-            faiss.normalize_L2(emb)
-            scores, indices = self.faiss_index.search(emb, k_per_sub_query)
-            ids = self.location_ids[indices.flatten()]
-            for id, score in zip(ids, scores.flatten()):
-                candidate_pool.append({'id': id, 'similarity_score': score, 'source_query': sub_q})
-
-        if not candidate_pool:
+        # FAISS retrieval (reuses a search when the caller already ran one); exclusions
+        # are applied inside the search so each sub-query keeps k usable hits
+        if sub_query_hits is None or any(sub_q not in sub_query_hits for sub_q in sub_queries):
+            sub_query_hits = self.search_sub_queries([query], k_per_sub_query, exclude_ids=exclude_ids, allowed=allowed)
+            exclude_ids = None
+
+        candidates = Candidates.from_hits(sub_queries, sub_query_hits, self.location_ids)
+        if not len(candidates):
             print("No candidates found for query.")
-            return []
+            return sub_queries, None
 
-        df_candidates = pd.DataFrame(candidate_pool).drop_duplicates('id')
+        # One row per place, keeping the sub-query hit with the highest similarity
+        candidates = candidates.dedup()
 
         if exclude_ids:
+            # Caller-supplied hits may still contain excluded places
             print(f"Excluding {len(exclude_ids)} previously used IDs.")
-            # Use isin() to find which candidates to remove and the ~ to invert the selection
-            df_candidates = df_candidates[~df_candidates['id'].isin(exclude_ids)]
-            if df_candidates.empty:
+            candidates = candidates.take(~np.isin(candidates.ids, np.asarray(list(exclude_ids), dtype='int64')))
+            if not len(candidates):
                 print("All candidates were excluded.")
-                return []
+                return sub_queries, None
 
-        # DB fetch
-        conn = psycopg2.connect(**self.db_params)
-        ids_tuple = tuple(df_candidates['id'])
-        if not ids_tuple:
-            return []
-        sql = """
-            SELECT id, name, region, primary_category, tags, operating_hours, meal_type,
-                ST_Y(geom::geometry) as latitude, ST_X(geom::geometry) as longitude,
-                indoor_outdoor, website, naver_url
-            FROM locations 
-            WHERE id IN %s;
-        """
-        df_db = pd.read_sql_query(sql, conn, index_col='id', params=(ids_tuple,))
-        conn.close()
-        df_db['region'] = df_db['region'].str.strip()
-        df_candidates = df_candidates.set_index('id').join(df_db, how='inner')
-
-        df_candidates = df_candidates.join(self.descriptions_df, how='left')
-        df_candidates['description'].fillna('', inplace=True)
+        RECOMMENDER_CANDIDATES.labels('retrieved').observe(len(candidates))
+        return sub_queries, candidates
 
-        if df_candidates.empty:
-            return []
+    def _lookup_locations(self, candidates, df_db=None, snapshot=None):
+        """
+        Drops candidates that are no longer in the locations table. Without a
+        fetched `df_db`, details are served from the catalog `snapshot` (default:
+        the current one) and df_db stays None; while no snapshot is loaded they
+        come from a pooled DB query, returned as a DataFrame aligned row-for-row
+        with the candidates.
+        """
+        if df_db is None:
+            snapshot = self.catalog.snapshot if snapshot is None else snapshot
+            if snapshot is not None:
+                return candidates.take(snapshot.present[candidates.positions]), None
+            df_db = self.db_pool.fetch_locations(candidates.ids)
+        df_db = df_db[~df_db.index.duplicated()]
+        candidates = candidates.take(np.isin(candidates.ids, df_db.index.to_numpy()))
+        df_db = df_db.reindex(candidates.ids)
+        df_db['region'] = df_db['region'].str.strip()
+        return candidates, df_db
 
-        # Region selection
-        region_score = df_candidates.groupby('region').agg(
-            total_score=('similarity_score', 'sum'),
-            query_coverage=('source_query', 'nunique')
-        )
-        region_score['final_region_score'] = (region_score['query_coverage'] ** 2) * region_score['total_score']
-        winning_region = region_score['final_region_score'].idxmax()
-        print(f"Winning region: {winning_region}")
-        df_final = df_candidates[df_candidates['region'] == winning_region].copy()
-        if df_final.empty:
-            return []
+    def rank_candidates(self, candidates, df_db, user_lat, user_lon, when=None, snapshot=None):
+        """
+        Picks the winning region and scores its candidates on numpy arrays
+        (see recommender/scoring.py). Returns (df_final, hours): the region's
+        candidates as a DataFrame indexed by id, best final_score first, and
+        their HoursTable in the same order; (None, None) when nothing is left.
+        Columns come from `df_db`, or when it is None from `snapshot` (default:
+        the current one).
+        """
+        snapshot = self._request_snapshot(df_db, snapshot)
+        if not len(candidates):
+            return None, None
+        if snapshot is not None:
+            columns = snapshot.columns_at(candidates.positions, ['region', 'latitude', 'longitude'])
+        else:
+            columns = {name: df_db[name].to_numpy() for name in ('region', 'latitude', 'longitude')}
 
-        # Distance penalty
-        df_final['distance_km'] = haversine(user_lat, user_lon, df_final['latitude'], df_final['longitude'])
-        df_final['distance_penalty'] = 1 / (1 + df_final['distance_km']**2)
+        # Region selection: coverage^2 * total similarity, aggregated with bincount
+        with self._timed("region"):
+            codes, regions = factorize_regions(columns['region'])
+            if not len(regions):
+                return None, None
+            winner = int(np.argmax(region_scores(codes, len(regions), candidates.scores,
+                                                 candidates.query_codes, len(candidates.sub_queries))))
+            print(f"Winning region: {regions[winner]}")
+            rows = np.flatnonzero(codes == winner)
+            final = candidates.take(rows)
+        RECOMMENDER_CANDIDATES.labels('region').observe(len(final))
 
-        # Time bonus
-        now = datetime.now()
-        current_day, current_time = now.strftime('%A').lower(), now.strftime('%H:%M')
+        # Distance penalty, opening-hours bonus and final score in one pass
+        with self._timed("scoring"):
+            when = when or datetime.now()
+            if snapshot is not None:
+                hours = snapshot.hours.take(final.positions)
+            else:
+                hours = HoursTable.compile(df_db['operating_hours'].to_numpy()[rows])
+            distance_km, distance_penalty, time_bonus, final_score = fused_scores(
+                final.scores, columns['latitude'][rows].astype('float64'),
+                columns['longitude'][rows].astype('float64'), user_lat, user_lon,
+                hours.is_open_at(when, when.hour * 60 + when.minute)
+            )
+            order = np.argsort(-final_score, kind='stable')
+            final, hours = final.take(order), hours.take(order)
 
-        def is_open(hours_json):
-            if not isinstance(hours_json, dict) or current_day not in hours_json:
-                return False
-            time_range = hours_json[current_day]
-            if time_range in ['Closed', '24 hours']:
-                return time_range == '24 hours'
-            try:
-                start, end = [t.strip() for t in time_range.split('-')]
-                return (end < start and (current_time >= start or current_time < end)) or (start <= current_time < end)
-            except Exception:
-                return False
+            data = {'position': final.positions, 'similarity_score': final.scores,
+                    'source_query': final.source_queries}
+            if snapshot is not None:
+                data.update(snapshot.columns_at(final.positions))
+            else:
+                data.update({name: df_db[name].to_numpy()[rows[order]] for name in df_db.columns})
+                descriptions = self.catalog.descriptions_at(final.ids, final.positions)
+                data['description'] = descriptions.reindex(final.ids).to_numpy(dtype=object)
+            data.update({'distance_km': distance_km[order], 'distance_penalty': distance_penalty[order],
+                         'time_bonus': time_bonus[order], 'final_score': final_score[order]})
+            df_final = pd.DataFrame(data, index=pd.Index(final.ids, name='id'))
+        return df_final, hours
 
-        df_final['time_bonus'] = df_final['operating_hours'].apply(lambda h: 1.2 if is_open(h) else 1.0)
+    def _request_snapshot(self, df_db, snapshot):
+        """The snapshot a request reads details from: none when they were fetched into df_db."""
+        if df_db is not None:
+            return None
+        return self.catalog.snapshot if snapshot is None else snapshot
 
-        # Final score
-        df_final['final_score'] = df_final['similarity_score'] * df_final['distance_penalty'] * df_final['time_bonus']
-        df_final = df_final.sort_values('final_score', ascending=False)
+    def _rank_and_plan(self, sub_queries, candidates, df_db, user_lat, user_lon, when=None, deadline=None,
+                       snapshot=None):
+        when = when or datetime.now()
+        snapshot = self._request_snapshot(df_db, snapshot)
+        df_final, hours = self.rank_candidates(candidates, df_db, user_lat, user_lon, when, snapshot)
+        if df_final is None:
+            return []
 
         # Itinerary planning
-        must_haves = extract_must_haves(sub_queries, df_final)
-        if must_haves:
-            print(f"Applying hard constraints: {must_haves}")
-            return self.planner.plan_day(df_final, mode="or_tools", must_haves=must_haves)
-        else:
-            return self.planner.plan_day(df_final, mode="beam", beam_width=3)
+        with self._timed("planning"):
+            if snapshot is not None:
+                must_have_cover = extract_must_haves_indexed(
+                    sub_queries, snapshot.tokens, df_final['position'].tolist(), df_final.index.tolist()
+                )
+                must_haves = list(must_have_cover)
+            else:
+                must_have_cover = None
+                must_haves = extract_must_haves(sub_queries, df_final)
+            if must_haves:
+                print(f"Applying hard constraints: {must_haves}")
+                return self.planner.plan_day(df_final, mode="or_tools", must_haves=must_haves, day=when, hours=hours,
+                                             must_have_cover=must_have_cover, deadline=deadline)
+            else:
+                return self.planner.plan_day(df_final, mode="dp", day=when, hours=hours)
@@ -0,0 +1,108 @@
+import hashlib
+import time
+
+import faiss
+import numpy as np
+
+from recommender.scoring import factorize_regions
+
+
+class RegionRouter:
+    """
+    Two-stage retrieval by region. Each region is summarized by up to
+    `summary_vectors` spherical k-means centroids of its place embeddings.
+    `route()` ranks regions by how well they match every sub-query;
+    `search()` then scores only the chosen regions' rows of the shared main
+    index, so search work grows with region size instead of catalog size and
+    no worker keeps a private copy of the vectors. Built from a catalog
+    snapshot (`version` is the one it was built from); `key` identifies its
+    region membership, so snapshots that leave membership unchanged reuse it.
+    """
+    def __init__(self, version, key, regions, centroids, centroid_regions, members):
+        self.version = version
+        self.key = key
+        self.regions = regions
+        self.centroids = centroids
+        self.centroid_regions = centroid_regions
+        self.members = members
+
+    @staticmethod
+    def membership(snapshot):
+        """(region names, region code per FAISS row with -1 for absent places, membership key)."""
+        codes, regions = factorize_regions(snapshot.columns['region'])
+        codes[~snapshot.present] = -1
+        digest = hashlib.sha1(np.ascontiguousarray(codes, dtype='int64').tobytes())
+        digest.update("\0".join(map(str, regions)).encode('utf-8'))
+        return regions, codes, digest.hexdigest()
+
+    @classmethod
+    def build(cls, index, snapshot, summary_vectors=8, seed=0):
+        start = time.perf_counter()
+        regions, codes, key = cls.membership(snapshot)
+
+        centroids, centroid_regions, members = [], [], []
+        for region in range(len(regions)):
+            positions = np.flatnonzero(codes == region).astype('int64')
+            # One region's vectors at a time, dropped once summarized
+            region_vectors = index.reconstruct_batch(positions)
+            faiss.normalize_L2(region_vectors)
+            if len(positions) <= summary_vectors:
+                summary = region_vectors
+            else:
+                kmeans = faiss.Kmeans(index.d, summary_vectors, niter=10, spherical=True, seed=seed)
+                kmeans.train(region_vectors)
+                summary = kmeans.centroids
+            centroids.append(summary)
+            centroid_regions.append(np.full(len(summary), region))
+            members.append(positions)
+
+        router = cls(snapshot.version, key, regions, np.concatenate(centroids).astype('float32'),
+                     np.concatenate(centroid_regions), members)
+        print(f"Built region router: {len(regions)} regions, {len(router.centroids)} summary vectors "
+              f"in {time.perf_counter() - start:.1f}s.")
+        return router
+
+    def route(self, emb, top_regions=3):
+        """
+        Indices of the `top_regions` regions with the highest sum, over the
+        sub-queries, of their best summary-vector similarity (clipped at 0).
+        """
+        affinity = np.full((len(emb), len(self.regions)), -np.inf, dtype='float32')
+        np.maximum.at(affinity.T, self.centroid_regions, (emb @ self.centroids.T).T)
+        region_score = np.clip(affinity, 0, None).sum(axis=0)
+        return np.argsort(-region_score, kind='stable')[:top_regions]
+
+    def search(self, index, emb, region_indices, k, allowed=None, excluded=None):
+        """
+        Exact search of every sub-query within each given region at depth k,
+        scored on the region's vectors reconstructed from `index` (the main
+        index the router was built from) for this call only. `allowed` and
+        `excluded` optionally restrict the FAISS rows. Returns (scores,
+        positions) shaped like Index.search, every row sorted by score, -1
+        positions for empty slots.
+        """
+        all_scores, all_positions = [], []
+        for region in region_indices:
+            positions = self.members[region]
+            if allowed is not None:
+                positions = positions[np.isin(positions, allowed)]
+            if excluded is not None:
+                positions = positions[~np.isin(positions, excluded)]
+            region_k = min(k, len(positions))
+            if region_k == 0:
+                continue
+            scores, rows = faiss.knn(emb, index.reconstruct_batch(positions), region_k,
+                                     metric=faiss.METRIC_INNER_PRODUCT)
+            all_scores.append(scores)
+            all_positions.append(positions[rows])
+        if not all_scores:
+            return np.zeros((len(emb), 0), dtype='float32'), np.zeros((len(emb), 0), dtype='int64')
+        scores, positions = np.hstack(all_scores), np.hstack(all_positions)
+        scores[positions == -1] = -np.inf
+        order = np.argsort(-scores, axis=1, kind='stable')
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(positions, order, axis=1)
+
+    def get_stats(self):
+        sizes = [len(positions) for positions in self.members]
+        return {'version': self.version, 'regions': len(self.regions), 'summary_vectors': len(self.centroids),
+                'largest_region': max(sizes, default=0)}
@@ -0,0 +1,96 @@
+"""
+Numpy kernels for the retrieval-to-scoring stage of Recommender. A query has
+about 60 candidates, few enough that DataFrame construction, groupby and
+joins used to cost more than the arithmetic itself.
+"""
+import numpy as np
+
+from recommender.utils import haversine
+
+OPEN_NOW_BONUS = 1.2
+
+
+class Candidates:
+    """
+    FAISS hits for one query as parallel arrays: location id, FAISS row
+    (catalog position), similarity score and the index of the sub-query
+    that retrieved it.
+    """
+    def __init__(self, sub_queries, ids, positions, scores, query_codes):
+        self.sub_queries = sub_queries
+        self.ids = ids
+        self.positions = positions
+        self.scores = scores
+        self.query_codes = query_codes
+
+    @classmethod
+    def from_hits(cls, sub_queries, sub_query_hits, location_ids):
+        """Flattens {sub_query: [(position, score), ...]} in sub-query order."""
+        hits = [sub_query_hits[sub_q] for sub_q in sub_queries]
+        positions = np.fromiter((p for h in hits for p, _ in h), dtype='int64')
+        scores = np.fromiter((s for h in hits for _, s in h), dtype='float32')
+        query_codes = np.repeat(np.arange(len(sub_queries)), [len(h) for h in hits])
+        return cls(sub_queries, location_ids[positions], positions, scores, query_codes)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def take(self, rows):
+        """Subset by index array or boolean mask."""
+        return Candidates(self.sub_queries, self.ids[rows], self.positions[rows], self.scores[rows],
+                          self.query_codes[rows])
+
+    def dedup(self):
+        return self.take(dedup_max_score(self.ids, self.scores))
+
+    @property
+    def source_queries(self):
+        return np.array(self.sub_queries, dtype=object)[self.query_codes]
+
+
+def dedup_max_score(ids, scores):
+    """
+    Rows that keep each id once, at its highest score (the earliest hit on
+    ties), returned in their original order.
+    """
+    order = np.argsort(-scores, kind='stable')
+    _, first = np.unique(ids[order], return_index=True)
+    return np.sort(order[first])
+
+
+def factorize_regions(regions):
+    """
+    (codes, names): names are the distinct region strings in sorted order,
+    codes index into them, -1 for a missing region.
+    """
+    regions = np.asarray(regions, dtype=object)
+    valid = np.fromiter((isinstance(r, str) for r in regions), dtype=bool, count=len(regions))
+    codes = np.full(len(regions), -1, dtype='int64')
+    names, codes[valid] = np.unique(regions[valid].astype(str), return_inverse=True)
+    return codes, names
+
+
+def region_scores(codes, n_regions, scores, query_codes, n_queries):
+    """
+    coverage^2 * total similarity per region, where coverage is the number of
+    distinct sub-queries with a candidate in that region. Rows with code -1
+    are ignored.
+    """
+    valid = codes >= 0
+    codes, scores, query_codes = codes[valid], scores[valid], query_codes[valid]
+    total = np.bincount(codes, weights=scores, minlength=n_regions)
+    pairs = np.unique(codes * n_queries + query_codes)
+    coverage = np.bincount(pairs // n_queries, minlength=n_regions)
+    return coverage.astype('float64') ** 2 * total
+
+
+def fused_scores(similarity, latitude, longitude, user_lat, user_lon, open_now):
+    """
+    similarity x distance penalty x opening-hours bonus in one pass.
+    Returns (distance_km, distance_penalty, time_bonus, final_score).
+    """
+    distance_km = haversine(user_lat, user_lon, latitude, longitude)
+    distance_penalty = 1 / (1 + distance_km ** 2)
+    time_bonus = np.where(open_now, OPEN_NOW_BONUS, 1.0)
+    final_score = similarity * distance_penalty * time_bonus
+    return distance_km, distance_penalty, time_bonus, final_score
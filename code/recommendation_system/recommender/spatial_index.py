@@ -0,0 +1,97 @@
+import numpy as np
+
+from recommender.utils import haversine
+
+# Same earth radius as utils.haversine, so box bounds and distances agree exactly
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * np.pi / 180
+HALF_EARTH_CIRCUMFERENCE_KM = EARTH_RADIUS_KM * np.pi
+
+
+class SpatialIndex:
+    """
+    Uniform lat/lon grid over location coordinates. Catalog positions are
+    stored sorted by cell (row-major: latitude row, then longitude), so each
+    latitude row of a query box is one contiguous slice found by binary
+    search. A radius query reads only the cells overlapping the circle's
+    bounding box and filters them by exact haversine distance, so its cost
+    depends on how many places are nearby, not on the catalog size.
+    """
+    def __init__(self, cell_km, positions, keys, latitude, longitude):
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE_LAT
+        self.lon_cells = int(np.ceil(360 / self.cell_deg)) + 1
+        self.positions = positions
+        self.keys = keys
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @classmethod
+    def build(cls, latitude, longitude, present=None, cell_km=2.0):
+        latitude = np.asarray(latitude, dtype='float64')
+        longitude = np.asarray(longitude, dtype='float64')
+        valid = np.isfinite(latitude) & np.isfinite(longitude)
+        if present is not None:
+            valid &= present
+        positions = np.flatnonzero(valid)
+        index = cls(cell_km, positions, None, latitude, longitude)
+        keys = index._key(*index._cells(latitude[positions], longitude[positions]))
+        order = np.argsort(keys, kind='stable')
+        index.positions, index.keys = positions[order], keys[order]
+        return index
+
+    def _cells(self, lat, lon):
+        return (np.floor((np.asarray(lat) + 90) / self.cell_deg).astype('int64'),
+                np.floor((np.asarray(lon) + 180) / self.cell_deg).astype('int64'))
+
+    def _key(self, lat_cell, lon_cell):
+        return lat_cell * self.lon_cells + lon_cell
+
+    def __len__(self):
+        return len(self.positions)
+
+    def within(self, lat, lon, radius_km):
+        """Catalog positions within `radius_km` of (lat, lon), nearest first, and their distances."""
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = np.cos(np.radians(min(abs(lat) + lat_span, 90.0)))
+        lon_span = 180.0 if cos_lat < 1e-6 else min(lat_span / cos_lat, 180.0)
+        # Longitude intervals, split where the box crosses the antimeridian
+        if lon_span >= 180.0:
+            lon_ranges = [(-180.0, 180.0)]
+        else:
+            west, east = lon - lon_span, lon + lon_span
+            lon_ranges = [(max(west, -180.0), min(east, 180.0))]
+            if west < -180.0:
+                lon_ranges.append((west + 360.0, 180.0))
+            if east > 180.0:
+                lon_ranges.append((-180.0, east - 360.0))
+
+        lat_lo, lat_hi = self._cells([max(lat - lat_span, -90.0), min(lat + lat_span, 90.0)], [0.0, 0.0])[0]
+        rows = np.arange(lat_lo, lat_hi + 1)
+        slices = []
+        for west, east in lon_ranges:
+            lon_lo, lon_hi = self._cells([0.0, 0.0], [west, east])[1]
+            starts = np.searchsorted(self.keys, self._key(rows, lon_lo), side='left')
+            ends = np.searchsorted(self.keys, self._key(rows, lon_hi), side='right')
+            slices += [self.positions[s:e] for s, e in zip(starts, ends) if e > s]
+        candidates = np.concatenate(slices) if slices else np.zeros(0, dtype='int64')
+
+        distances = haversine(lat, lon, self.latitude[candidates], self.longitude[candidates])
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return candidates[order], distances[order]
+
+    def nearest(self, lat, lon, k, max_radius_km=None):
+        """
+        The k catalog positions nearest to (lat, lon), nearest first, with
+        distances; fewer when the catalog, or the `max_radius_km` circle, holds
+        fewer. The search radius doubles from one cell until k places fit.
+        """
+        limit = min(max_radius_km or HALF_EARTH_CIRCUMFERENCE_KM, HALF_EARTH_CIRCUMFERENCE_KM)
+        radius = min(self.cell_km, limit)
+        while True:
+            positions, distances = self.within(lat, lon, radius)
+            if len(positions) >= k or radius >= limit:
+                return positions[:k], distances[:k]
+            radius = min(2 * radius, limit)
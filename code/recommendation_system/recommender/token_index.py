@@ -0,0 +1,78 @@
+import numpy as np
+
+from recommender.cache import LRUCache
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TokenIndex:
+    """
+    Lowercase tokens of "primary_category name" for every catalog position,
+    plus a trigram -> tokens index over the vocabulary. A word matches a
+    location when it is a substring of one of its tokens (the same rule as a
+    substring search over the joined text, since words carry no whitespace),
+    so must-have detection is a handful of set lookups instead of a string
+    scan over every candidate.
+    """
+    def __init__(self, tokens, cache_size=4096):
+        self.tokens = tokens
+        self.trigram_tokens = {}
+        vocabulary = set()
+        for row_tokens in tokens:
+            vocabulary.update(row_tokens)
+        for token in vocabulary:
+            for trigram in _trigrams(token):
+                self.trigram_tokens.setdefault(trigram, set()).add(token)
+        self.vocabulary = vocabulary
+        self._matches = LRUCache(maxsize=cache_size)
+
+    @classmethod
+    def build(cls, categories, names):
+        tokens = np.empty(len(categories), dtype=object)
+        for pos, (category, name) in enumerate(zip(categories, names)):
+            tokens[pos] = tuple(dict.fromkeys(f"{category} {name}".lower().split()))
+        return cls(tokens)
+
+    def matching_tokens(self, word):
+        """Vocabulary tokens containing `word` (at least 3 characters)."""
+        matches = self._matches.get(word)
+        if matches is None:
+            grams = sorted(_trigrams(word), key=lambda g: len(self.trigram_tokens.get(g, ())))
+            if not grams or grams[0] not in self.trigram_tokens:
+                matches = frozenset()
+            else:
+                candidates = set(self.trigram_tokens[grams[0]])
+                for gram in grams[1:]:
+                    candidates &= self.trigram_tokens.get(gram, set())
+                    if not candidates:
+                        break
+                matches = frozenset(token for token in candidates if word in token)
+            self._matches.put(word, matches)
+        return matches
+
+    def cover(self, words, positions, ids):
+        """
+        {word: [ids of the given candidates matching it]} for every word that
+        matches at least one candidate. `positions` are catalog positions
+        aligned with `ids`.
+        """
+        ids_by_token = {}
+        for pos, loc_id in zip(positions, ids):
+            for token in self.tokens[pos]:
+                ids_by_token.setdefault(token, []).append(loc_id)
+
+        cover = {}
+        for word in words:
+            if word in cover:
+                continue
+            tokens = self.matching_tokens(word)
+            if len(tokens) > len(ids_by_token):
+                tokens = [token for token in ids_by_token if token in tokens]
+            matched = []
+            for token in tokens:
+                matched.extend(ids_by_token.get(token, ()))
+            if matched:
+                cover[word] = list(dict.fromkeys(matched))
+        return cover
@@ -0,0 +1,70 @@
+import faiss
+import numpy as np
+
+
+def index_kind(index):
+    """'ivf', 'hnsw' or 'flat' (flat also covers SQ8/fp16 scalar-quantized scans)."""
+    if faiss.try_extract_index_ivf(index) is not None:
+        return 'ivf'
+    if isinstance(faiss.downcast_index(index), faiss.IndexHNSW):
+        return 'hnsw'
+    return 'flat'
+
+
+def describe_index(index):
+    kind = index_kind(index)
+    name = type(faiss.downcast_index(index)).__name__
+    if kind == 'ivf':
+        return f"{name} (nlist={faiss.try_extract_index_ivf(index).nlist}, {index.ntotal} vectors)"
+    return f"{name} ({index.ntotal} vectors)"
+
+
+def search_parameters(index, k, nprobe=16, ef_search=64, selector=None):
+    """
+    Per-call search parameters for whichever index type is loaded: nprobe for
+    IVF, efSearch (at least k) for HNSW, plus an optional id selector.
+    Returns None when there is nothing to set.
+    """
+    kind = index_kind(index)
+    if kind == 'ivf':
+        params = faiss.SearchParametersIVF(nprobe=nprobe)
+    elif kind == 'hnsw':
+        params = faiss.SearchParametersHNSW(efSearch=max(ef_search, k))
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def read_index_mmap(path):
+    """
+    Opens a FAISS index memory-mapped and read-only, so uvicorn workers share
+    one page-cache copy and startup time does not grow with index size.
+    Flat/SQ/HNSW codes need IO_FLAG_MMAP_IFC, IVF lists IO_FLAG_MMAP; falls
+    back to a regular in-memory read when neither applies.
+    """
+    mmap_ifc = getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+    for flags in (faiss.IO_FLAG_MMAP | mmap_ifc, faiss.IO_FLAG_MMAP):
+        try:
+            return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            continue
+    print(f"Warning: could not memory-map '{path}'; loading it into memory.")
+    return faiss.read_index(path)
+
+
+def load_location_ids(path):
+    """
+    Location ids (FAISS row -> id) as an int64 array, memory-mapped. Older
+    artifacts saved as pickled object arrays are still loaded, into memory.
+    """
+    try:
+        ids = np.load(path, mmap_mode='r')
+    except ValueError:
+        print(f"Warning: '{path}' is a pickled object array; re-save it as int64 "
+              f"(data_processing/export_artifacts.py) to memory-map it.")
+        return np.load(path, allow_pickle=True).astype('int64')
+    return ids if ids.dtype == np.int64 else ids.astype('int64')
@@ -1,33 +1,146 @@
 import requests
-from datetime import datetime
+from concurrent.futures import Future
+from datetime import datetime, timedelta
 import os
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+from metrics import WEATHER_FETCH_SECONDS
+from recommender.cache import LRUCache
+from recommender.utils import geohash, geohash_center
 
 API_KEY = os.getenv("WEATHER_API_KEY")
-BASE_URL = "https://api.openweathermap.org/data/2.5/forecast"
+BASE_URL = os.getenv("WEATHER_API_URL", "https://api.openweathermap.org/data/2.5/forecast")
 
-def get_weather_forecast(lat, lon, start_date, end_date):
+
+class Forecast:
     """
-    Returns forecast by 3-hour blocks for a date range.
+    Parsed 5-day / 3-hour forecast for one location, indexed by date.
     """
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "appid": API_KEY,
-        "units": "metric"
-    }
-    resp = requests.get(BASE_URL, params=params).json()
-    forecasts = []
-
-    for item in resp.get('list', []):
-        dt = datetime.fromtimestamp(item['dt'])
-        if start_date <= dt.date() <= end_date:
-            forecasts.append({
-                'datetime': dt,
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda f: f['datetime'])
+        self.by_date = {}
+        for f in self.entries:
+            self.by_date.setdefault(f['datetime'].date(), []).append(f)
+
+    @classmethod
+    def from_response(cls, resp):
+        entries = []
+        for item in resp.get('list', []):
+            entries.append({
+                'datetime': datetime.fromtimestamp(item['dt']),
                 'temp': item['main']['temp'],
                 'weather': item['weather'][0]['main'].lower(),
                 'rain': item.get('rain', {}).get('3h', 0)
             })
-    return forecasts
+        return cls(entries)
+
+    def between(self, start_date, end_date):
+        """3-hour blocks whose date lies in [start_date, end_date]."""
+        forecasts = []
+        day = start_date
+        while day <= end_date:
+            forecasts.extend(self.by_date.get(day, []))
+            day += timedelta(days=1)
+        return forecasts
+
+
+class ForecastService:
+    """
+    Caches the raw OpenWeather forecast per geohash cell for `ttl` seconds and
+    merges concurrent fetches for the same cell into one HTTP call. Requests
+    go through a pooled session with connect/read timeouts. Point `base_url`
+    at a local stub server to test without the real API.
+    """
+    def __init__(self, base_url=BASE_URL, api_key=API_KEY, ttl=1800, precision=5,
+                 timeout=(3.05, 10), max_cells=1024, pool_size=10):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.precision = precision
+        self.timeout = timeout
+        self.cache = LRUCache(maxsize=max_cells, ttl=ttl)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0}
+
+    def _fetch(self, cell):
+        lat, lon = geohash_center(cell)
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": self.api_key,
+            "units": "metric"
+        }
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            resp = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            resp.raise_for_status()
+            forecast = Forecast.from_response(resp.json())
+            outcome = "ok"
+            return forecast
+        finally:
+            WEATHER_FETCH_SECONDS.labels(outcome).observe(time.perf_counter() - start)
+
+    def get_forecast(self, lat, lon):
+        """
+        Returns the Forecast for the geohash cell containing (lat, lon).
+        Fetch errors yield an empty Forecast and are not cached.
+        """
+        cell = geohash(lat, lon, self.precision)
+        with self._lock:
+            forecast = self.cache.get(cell)
+            if forecast is not None:
+                self.stats['hits'] += 1
+                return forecast
+            future = self._inflight.get(cell)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[cell] = future
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if owner:
+            try:
+                forecast = self._fetch(cell)
+                self.cache.put(cell, forecast)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print(f"Warning: weather forecast fetch failed ({e}).")
+                with self._lock:
+                    self.stats['errors'] += 1
+                forecast = Forecast([])
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(cell, None)
+            future.set_result(forecast)
+            return forecast
+        return future.result()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['cached_cells'] = len(self.cache)
+        return stats
+
+
+forecast_service = ForecastService()
+
+def get_weather_forecast(lat, lon, start_date, end_date):
+    """
+    Returns forecast by 3-hour blocks for a date range.
+    """
+    return forecast_service.get_forecast(lat, lon).between(start_date, end_date)
 
 def is_good_weather(forecast):
     """
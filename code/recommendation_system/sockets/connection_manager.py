@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+import json
+import time
+
+from starlette.websockets import WebSocket, WebSocketState
+
+_CLOSE = object()
+
+
+class Connection:
+    """One registered socket with its own bounded outgoing queue and sender task."""
+    def __init__(self, connection_id, websocket: WebSocket, queue_size):
+        self.id = connection_id
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sender = None
+        self.connected_at = time.monotonic()
+        self.last_activity = self.connected_at
+        self.closing = False
+
+
+class ConnectionManager:
+    """
+    Registry of open WebSockets keyed by connection id.
+
+    - every connection gets a bounded send queue drained by its own task, so
+      `broadcast` only enqueues and one slow client never delays the others,
+    - when a queue is full, droppable messages (e.g. cumulative partial
+      summaries) are discarded; otherwise the slow consumer is closed,
+    - a heartbeat task sends `{"type": "ping"}` every `ping_interval` seconds
+      and closes connections with no activity for `idle_timeout` seconds.
+      Inbound messages (including `{"type": "pong"}`) and delivered non-ping
+      messages count as activity.
+    """
+    def __init__(self, queue_size=64, send_timeout=5.0, ping_interval=20.0, idle_timeout=90.0):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.connections = {}
+        self._ids = itertools.count(1)
+        self._heartbeat = None
+        # Strong references to background close tasks, which the event loop only holds weakly
+        self._close_tasks = set()
+        self.stats = {'accepted': 0, 'sent': 0, 'dropped_messages': 0,
+                      'closed_slow': 0, 'closed_idle': 0, 'send_errors': 0}
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        connection = Connection(next(self._ids), websocket, self.queue_size)
+        connection.sender = asyncio.create_task(self._sender(connection))
+        self.connections[connection.id] = connection
+        self.stats['accepted'] += 1
+        return connection.id
+
+    async def _sender(self, connection):
+        websocket = connection.websocket
+        while True:
+            text, is_ping = await connection.queue.get()
+            if text is _CLOSE:
+                return
+            try:
+                await asyncio.wait_for(websocket.send_text(text), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.stats['closed_slow'] += 1
+                await self._close(connection, code=1013)
+                return
+            except Exception:
+                self.stats['send_errors'] += 1
+                await self._close(connection)
+                return
+            self.stats['sent'] += 1
+            if not is_ping:
+                connection.last_activity = time.monotonic()
+
+    def _enqueue(self, connection, text, droppable=False, is_ping=False):
+        if connection.closing:
+            return False
+        try:
+            connection.queue.put_nowait((text, is_ping))
+            return True
+        except asyncio.QueueFull:
+            pass
+        if droppable or is_ping:
+            self.stats['dropped_messages'] += 1
+            return False
+        self.stats['closed_slow'] += 1
+        task = asyncio.create_task(self._close(connection, code=1013))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_done)
+        return False
+
+    def _close_done(self, task):
+        self._close_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error closing slow WebSocket connection: {task.exception()!r}")
+
+    async def send_personal_message(self, message: dict, connection_id, droppable=False):
+        """Queues a message for one connection. Returns False if it was dropped."""
+        connection = self.connections.get(connection_id)
+        if connection is None:
+            return False
+        return self._enqueue(connection, json.dumps(message), droppable=droppable)
+
+    async def broadcast(self, message: dict, droppable=False):
+        text = json.dumps(message)
+        for connection in list(self.connections.values()):
+            self._enqueue(connection, text, droppable=droppable)
+
+    def touch(self, connection_id):
+        connection = self.connections.get(connection_id)
+        if connection is not None:
+            connection.last_activity = time.monotonic()
+
+    async def _close(self, connection, code=1000):
+        connection.closing = True
+        websocket = connection.websocket
+        if websocket.application_state == WebSocketState.CONNECTED and \
+                websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await asyncio.wait_for(websocket.close(code=code), self.send_timeout)
+            except Exception:
+                pass
+
+    async def disconnect(self, connection_id, flush=True):
+        """
+        Unregisters a connection. With `flush`, messages already queued are
+        delivered first (bounded by `send_timeout`). Safe to call more than once.
+        """
+        connection = self.connections.pop(connection_id, None)
+        if connection is None:
+            return
+        sender = connection.sender
+        if flush and not sender.done() and not connection.closing:
+            try:
+                await asyncio.wait_for(connection.queue.put((_CLOSE, False)), self.send_timeout)
+                await asyncio.wait_for(asyncio.shield(sender), self.send_timeout)
+            except asyncio.TimeoutError:
+                pass
+        connection.closing = True
+        if not sender.done():
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+
+    async def _heartbeat_loop(self):
+        ping = json.dumps({"type": "ping"})
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            now = time.monotonic()
+            for connection in list(self.connections.values()):
+                if connection.closing:
+                    continue
+                if now - connection.last_activity > self.idle_timeout:
+                    self.stats['closed_idle'] += 1
+                    await self._close(connection, code=1001)
+                else:
+                    self._enqueue(connection, ping, is_ping=True)
+
+    def start(self):
+        if self._heartbeat is None and self.ping_interval:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        for connection_id in list(self.connections):
+            connection = self.connections.get(connection_id)
+            if connection is not None:
+                await self._close(connection, code=1001)
+            await self.disconnect(connection_id, flush=False)
+        if self._close_tasks:
+            await asyncio.gather(*self._close_tasks, return_exceptions=True)
+
+    def get_stats(self):
+        depths = [c.queue.qsize() for c in self.connections.values()]
+        stats = dict(self.stats)
+        stats['connections'] = len(depths)
+        stats['queued_messages'] = sum(depths)
+        stats['max_queue_depth'] = max(depths, default=0)
+        return stats
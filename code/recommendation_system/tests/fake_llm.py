@@ -0,0 +1,83 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint. POST
+/v1/chat/completions streams a fixed list of chunks as server-sent events,
+`delay` seconds apart, and records whether each stream ran to the end or was
+cut off by the client. Point the app at it with OPENAI_BASE_URL:
+
+    python -m tests.fake_llm --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test uvicorn app:app
+"""
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+DEFAULT_CHUNKS = ["Day 1: ", "Lunch at the market, ", "then the museum. ", "Day 2: ", "Coffee by the beach."]
+
+
+class FakeLLM:
+    def __init__(self, chunks=None, delay=0.05):
+        self.chunks = list(chunks or DEFAULT_CHUNKS)
+        self.delay = delay
+        self.stats = {'requests': 0, 'completed': 0, 'cancelled': 0}
+        self.app = FastAPI()
+        self.app.post('/v1/chat/completions')(self._chat)
+
+    def _chunk(self, content):
+        return {"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4",
+                "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]}
+
+    async def _chat(self, body: dict):
+        self.stats['requests'] += 1
+
+        async def events():
+            completed = False
+            try:
+                for content in self.chunks:
+                    await asyncio.sleep(self.delay)
+                    yield f"data: {json.dumps(self._chunk(content))}\n\n"
+                yield "data: [DONE]\n\n"
+                completed = True
+            finally:
+                self.stats['completed' if completed else 'cancelled'] += 1
+
+        return StreamingResponse(events(), media_type='text/event-stream')
+
+
+class FakeLLMServer:
+    """Runs a FakeLLM under uvicorn on a free local port in a background thread."""
+    def __init__(self, fake):
+        self.fake = fake
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+        self.server = uvicorn.Server(uvicorn.Config(fake.app, host='127.0.0.1', port=self.port, log_level='warning'))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("fake LLM server did not start")
+            time.sleep(0.02)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.05, help='seconds between chunks')
+    args = parser.parse_args()
+    uvicorn.run(FakeLLM(delay=args.delay).app, host='127.0.0.1', port=args.port, log_level='warning')
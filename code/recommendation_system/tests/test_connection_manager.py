@@ -0,0 +1,153 @@
+"""
+ConnectionManager (sockets/connection_manager.py) with fake WebSockets that
+stall on send: slow consumers are evicted without delaying other clients,
+queue-full close tasks stay referenced until they finish, and idle
+connections are closed by the heartbeat.
+"""
+import asyncio
+import gc
+import json
+
+from starlette.websockets import WebSocketState
+
+from sockets.connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records sent messages and close codes; `stall` makes send_text block until the socket closes."""
+    def __init__(self, stall=False, close_delay=0.0):
+        self.stall = stall
+        self.close_delay = close_delay
+        self.sent = []
+        self.close_code = None
+        self.close_codes = []
+        self.application_state = WebSocketState.CONNECTING
+        self.client_state = WebSocketState.CONNECTED
+        self._closed = asyncio.Event()
+
+    async def accept(self):
+        self.application_state = WebSocketState.CONNECTED
+
+    async def send_text(self, text):
+        if self.stall:
+            await self._closed.wait()
+            raise RuntimeError("socket closed")
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.close_codes.append(code)
+        await asyncio.sleep(self.close_delay)
+        self.close_code = code
+        self.application_state = self.client_state = WebSocketState.DISCONNECTED
+        self._closed.set()
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+def test_queue_full_evicts_only_the_slow_client():
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, send_timeout=5.0, ping_interval=0)
+        slow, fast = FakeWebSocket(stall=True), FakeWebSocket()
+        slow_id = await manager.connect(slow)
+        await manager.connect(fast)
+
+        for n in range(3):
+            await manager.broadcast({'n': n})
+            await asyncio.sleep(0.01)
+        assert [m['n'] for m in fast.sent] == [0, 1, 2]
+        assert slow.close_code is None
+
+        # Partial summaries are droppable: a full queue discards them instead of evicting
+        assert not await manager.send_personal_message({'partial': True}, slow_id, droppable=True)
+        assert manager.stats['dropped_messages'] == 1 and slow.close_code is None
+
+        await manager.broadcast({'n': 3})
+        assert await wait_for(lambda: slow.close_code == 1013)
+        assert manager.stats['closed_slow'] == 1
+        assert [m['n'] for m in fast.sent] == [0, 1, 2, 3]
+        assert not await manager.send_personal_message({'n': 4}, slow_id)
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_send_timeout_evicts_stalled_client():
+    async def scenario():
+        manager = ConnectionManager(send_timeout=0.1, ping_interval=0)
+        slow = FakeWebSocket(stall=True)
+        connection_id = await manager.connect(slow)
+
+        await manager.send_personal_message({'n': 0}, connection_id)
+        assert await wait_for(lambda: slow.close_code == 1013)
+        assert manager.stats['closed_slow'] == 1
+        assert manager.connections[connection_id].closing
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_close_task_is_kept_until_done():
+    async def scenario():
+        manager = ConnectionManager(queue_size=1, send_timeout=5.0, ping_interval=0)
+        slow = FakeWebSocket(stall=True, close_delay=0.2)
+        connection_id = await manager.connect(slow)
+        await manager.send_personal_message({'n': 0}, connection_id)
+        await asyncio.sleep(0.01)
+        await manager.send_personal_message({'n': 1}, connection_id)
+
+        # Queue full: the close runs in a background task the manager holds on to
+        await manager.send_personal_message({'n': 2}, connection_id)
+        assert len(manager._close_tasks) == 1
+        gc.collect()
+        assert await wait_for(lambda: slow.close_code == 1013)
+        assert await wait_for(lambda: not manager._close_tasks)
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stop_waits_for_pending_close_tasks():
+    async def scenario():
+        manager = ConnectionManager(queue_size=1, send_timeout=5.0, ping_interval=0)
+        slow = FakeWebSocket(stall=True, close_delay=0.2)
+        connection_id = await manager.connect(slow)
+        for n in range(3):
+            await manager.send_personal_message({'n': n}, connection_id)
+            await asyncio.sleep(0.01)
+
+        assert manager._close_tasks
+        await manager.stop()
+        # stop() also closes the socket (1001) while the eviction's close is still running
+        assert slow.close_codes[0] == 1013
+        assert not manager._close_tasks and not manager.connections
+
+    asyncio.run(scenario())
+
+
+def test_heartbeat_closes_idle_connections():
+    async def scenario():
+        manager = ConnectionManager(ping_interval=0.05, idle_timeout=0.2)
+        idle, active = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(idle)
+        active_id = await manager.connect(active)
+        manager.start()
+
+        for _ in range(10):
+            manager.touch(active_id)
+            await asyncio.sleep(0.05)
+
+        assert idle.close_code == 1001
+        assert active.close_code is None
+        assert manager.stats['closed_idle'] == 1
+        assert {'type': 'ping'} in idle.sent and {'type': 'ping'} in active.sent
+        await manager.stop()
+        assert active.close_code == 1001
+
+    asyncio.run(scenario())
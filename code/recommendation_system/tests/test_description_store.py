@@ -0,0 +1,83 @@
+"""
+DescriptionStore id verification and LocationCatalog reloads: a store
+rewritten for a different id array (even of the same length) is not
+swapped in, and the previous store keeps serving.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from recommender.description_store import DescriptionStore
+from recommender.location_catalog import CATALOG_COLUMNS, LocationCatalog
+
+IDS = [11, 12, 13]
+
+
+class FixturePool:
+    def __init__(self, ids):
+        self.df = pd.DataFrame({name: 'x' for name in CATALOG_COLUMNS}, index=pd.Index(ids, name='id'))
+        self.df[['latitude', 'longitude']] = 35.0
+
+    def fetch_all_locations(self):
+        return self.df.copy()
+
+    def fetch_locations_fingerprint(self):
+        return 'fixture'
+
+
+def write_store(path, texts, ids, mtime):
+    DescriptionStore.write(texts, path, ids)
+    # Reloads are driven by the data file's mtime, which may not tick between quick rewrites
+    os.utime(path, (mtime, mtime))
+
+
+def descriptions(catalog):
+    return list(catalog.snapshot.columns_at(range(len(IDS)), ['description'])['description'])
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    path = str(tmp_path / 'descriptions.bin')
+    write_store(path, ['a', 'b', 'c'], IDS, 1_000)
+    return path
+
+
+def test_store_records_its_ids(store_path):
+    store = DescriptionStore.open(store_path)
+    assert store.ids.tolist() == IDS
+    assert store.matches(IDS)
+    assert not store.matches([11, 12, 14])
+    assert not store.matches(IDS[:2])
+
+
+def test_mismatched_rewrite_keeps_previous_store(store_path, tmp_path):
+    catalog = LocationCatalog(IDS, FixturePool(IDS), descriptions_path=str(tmp_path / 'missing.csv'),
+                              store_path=store_path)
+    assert catalog.refresh()
+    assert descriptions(catalog) == ['a', 'b', 'c']
+    previous = catalog.store
+
+    # Exported for a newer index: same length, different ids
+    write_store(store_path, ['x', 'y', 'z'], [11, 12, 14], 2_000)
+    assert catalog.refresh()
+    assert catalog.store is previous
+    assert descriptions(catalog) == ['a', 'b', 'c']
+    assert catalog.descriptions_at([13], [2]).tolist() == ['c']
+
+    write_store(store_path, ['d', 'e', 'f'], IDS, 3_000)
+    assert catalog.refresh()
+    assert catalog.store is not previous
+    assert descriptions(catalog) == ['d', 'e', 'f']
+
+
+def test_mismatched_store_at_startup_uses_csv(tmp_path):
+    store_path = str(tmp_path / 'descriptions.bin')
+    write_store(store_path, ['x', 'y', 'z'], [11, 12, 14], 1_000)
+    csv_path = tmp_path / 'descriptions.csv'
+    pd.DataFrame({'id': IDS, 'description': ['a', 'b', 'c']}).to_csv(csv_path, index=False)
+
+    catalog = LocationCatalog(IDS, FixturePool(IDS), descriptions_path=str(csv_path), store_path=store_path)
+    assert catalog.store is None
+    assert catalog.refresh()
+    assert descriptions(catalog) == ['a', 'b', 'c']
@@ -0,0 +1,53 @@
+"""EmbeddingCache disk tier: row cap with least-recently-used pruning."""
+import sqlite3
+
+import numpy as np
+
+from recommender.cache import EmbeddingCache
+
+
+def vectors(n):
+    return np.arange(n * 4, dtype='float32').reshape(n, 4)
+
+
+def disk_texts(path):
+    with sqlite3.connect(path) as conn:
+        return {row[0] for row in conn.execute("SELECT text FROM embeddings")}
+
+
+def test_disk_tier_prunes_least_recently_used(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = EmbeddingCache('model', path=path, maxsize=0, disk_maxsize=10)
+    cache.put_many([f"q{i}" for i in range(10)], vectors(10))
+
+    # A disk hit refreshes q0, so the older q1.. are pruned first
+    found, missing = cache.get_many(["q0"])
+    assert set(found) == {"q0"} and not missing
+
+    cache.put_many(["q10"], vectors(1))
+    texts = disk_texts(path)
+    assert len(texts) == 9
+    assert {"q0", "q10"} <= texts
+    assert "q1" not in texts and "q2" not in texts
+    assert cache.get_stats()['disk_rows'] == 9
+
+
+def test_disk_tier_unbounded_when_cap_is_zero(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = EmbeddingCache('model', path=path, maxsize=0, disk_maxsize=0)
+    cache.put_many([f"q{i}" for i in range(50)], vectors(50))
+    assert len(disk_texts(path)) == 50
+
+
+def test_existing_cache_file_gains_last_used_column(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE embeddings (model TEXT NOT NULL, text TEXT NOT NULL, dim INTEGER NOT NULL,"
+                     " vector BLOB NOT NULL, PRIMARY KEY (model, text))")
+        conn.execute("INSERT INTO embeddings VALUES ('model', 'old', 4, ?)", (vectors(1)[0].tobytes(),))
+
+    cache = EmbeddingCache('model', path=path, maxsize=0, disk_maxsize=2)
+    found, _ = cache.get_many(["old"])
+    np.testing.assert_array_equal(found["old"], vectors(1)[0])
+    cache.put_many(["a", "b"], vectors(2))
+    assert len(disk_texts(path)) == 1
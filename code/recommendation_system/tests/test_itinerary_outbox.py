@@ -0,0 +1,131 @@
+"""
+ItineraryOutbox (persistence/outbox.py) with an in-memory LocalSink and a
+sink that rejects some records: delivery, per-record failure isolation,
+backoff, dead-lettering, and reclaiming batches whose lease ran out.
+"""
+import time
+
+import pytest
+
+from persistence.outbox import ItineraryOutbox, LocalSink
+
+
+class RejectingSink(LocalSink):
+    """Rejects the whole batch, like a single Supabase insert, when any record has 'bad' set."""
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def write_batch(self, records):
+        self.calls += 1
+        if any(record.get('bad') for record in records):
+            raise ValueError("invalid record")
+        super().write_batch(records)
+
+
+class CrashingSink(LocalSink):
+    """Stands in for a worker that dies mid-flush, leaving its batch claimed."""
+    def write_batch(self, records):
+        raise SystemExit("worker killed")
+
+
+@pytest.fixture
+def outbox_path(tmp_path):
+    return str(tmp_path / 'outbox.sqlite3')
+
+
+def rows(outbox):
+    return outbox._conn.execute(
+        "SELECT payload, attempts, next_attempt_at, dead FROM outbox ORDER BY id"
+    ).fetchall()
+
+
+def make_due(outbox):
+    outbox._conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE dead = 0")
+    outbox._conn.commit()
+
+
+def test_delivers_in_batches(outbox_path):
+    sink = LocalSink()
+    outbox = ItineraryOutbox(sink, path=outbox_path, batch_size=2)
+    for n in range(3):
+        outbox.enqueue({'n': n})
+
+    assert outbox.flush_once() == 2
+    assert outbox.flush_once() == 1
+    assert outbox.flush_once() == 0
+    assert sink.records == [{'n': 0}, {'n': 1}, {'n': 2}]
+    stats = outbox.get_stats()
+    assert (stats['flushed'], stats['depth'], stats['failed_batches']) == (3, 0, 0)
+
+
+def test_only_the_bad_record_is_charged(outbox_path):
+    sink = RejectingSink()
+    outbox = ItineraryOutbox(sink, path=outbox_path, base_backoff=10.0)
+    for n in range(8):
+        outbox.enqueue({'n': n, 'bad': n == 5})
+
+    assert outbox.flush_once() == 7
+    assert [r['n'] for r in sink.records] == [0, 1, 2, 3, 4, 6, 7]
+    [(payload, attempts, next_attempt_at, dead)] = rows(outbox)
+    assert '"n": 5' in payload and attempts == 1 and dead == 0
+    assert 8.0 <= next_attempt_at - time.time() <= 12.0
+    stats = outbox.get_stats()
+    assert (stats['failed_batches'], stats['failed_records'], stats['depth']) == (1, 1, 1)
+    # 8 -> 4 -> 2 -> 1: one call per level on the failing side plus its healthy siblings
+    assert sink.calls == 7
+
+    # Backing off: not due again yet
+    assert outbox.flush_once() == 0
+    assert sink.calls == 7
+
+
+def test_backoff_grows_and_caps(outbox_path):
+    outbox = ItineraryOutbox(RejectingSink(), path=outbox_path, base_backoff=10.0, max_backoff=25.0)
+    outbox.enqueue({'bad': True})
+
+    delays = []
+    for _ in range(3):
+        make_due(outbox)
+        outbox.flush_once()
+        delays.append(rows(outbox)[0][2] - time.time())
+    assert 8.0 <= delays[0] <= 12.0
+    assert 16.0 <= delays[1] <= 24.0
+    assert 20.0 <= delays[2] <= 30.0
+
+
+def test_dead_letters_after_max_attempts(outbox_path):
+    sink = RejectingSink()
+    outbox = ItineraryOutbox(sink, path=outbox_path, base_backoff=0.0, max_attempts=3)
+    outbox.enqueue({'bad': True})
+    outbox.enqueue({'n': 1})
+
+    assert outbox.flush_once() == 1
+    assert outbox.flush_once() == 0
+    assert outbox.flush_once() == 0
+    [(_, attempts, _, dead)] = rows(outbox)
+    assert (attempts, dead) == (3, 1)
+
+    calls = sink.calls
+    assert outbox.flush_once() == 0
+    assert sink.calls == calls
+    stats = outbox.get_stats()
+    assert (stats['dead'], stats['depth'], stats['dead_lettered']) == (1, 0, 1)
+    assert stats['last_error'] == "invalid record"
+
+
+def test_stale_lease_is_reclaimed(outbox_path):
+    crashed = ItineraryOutbox(CrashingSink(), path=outbox_path, lease_seconds=0.3)
+    crashed.enqueue({'n': 1})
+    with pytest.raises(SystemExit):
+        crashed.flush_once()
+
+    sink = LocalSink()
+    survivor = ItineraryOutbox(sink, path=outbox_path, lease_seconds=0.3)
+    # Still leased to the crashed worker
+    assert survivor.flush_once() == 0
+
+    time.sleep(0.4)
+    assert survivor.flush_once() == 1
+    assert sink.records == [{'n': 1}]
+    assert survivor.get_stats()['depth'] == 0
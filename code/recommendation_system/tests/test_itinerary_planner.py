@@ -0,0 +1,63 @@
+"""
+Slot labels of planned days when a slot in the middle of the schedule
+cannot be filled: later items keep the label of the slot they were planned
+for instead of shifting up into the skipped one.
+"""
+import time
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from itinerary.itinerary_planner import ItineraryPlanner
+
+OPEN_ALL_DAY = {day: "09:00-23:59" for day in
+                ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')}
+MONDAY = date(2025, 9, 15)
+
+# No cafe, so the 16:30 'Cafe' slot stays empty
+PLACES = [
+    (1, 'Noodle House', 'korean restaurant', 'noodles', 0.9),
+    (2, 'City Museum', 'museum', 'museum', 0.8),
+    (3, 'Harbour Park', 'park', 'walk', 0.7),
+    (4, 'Grill Bar-B-Q', 'bbq', 'dinner', 0.85),
+    (5, 'Jazz Cellar', 'jazz club', 'jazz', 0.6),
+]
+EXPECTED_SLOTS = ['Lunch 🍱', 'Activity 🌳', 'Activity 🌳', 'Dinner 🍽️', 'Evening ✨']
+
+
+@pytest.fixture
+def candidates():
+    df = pd.DataFrame(PLACES, columns=['id', 'name', 'primary_category', 'source_query', 'final_score'])
+    df['latitude'] = 35.15
+    df['longitude'] = 129.05
+    df['operating_hours'] = [OPEN_ALL_DAY] * len(df)
+    return df.set_index('id')
+
+
+def slots(schedule):
+    return [item['slot'] for item in schedule]
+
+
+@pytest.mark.parametrize('mode', ['beam', 'dp'])
+def test_skipped_slot_keeps_later_labels(candidates, mode):
+    schedule = ItineraryPlanner().plan_day(candidates, mode=mode, day=MONDAY)
+    assert slots(schedule) == EXPECTED_SLOTS
+    assert [item['id'] for item in schedule][-2:] == [4, 5]
+    assert [item['step'] for item in schedule] == [1, 2, 3, 4, 5]
+
+
+def test_heuristic_fallback_keeps_slot_labels(candidates):
+    planner = ItineraryPlanner()
+    schedule = planner.plan_day(candidates, mode='or_tools', must_haves=['jazz'], day=MONDAY,
+                                deadline=time.monotonic() - 1)
+    assert planner.get_stats()['or_tools_fallbacks'] == {'budget_exhausted': 1}
+    assert slots(schedule) == EXPECTED_SLOTS
+
+
+def test_or_tools_keeps_slot_labels(candidates):
+    planner = ItineraryPlanner(solver_workers=1)
+    schedule = planner.plan_day(candidates, mode='or_tools', must_haves=['jazz'], day=MONDAY)
+    assert planner.get_stats()['or_tools_fallbacks'] == {}
+    assert slots(schedule) == EXPECTED_SLOTS
+    assert schedule[-1]['id'] == 5
@@ -0,0 +1,114 @@
+"""
+HoursTable (recommender/operating_hours.py) against the per-row string parser
+it replaced in the planner and the recommender's time bonus: overnight
+ranges, closed and missing days, '24 hours', and visits ending exactly at
+closing time.
+"""
+import numpy as np
+import pytest
+
+from recommender.operating_hours import DAYS, MINUTES_PER_DAY, HoursTable
+
+HOURS = [
+    {"monday": "09:00-18:00", "tuesday": "09:00-18:00", "wednesday": "Closed"},
+    {"monday": "22:00-02:00", "tuesday": "Closed", "friday": "18:00-03:30"},
+    {"monday": "24 hours", "tuesday": "24 hours", "sunday": "11:30-14:00"},
+    {"monday": "10:00-24:00", "tuesday": "00:00-01:00", "saturday": "06:00-06:00"},
+    {"monday": "not a range", "thursday": "07:15-23:45"},
+    {},
+    None,
+]
+
+
+def legacy_is_open_at(hours_json, day_str, time_str):
+    """The string parser HoursTable replaced (itinerary_planner._is_open_at before compilation)."""
+    if not isinstance(hours_json, dict) or day_str not in hours_json:
+        return False
+    time_range = hours_json[day_str]
+    if time_range in ['Closed', '24 hours']:
+        return time_range == '24 hours'
+    try:
+        start, end = [t.strip() for t in time_range.split('-')]
+        if end < start:
+            return time_str >= start or time_str < end
+        else:
+            return start <= time_str < end
+    except (ValueError, AttributeError):
+        return False
+
+
+def legacy_is_open_for(hours_json, day_str, minute, duration):
+    """
+    The legacy parser checked at every minute of the visit. Minutes past
+    midnight stay on `day_str`'s range, which only covers them when that
+    range runs overnight.
+    """
+    for m in range(minute, minute + duration):
+        time_str = f"{m % MINUTES_PER_DAY // 60:02d}:{m % 60:02d}"
+        if not legacy_is_open_at(hours_json, day_str, time_str):
+            return False
+        if m >= MINUTES_PER_DAY:
+            start, end = [t.strip() for t in hours_json[day_str].split('-')]
+            if end >= start:
+                return False
+    return True
+
+
+@pytest.fixture(scope='module')
+def table():
+    return HoursTable.compile(HOURS)
+
+
+@pytest.mark.parametrize('day', DAYS)
+def test_is_open_at_matches_legacy_parser(table, day):
+    for minute in range(0, MINUTES_PER_DAY, 15):
+        time_str = f"{minute // 60:02d}:{minute % 60:02d}"
+        expected = [legacy_is_open_at(h, day, time_str) for h in HOURS]
+        assert table.is_open_at(day, time_str).tolist() == expected, time_str
+        assert table.is_open_at(day, minute).tolist() == expected, minute
+
+
+@pytest.mark.parametrize('day', DAYS)
+@pytest.mark.parametrize('duration', [60, 90])
+def test_is_open_for_matches_legacy_parser(table, day, duration):
+    for minute in range(0, MINUTES_PER_DAY, 15):
+        mask = table.is_open_for(day, minute, duration)
+        for row, hours_json in enumerate(HOURS):
+            # Visits continuing into the next day's range are covered by test_visit_past_midnight
+            if minute + duration > MINUTES_PER_DAY and isinstance(hours_json, dict) and (
+                    hours_json.get(day) == '24 hours' or str(hours_json.get(day, '')).endswith('24:00')):
+                continue
+            assert mask[row] == legacy_is_open_for(hours_json, day, minute, duration), (row, minute)
+
+
+def test_visit_ending_at_closing_time(table):
+    assert table.is_open_for('monday', '16:30', 90)[0]
+    assert table.is_open_for('monday', '17:00', 60)[0]
+    assert not table.is_open_for('monday', '17:01', 60)[0]
+    # The planner's start-only check accepted a visit running past closing
+    assert legacy_is_open_at(HOURS[0], 'monday', '17:30')
+    assert not table.is_open_for('monday', '17:30', 60)[0]
+
+
+def test_closed_and_missing_days(table):
+    for day in ('wednesday', 'sunday'):
+        assert not table.is_open_for(day, '12:00', 60)[0]
+        assert not table.is_open_at(day, '12:00')[0]
+    assert not table.is_open_for('tuesday', '00:00', 30)[1]
+    assert not table.is_open_at('monday', '12:00')[4]
+    assert not np.any(table.is_open_for('monday', '12:00', 60)[5:])
+
+
+def test_visit_past_midnight(table):
+    # Monday 22:00-02:00 covers the early hours even though Tuesday itself is closed
+    assert table.is_open_for('monday', '23:30', 150)[1]
+    assert not table.is_open_for('monday', '23:30', 151)[1]
+    assert table.is_open_for('friday', '02:30', 60)[1]
+    assert not table.is_open_for('friday', '03:00', 60)[1]
+    # 24 hours on Monday runs on into Tuesday's 24 hours
+    assert table.is_open_for('monday', '23:30', 90)[2]
+    # 10:00-24:00 continues into Tuesday's 00:00-01:00, but not past it
+    assert table.is_open_for('monday', '23:30', 90)[3]
+    assert not table.is_open_for('monday', '23:30', 91)[3]
+    # Sunday's 11:30-14:00 ends well before midnight
+    assert not table.is_open_for('sunday', '23:30', 60)[2]
@@ -0,0 +1,78 @@
+"""
+RegionRouter (recommender/region_router.py) on the synthetic catalog of
+benchmarks/bench_recommender.py: region search against brute force over the
+shared index, router reuse across refreshes that keep region membership,
+and catalog listeners that fail without holding back a refresh.
+"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_recommender import build_recommender
+
+
+@pytest.fixture(scope='module')
+def recommender(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        # build_recommender sets these too; registering them here restores them afterwards
+        for name in ('EMBEDDING_CACHE_PATH', 'EMBEDDING_CACHE_SIZE', 'CATALOG_REFRESH_INTERVAL'):
+            mp.setenv(name, '')
+        mp.setenv('RETRIEVAL_MODE', 'region')
+        yield build_recommender(3000, dim=32, workdir=str(tmp_path_factory.mktemp('catalog')))
+
+
+def test_search_matches_brute_force(recommender):
+    router = recommender.region_router()
+    index = recommender.faiss_index
+    rng = np.random.default_rng(0)
+    emb = rng.normal(size=(3, index.d)).astype('float32')
+    regions = [0, 2]
+    excluded = router.members[0][:5]
+
+    scores, positions = router.search(index, emb, regions, 10, excluded=excluded)
+
+    vectors = index.reconstruct_n(0, index.ntotal)
+    expected = [set() for _ in emb]
+    for region in regions:
+        rows = np.setdiff1d(router.members[region], excluded)
+        top = rows[np.argsort(-(emb @ vectors[rows].T), axis=1)[:, :10]]
+        for want, region_top in zip(expected, top):
+            want.update(region_top.tolist())
+    assert [set(row.tolist()) for row in positions] == expected
+    assert np.isin(positions, excluded).sum() == 0
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_refresh_keeps_router_until_membership_changes(recommender):
+    router = recommender.region_router()
+    assert recommender.catalog.refresh(force=True)
+    assert recommender._router is router
+
+    df = recommender.db_pool.df
+    moved = df.index[:10]
+    original = df.loc[moved, 'region'].copy()
+    try:
+        df.loc[moved, 'region'] = 'New District'
+        assert recommender.catalog.refresh(force=True)
+        assert recommender._router is not router
+        assert 'New District' in list(recommender._router.regions)
+    finally:
+        df.loc[moved, 'region'] = original
+        recommender.catalog.refresh(force=True)
+
+
+def test_failing_listener_does_not_block_refresh(recommender):
+    catalog = recommender.catalog
+    seen = []
+
+    def failing(snapshot):
+        raise ValueError("listener bug")
+
+    catalog.add_listener(failing)
+    catalog.add_listener(lambda snapshot: seen.append(snapshot.version))
+    try:
+        version = catalog.snapshot.version
+        assert catalog.refresh(force=True)
+        assert catalog.snapshot.version == version + 1
+        assert seen == [version + 1]
+    finally:
+        del catalog._listeners[-2:]
@@ -0,0 +1,111 @@
+"""
+/ws/itinerary summary streaming against the local fake LLM endpoint
+(tests/fake_llm.py): full stream, client disconnect mid-stream, and the
+SUMMARY_TIME_BUDGET fallback. Run from code/recommendation_system:
+
+    python -m pytest tests
+"""
+import importlib
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from tests.fake_llm import DEFAULT_CHUNKS, FakeLLM, FakeLLMServer
+
+ITINERARY = [{
+    "day": "2025-09-14",
+    "itinerary": [{"name": "Busan Museum", "description": "A history museum. Free entry."}],
+    "weather": {"avg_temp": 24, "dominant_weather": "Clear"},
+}]
+
+
+class UnusedRecommender:
+    """The WebSocket route never touches the recommender; this skips loading models and the database."""
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture(scope='module')
+def fake_llm():
+    fake = FakeLLM()
+    with FakeLLMServer(fake) as server:
+        yield server
+
+
+@pytest.fixture(scope='module')
+def app_module(fake_llm, tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('OPENAI_BASE_URL', fake_llm.base_url)
+        mp.setenv('OPENAI_API_KEY', 'test')
+        mp.setenv('ITINERARY_SINK', 'local')
+        mp.setenv('ITINERARY_SINK_PATH', str(workdir / 'itineraries.jsonl'))
+        mp.setenv('ITINERARY_OUTBOX_PATH', str(workdir / 'outbox.sqlite3'))
+        mp.setattr('recommender.recommender.Recommender', UnusedRecommender)
+        yield importlib.import_module('app')
+
+
+@pytest.fixture
+def client(app_module, fake_llm, monkeypatch):
+    from itinerary import summary_generator
+    fake_llm.fake.delay = 0.05
+    fake_llm.fake.stats.update(requests=0, completed=0, cancelled=0)
+    # Every TestClient WebSocket session runs on its own event loop, so the async client is not shared
+    monkeypatch.setattr(summary_generator, '_async_client', None)
+    app_module.summary_cache.cache.clear()
+    return TestClient(app_module.app)
+
+
+def receive_until_final(ws):
+    messages = []
+    while True:
+        messages.append(json.loads(ws.receive_text()))
+        if messages[-1].get('partial') is False:
+            return messages
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_full_stream(client, fake_llm):
+    with client.websocket_connect('/ws/itinerary') as ws:
+        ws.send_text(json.dumps({"scheduled_itineraries": ITINERARY}))
+        messages = receive_until_final(ws)
+
+    assert messages[0] == {"scheduled_itineraries": ITINERARY, "summary": None}
+    partials = messages[1:-1]
+    assert [m['summary_delta'] for m in partials] == DEFAULT_CHUNKS
+    assert partials[-1]['summary'] == "".join(DEFAULT_CHUNKS)
+    assert messages[-1]['summary'] == "".join(DEFAULT_CHUNKS).strip()
+    assert fake_llm.fake.stats == {'requests': 1, 'completed': 1, 'cancelled': 0}
+
+
+def test_disconnect_cancels_upstream(client, fake_llm):
+    fake_llm.fake.delay = 0.5
+    with client.websocket_connect('/ws/itinerary') as ws:
+        ws.send_text(json.dumps({"scheduled_itineraries": ITINERARY}))
+        ws.receive_text()
+        assert json.loads(ws.receive_text())['partial'] is True
+
+    assert wait_for(lambda: fake_llm.fake.stats['cancelled'] == 1)
+    assert fake_llm.fake.stats['completed'] == 0
+
+
+def test_time_budget_fallback(client, fake_llm, app_module, monkeypatch):
+    fake_llm.fake.delay = 0.5
+    monkeypatch.setattr(app_module, 'SUMMARY_TIME_BUDGET', 0.3)
+    with client.websocket_connect('/ws/itinerary') as ws:
+        ws.send_text(json.dumps({"scheduled_itineraries": ITINERARY}))
+        messages = receive_until_final(ws)
+
+    assert messages[-1]['summary'] == app_module.SUMMARY_FALLBACK
+    assert wait_for(lambda: fake_llm.fake.stats['cancelled'] == 1)
+    assert app_module.summary_cache.get([{"itinerary": d["itinerary"], "weather": d["weather"]} for d in ITINERARY]) is None
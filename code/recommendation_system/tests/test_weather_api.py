@@ -0,0 +1,116 @@
+"""
+ForecastService (recommender/weather_api.py) against a local HTTP stub of
+the OpenWeather forecast endpoint: geohash cell cache hits, TTL expiry, and
+the empty-forecast fallback when the upstream times out.
+"""
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from recommender.utils import geohash, geohash_center
+from recommender.weather_api import ForecastService
+
+FORECAST_TIME = datetime(2025, 9, 14, 12, 0)
+BUSAN = (35.1796, 129.0756)
+
+
+class WeatherStub:
+    """Serves one clear 3-hour block for any location, `delay` seconds late, and records the query params."""
+    def __init__(self):
+        self.delay = 0.0
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append({k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()})
+                time.sleep(stub.delay)
+                body = json.dumps({"list": [{
+                    "dt": int(FORECAST_TIME.timestamp()),
+                    "main": {"temp": 24.5},
+                    "weather": [{"main": "Clear"}],
+                }]}).encode()
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/data/2.5/forecast"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(scope='module')
+def stub():
+    stub = WeatherStub()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def service(stub):
+    stub.delay = 0.0
+    stub.requests.clear()
+    return ForecastService(base_url=stub.url, api_key='test', ttl=60, timeout=(1, 0.3))
+
+
+def test_same_cell_is_served_from_cache(service, stub):
+    first = service.get_forecast(*BUSAN)
+    # ~100 m away, still inside the same precision-5 cell
+    second = service.get_forecast(BUSAN[0] + 0.0005, BUSAN[1] + 0.0005)
+
+    assert second is first
+    assert len(stub.requests) == 1
+    assert service.get_stats() == {'hits': 1, 'misses': 1, 'coalesced': 0, 'errors': 0, 'cached_cells': 1}
+    lat, lon = geohash_center(geohash(*BUSAN, service.precision))
+    assert (float(stub.requests[0]['lat']), float(stub.requests[0]['lon'])) == pytest.approx((lat, lon))
+    assert stub.requests[0]['appid'] == 'test'
+    assert [f['weather'] for f in first.between(FORECAST_TIME.date(), FORECAST_TIME.date())] == ['clear']
+
+    service.get_forecast(BUSAN[0] + 0.5, BUSAN[1])
+    assert len(stub.requests) == 2
+
+
+def test_ttl_expiry_refetches(service, stub):
+    service.cache.ttl = 0.2
+    service.get_forecast(*BUSAN)
+    service.get_forecast(*BUSAN)
+    assert len(stub.requests) == 1
+
+    time.sleep(0.3)
+    service.get_forecast(*BUSAN)
+    assert len(stub.requests) == 2
+    assert service.get_stats()['misses'] == 2
+
+
+def test_timeout_falls_back_to_empty_forecast(service, stub):
+    stub.delay = 1.0
+    start = time.monotonic()
+    forecast = service.get_forecast(*BUSAN)
+
+    assert time.monotonic() - start < 1.0
+    assert forecast.entries == []
+    assert service.get_stats()['errors'] == 1
+    assert service.get_stats()['cached_cells'] == 0
+
+    # Failures are not cached: the next call reaches the upstream again
+    stub.delay = 0.0
+    assert len(service.get_forecast(*BUSAN).entries) == 1
+    assert service.get_stats()['cached_cells'] == 1